@@ -0,0 +1,106 @@
+import os
+import sys
+from itertools import islice
+from multiprocessing import Pool
+import parser_
+import cache_
+
+
+# 一行に一つの式を、ファイルか標準入力から読んで評価する
+# python batch_.py [ファイル] [--workers N] [--chunksize N]
+#
+# 行はワーカーのプロセスに chunksize 行ずつ渡し、結果は行の順に書き出す。
+# Pool.imap は渡した入力を先に全部読んでしまうので、ワーカーごとに
+# WINDOW_CHUNKS 回分の行だけを読んで渡し、その結果を書き出してから次を読む。
+# 大きなファイルでも、メモリーに置くのはその分の行と結果だけになる。
+# エラーはその行に "ERROR: ..." と書き、続きの行を評価する。
+# ワーカーごとに cache_.Cache を持つので、同じ式は解析し直さない。
+
+CHUNKSIZE = 256
+WINDOW_CHUNKS = 4
+
+USAGE = "usage: python batch_.py [ファイル] [--workers N] [--chunksize N]"
+
+# ワーカーのキャッシュ
+_cache = cache_.Cache()
+
+
+def evaluate(line):
+    """一行を評価し、書き出す文字列を返す"""
+    line = line.strip()
+    if line == "":
+        return ""
+    try:
+        return str(_cache.eval(line))
+    except parser_.ParseError as e:
+        return f"ERROR: {e}"
+    except ArithmeticError as e:
+        # 0 で割る、float に直せない大きな整数など
+        return f"ERROR: {e}"
+    except ValueError as e:
+        return f"ERROR: {e}"
+    except KeyError as e:
+        return f"ERROR: {e.args[0]} は定義されていません"
+    except TypeError as e:
+        return f"ERROR: {e}"
+
+
+def run(lines, out, workers=None, chunksize=CHUNKSIZE):
+    """lines の各行を評価して out に書く。エラーの行の数を返す"""
+    errors = 0
+    lines = iter(lines)
+    if workers == 1:
+        pool = None
+    else:
+        pool = Pool(workers)
+    window = (workers or os.cpu_count() or 1) * chunksize * WINDOW_CHUNKS
+    try:
+        while True:
+            block = list(islice(lines, window))
+            if len(block) == 0:
+                break
+            if pool is None:
+                results = map(evaluate, block)
+            else:
+                results = pool.imap(evaluate, block, chunksize)
+            for v in results:
+                if v.startswith("ERROR: "):
+                    errors += 1
+                out.write(v + "\n")
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return errors
+
+
+def usage(message):
+    print(USAGE, file=sys.stderr)
+    print(message, file=sys.stderr)
+    sys.exit(2)
+
+
+def option(argv, name, default):
+    """argv から name とその値 (1 以上の整数) を取り除いて値を返す。不正なら使い方を示して終わる"""
+    if name not in argv[1:]:
+        return default
+    i = argv.index(name)
+    if i + 1 >= len(argv):
+        usage(f"{name} の値がありません")
+    value = argv[i + 1]
+    if not value.isdigit() or int(value) == 0:
+        usage(f"{name} には 1 以上の整数を指定してください")
+    del argv[i:i + 2]
+    return int(value)
+
+
+if __name__ == "__main__":
+    workers = option(sys.argv, "--workers", None)
+    chunksize = option(sys.argv, "--chunksize", CHUNKSIZE)
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], encoding="utf-8") as f:
+            errors = run(f, sys.stdout, workers, chunksize)
+    else:
+        errors = run(sys.stdin, sys.stdout, workers, chunksize)
+    if errors != 0:
+        sys.exit(1)
@@ -0,0 +1,101 @@
+from collections import OrderedDict
+import parser_
+import rpn_
+
+
+# 式のキャッシュ
+# 同じ式の文字列が何度も来るので、空白をまとめた文字列をキーにして
+# 新しく使ったものから maxsize 個を覚えておく (LRU)。
+# 変数のない式は評価した値も覚えておき、評価し直さない。変数のある式は
+# 後置記法 (rpn_) にコンパイルしたものを覚えておき、それを評価する。
+
+
+def normalize(input):
+    """空白の並びを一つの空白にする ("1 2" と "12" は別の式のまま)"""
+    return " ".join(input.split())
+
+
+class Entry:
+    """キャッシュの中身"""
+
+    def __init__(self, node, constant, value, program=None):
+        self.node = node
+        # 変数がない
+        self.constant = constant
+        # 変数がなければ評価した値
+        self.value = value
+        # 変数があればコンパイルした rpn_.Program
+        self.program = program
+
+
+class Cache:
+    """式の LRU キャッシュ"""
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def entry(self, input):
+        key = normalize(input)
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return entry
+
+        self.misses += 1
+        node = parser_.parse(key)
+        if len(parser_.variables_of(node)) == 0:
+            # 0 で割るときなどは例外になり、覚えない
+            entry = Entry(node, True, parser_.eval(node))
+        else:
+            entry = Entry(node, False, None, rpn_.compile_node(node))
+
+        self.entries[key] = entry
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+        return entry
+
+    def parse(self, input):
+        """構文木を返す"""
+        return self.entry(input).node
+
+    def eval(self, input, variables=None):
+        """式を評価する。variables は変数の名前と値の辞書"""
+        entry = self.entry(input)
+        if entry.constant:
+            return entry.value
+        return rpn_.run(entry.program, variables)
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        if total == 0:
+            return 0.0
+        return self.hits / total
+
+    def stats(self):
+        return {
+            "size": len(self.entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hit_rate(),
+        }
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+
+if __name__ == "__main__":
+    cache = Cache(2)
+    for v in ["1 + 2", "1  +  2", "x * 2", "3 * 4", "1 + 2"]:
+        print(v, cache.eval(v, {"x": 5}))
+    print(cache.stats())
@@ -1,8 +1,7 @@
-import sys
-
 # トークンの種類
 INT = "INT"
 FLOAT = "FLOAT"
+IDENT = "IDENT"
 ASSIGN = "="
 PLUS = "+"
 MINUS = "-"
@@ -17,6 +16,10 @@ ILLEGAL = "ILLEGAL"
 EOF = "EOF"
 
 
+class ParseError(Exception):
+    """構文のエラー"""
+
+
 class Token:
     """トークン"""
 
@@ -58,6 +61,16 @@ class Lexer:
         else:
             return False
 
+    def is_letter(self):
+        return self.ch.isalpha() or self.ch == "_"
+
+    def read_identifier(self):
+        position = self.position
+        while self.is_letter() or self.ch.isdigit():
+            self.read_char()
+
+        return self.input[position:self.position]
+
     def peek_char(self):
         if self.next_position >= len(self.input):
             return ""
@@ -94,6 +107,10 @@ class Lexer:
             tok.type = RPAREN
         elif self.ch == "":
             tok.type = EOF
+        elif self.is_letter():
+            tok.type = IDENT
+            tok.literal = self.read_identifier()
+            return tok
         else:
             if self.is_digit():
                 literal = self.read_number()
@@ -101,7 +118,7 @@ class Lexer:
                     tok.type = INT
                     tok.literal = literal
                     return tok
-                elif literal.count(".") == 1:
+                elif literal.count(".") == 1 and literal != ".":
                     tok.type = FLOAT
                     tok.literal = literal
                     return tok
@@ -126,23 +143,36 @@ class Node:
         self.val = None
 
 
+class Pending:
+    """括弧の中を読んでいる間、外側の途中の式を覚えておく"""
+
+    def __init__(self):
+        # expr の左辺と演算子
+        self.expr = None
+        self.expr_op = None
+        # mul の左辺と演算子
+        self.term = None
+        self.term_op = None
+        # 括弧の前に単項の - があった
+        self.minus = False
+
+
 class Parser:
-    """トークン配列クラス"""
+    """トークン列クラス
+
+    tokens はトークンのリストか、tokenize() のようなトークンを順に返すもの。
+    """
 
     def __init__(self, tokens=[]):
-        self.tokens = tokens
+        self.tokens = iter(tokens)
         self.position = 0
         self.next_position = 0
         self.obj = None
-        self.length = len(tokens)
 
         self.read_pos()
 
     def read_pos(self):
-        if self.next_position >= self.length:
-            self.obj = None
-        else:
-            self.obj = self.tokens[self.next_position]
+        self.obj = next(self.tokens, None)
         self.position = self.next_position
         self.next_position += 1
 
@@ -172,7 +202,7 @@ class Parser:
     # 期待している記号のときには、トークンを1つ読み進める
     def expect(self, t):
         if self.obj.type != t:
-            sys.exit(f"{t} ではありません")
+            raise ParseError(f"{t} ではありません")
         self.read_pos()
 
     # 次のトークンが数値の場合、トークンを1つ読み進めてその数値を返す。
@@ -184,8 +214,10 @@ class Parser:
         elif self.obj.type == FLOAT:
             kind = FLOAT
             val = float(self.obj.literal)
+        elif self.obj.type == ILLEGAL:
+            raise ParseError(f"{self.obj.literal} は数ではありません")
         else:
-            sys.exit("数ではありません")
+            raise ParseError("数ではありません")
         self.read_pos()
         return kind, val
 
@@ -199,6 +231,9 @@ class Parser:
     # unary   = ("+" | "-")? primary
     # primary = num | "(" expr ")"
 
+    # 変数
+    # primary = num | ident | "(" expr ")"
+
     def expr(self):
         node = self.mul()
         while True:
@@ -232,22 +267,97 @@ class Parser:
             node = self.expr()
             self.expect(")")
             return node
+        if self.obj.type == IDENT:
+            return self.read_ident()
         # そうでなければ数値のはず
         kind, val = self.expect_number()
         return self.new_node_num(kind, val)
 
+    # 変数のトークンを読み、変数のノードを返す
+    def read_ident(self):
+        node = self.new_node_num(IDENT, self.obj.literal)
+        self.read_pos()
+        return node
 
-def new_parser(input):
-    # トークン配列
-    tokens = []
+    # expr / mul / unary / primary を再帰せずに読む。作る木は expr() と同じ
+    # 括弧に入るときに外側の途中の式を Pending に入れてスタックに積む
+    def parse(self):
+        stack = []
+        pending = Pending()
+        while True:
+            # unary
+            minus = False
+            if self.consume("+"):
+                pass
+            elif self.consume("-"):
+                minus = True
+
+            # primary
+            if self.consume("("):
+                pending.minus = minus
+                stack.append(pending)
+                pending = Pending()
+                continue
+            if self.obj.type == IDENT:
+                node = self.read_ident()
+            else:
+                kind, val = self.expect_number()
+                node = self.new_node_num(kind, val)
+
+            # 次の演算子を読むまで、読み終えた式を外側へ組み上げる
+            while True:
+                if minus:
+                    node = self.new_node(MINUS, self.new_node_num(INT, 0), node)
+                if pending.term is not None:
+                    node = self.new_node(pending.term_op, pending.term, node)
+                    pending.term = None
+                if self.consume("*"):
+                    pending.term, pending.term_op = node, ASTERISK
+                    break
+                elif self.consume("/"):
+                    pending.term, pending.term_op = node, SLASH
+                    break
+
+                if pending.expr is not None:
+                    node = self.new_node(pending.expr_op, pending.expr, node)
+                    pending.expr = None
+                if self.consume("+"):
+                    pending.expr, pending.expr_op = node, PLUS
+                    break
+                elif self.consume("-"):
+                    pending.expr, pending.expr_op = node, MINUS
+                    break
+
+                if len(stack) == 0:
+                    return node
+                self.expect(")")
+                pending = stack.pop()
+                minus = pending.minus
+
+
+def tokenize(input):
+    """トークンを一つずつ返す。最後は EOF"""
     lex = Lexer(input)
     while True:
         tok = lex.next_token()
-        tokens.append(tok)
+        yield tok
         if tok.type == EOF:
-            break
+            return
+
+
+def new_parser(input):
+    # トークンは読み進めるときに一つずつ作る
+    return Parser(tokenize(input))
 
-    return Parser(tokens)
+
+def parse(input):
+    """入力全体を一つの式として読む。残りがあれば ParseError"""
+    p = new_parser(input)
+    node = p.parse()
+    if p.obj.type != EOF:
+        extra = p.obj.literal if p.obj.literal else p.obj.type
+        raise ParseError(f"{extra} は余分です")
+    return node
 
 
 def eval_infix(operator, left, right):
@@ -263,17 +373,129 @@ def eval_infix(operator, left, right):
         return None
 
 
-def eval(node):
-    if node.kind == INT:
-        return node.val
-    elif node.kind == FLOAT:
-        return node.val
-    elif node.kind == PLUS or node.kind == MINUS or node.kind == ASTERISK or node.kind == SLASH:
-        left = eval(node.left)
-        right = eval(node.right)
-        return eval_infix(node.kind, left, right)
+def eval(node, variables=None):
+    # variables は変数の名前と値の辞書。ない変数は KeyError
+    if variables is None:
+        variables = {}
+    # 深い木でも再帰しないよう、スタックで後置順にたどる
+    stack = [(node, False)]
+    values = []
+    while stack:
+        node, visited = stack.pop()
+        if node.kind == INT:
+            values.append(node.val)
+        elif node.kind == FLOAT:
+            values.append(node.val)
+        elif node.kind == IDENT:
+            values.append(variables[node.val])
+        elif node.kind == PLUS or node.kind == MINUS or node.kind == ASTERISK or node.kind == SLASH:
+            if visited:
+                right = values.pop()
+                left = values.pop()
+                values.append(eval_infix(node.kind, left, right))
+            else:
+                stack.append((node, True))
+                stack.append((node.right, False))
+                stack.append((node.left, False))
+        else:
+            values.append(None)
+
+    return values[-1]
+
+
+# Python の関数へのコンパイル
+# 木を後置順にたどり、一つの演算を一行の代入にした関数のソースを作る。
+# 一時変数は評価のスタックの深さごとに使い回すので、生きている中間の値は
+# スタックの深さの分だけで済み、深い木でもソースの入れ子は深くならない。
+# 変数に NumPy の配列を渡すと、演算子がそのまま配列の演算になり、
+# 全部の行を一度に計算する (0 で割ると例外ではなく inf や nan になる)。
+
+OPERATOR_SOURCE = {PLUS: "+", MINUS: "-", ASTERISK: "*", SLASH: "/"}
+
+
+def variables_of(node):
+    """式の変数の名前を出てくる順に返す"""
+    names = []
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if node.kind == IDENT:
+            if node.val not in names:
+                names.append(node.val)
+        elif node.kind in OPERATOR_SOURCE:
+            stack.append(node.right)
+            stack.append(node.left)
+    return names
+
+
+def compile_source(node):
+    """(変数の名前, ソース, 定数) を返す。定数は名前と値の辞書で、ソースからは名前で引く"""
+    names = variables_of(node)
+    lines = [f"def compiled({', '.join('v_' + v for v in names)}):"]
+    # repr では inf などを書けないので、定数は名前空間に置く
+    constants = {}
+    index = {}
+    stack = [(node, False)]
+    depth = 0
+    while stack:
+        node, visited = stack.pop()
+        if node.kind == INT or node.kind == FLOAT:
+            key = (node.kind, node.val)
+            name = index.get(key)
+            if name is None:
+                name = f"c{len(constants)}"
+                index[key] = name
+                constants[name] = node.val
+            lines.append(f"    t{depth} = {name}")
+            depth += 1
+        elif node.kind == IDENT:
+            lines.append(f"    t{depth} = v_{node.val}")
+            depth += 1
+        elif node.kind in OPERATOR_SOURCE:
+            if visited:
+                depth -= 1
+                operator = OPERATOR_SOURCE[node.kind]
+                lines.append(f"    t{depth - 1} = t{depth - 1} {operator} t{depth}")
+            else:
+                stack.append((node, True))
+                stack.append((node.right, False))
+                stack.append((node.left, False))
+        else:
+            raise ValueError(f"{node.kind} はコンパイルできません")
+    lines.append("    return t0")
+    return names, "\n".join(lines), constants
+
+
+class Compiled:
+    """コンパイルした式
+
+    変数の値は variables の順に位置で渡すか、名前のキーワードで渡す。
+    """
+
+    def __init__(self, variables, source, fn):
+        self.variables = variables
+        self.source = source
+        self.fn = fn
+
+    def __call__(self, *args, **kwargs):
+        if kwargs:
+            rest = self.variables[len(args):]
+            unknown = sorted(set(kwargs) - set(rest))
+            if unknown:
+                raise TypeError(f"{', '.join(unknown)} という変数はありません")
+            missing = [v for v in rest if v not in kwargs]
+            if missing:
+                raise TypeError(f"{', '.join(missing)} の値がありません")
+            args = args + tuple(kwargs[v] for v in rest)
+        return self.fn(*args)
+
 
-    return None
+def compile_node(node):
+    """式を Python の関数にコンパイルして Compiled を返す"""
+    names, source, constants = compile_source(node)
+    namespace = dict(constants)
+    exec(compile(source, "<py_bnf>", "exec"), namespace)
+    return Compiled(names, source, namespace["compiled"])
 
 
 if __name__ == "__main__":
@@ -281,6 +503,6 @@ if __name__ == "__main__":
     input = """3.14 * 2;"""
 
     p = new_parser(input)
-    node = p.expr()
+    node = p.parse()
     evaluated = eval(node)
     print(evaluated)
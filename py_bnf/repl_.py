@@ -6,9 +6,22 @@ try:
     while True:
         print(">> ", end="")
         line = input()
-        p = parser_.new_parser(line)
-        node = p.expr()
-        evaluated = parser_.eval(node)
+        # エラーは表示して次の行へ進む
+        try:
+            node = parser_.parse(line)
+            evaluated = parser_.eval(node)
+        except parser_.ParseError as e:
+            print(e)
+            continue
+        except ArithmeticError as e:
+            print(e)
+            continue
+        except ValueError as e:
+            print(e)
+            continue
+        except KeyError as e:
+            print(f"{e.args[0]} は定義されていません")
+            continue
         print(evaluated)
 
 except KeyboardInterrupt:
@@ -0,0 +1,138 @@
+import marshal
+from array import array
+import parser_
+
+
+# 後置記法 (RPN) へのコンパイル
+# 構文木を後置順の命令の列にして、命令の番号の配列 ops と引数の配列 args、
+# 定数のタプル、変数の名前のタプルに詰める。評価はスタックを使う一つの
+# ループで行い、ノードのオブジェクトも再帰も使わない。
+# dumps() / loads() でバイト列にできるので、キャッシュに置いたり
+# ワーカーに送ったりできる。
+
+# 命令
+CONST = 0  # 定数 args[i] を積む
+LOAD = 1  # 変数 args[i] の値を積む
+ADD = 2
+SUB = 3
+MUL = 4
+DIV = 5
+
+OPCODES = {
+    parser_.PLUS: ADD,
+    parser_.MINUS: SUB,
+    parser_.ASTERISK: MUL,
+    parser_.SLASH: DIV,
+}
+
+# 形式を変えたら上げる
+MAGIC = b"RPN1"
+
+
+class Program:
+    """コンパイルした式"""
+
+    def __init__(self, ops, args, constants, names):
+        # 命令 (array("B"))
+        self.ops = ops
+        # 命令の引数 (array("I")。CONST と LOAD 以外は 0)
+        self.args = args
+        self.constants = constants
+        # 変数の名前
+        self.names = names
+
+
+def compile_node(node):
+    """構文木を Program にする"""
+    ops = array("B")
+    args = array("I")
+    constants = []
+    names = []
+    # (型, 値) -> 定数の番号。1 と 1.0 は別にする
+    index = {}
+
+    stack = [(node, False)]
+    while stack:
+        node, visited = stack.pop()
+        if node.kind == parser_.INT or node.kind == parser_.FLOAT:
+            key = (node.kind, node.val)
+            i = index.get(key)
+            if i is None:
+                i = len(constants)
+                index[key] = i
+                constants.append(node.val)
+            ops.append(CONST)
+            args.append(i)
+        elif node.kind == parser_.IDENT:
+            if node.val not in names:
+                names.append(node.val)
+            ops.append(LOAD)
+            args.append(names.index(node.val))
+        elif node.kind in OPCODES:
+            if visited:
+                ops.append(OPCODES[node.kind])
+                args.append(0)
+            else:
+                stack.append((node, True))
+                stack.append((node.right, False))
+                stack.append((node.left, False))
+        else:
+            raise ValueError(f"{node.kind} はコンパイルできません")
+
+    return Program(ops, args, tuple(constants), tuple(names))
+
+
+def compile_input(input):
+    """式の文字列を Program にする"""
+    return compile_node(parser_.parse(input))
+
+
+def run(program, variables=None):
+    """Program を評価する。variables は変数の名前と値の辞書。ない変数は KeyError"""
+    if variables is None:
+        variables = {}
+    values = [variables[v] for v in program.names]
+    constants = program.constants
+
+    stack = []
+    push = stack.append
+    pop = stack.pop
+    for op, arg in zip(program.ops, program.args):
+        if op == CONST:
+            push(constants[arg])
+        elif op == LOAD:
+            push(values[arg])
+        else:
+            # 変数の値が配列でも書き換えないよう、+= などは使わない
+            right = pop()
+            if op == ADD:
+                stack[-1] = stack[-1] + right
+            elif op == SUB:
+                stack[-1] = stack[-1] - right
+            elif op == MUL:
+                stack[-1] = stack[-1] * right
+            else:
+                stack[-1] = stack[-1] / right
+    return stack[-1]
+
+
+def dumps(program):
+    return MAGIC + marshal.dumps((
+        program.ops.tobytes(), program.args.tobytes(), program.constants, program.names,
+    ))
+
+
+def loads(data):
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError("not a compiled expression")
+    ops, args, constants, names = marshal.loads(data[len(MAGIC):])
+    program = Program(array("B"), array("I"), constants, names)
+    program.ops.frombytes(ops)
+    program.args.frombytes(args)
+    return program
+
+
+if __name__ == "__main__":
+    program = compile_input("(x + 2) * -y / 3")
+    print(list(program.ops), list(program.args), program.constants, program.names)
+    print(run(loads(dumps(program)), {"x": 1, "y": 3}))
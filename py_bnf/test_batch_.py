@@ -0,0 +1,91 @@
+# python -m unittest test_batch_.TestBatch.test_run
+import io
+import contextlib
+import unittest
+import batch_
+
+
+class TestBatch(unittest.TestCase):
+
+    lines = [
+        "1 + 2",
+        ".",
+        "",
+        "1 / 0",
+        "1 2",
+        "x * 2",
+        "1" * 400 + " / 1",
+        "(2 + 3) * 4",
+    ]
+    expected = [
+        "3",
+        "ERROR: . は数ではありません",
+        "",
+        "ERROR: division by zero",
+        "ERROR: 2 は余分です",
+        "ERROR: x は定義されていません",
+        "ERROR: integer division result too large for a float",
+        "20",
+    ]
+
+    def test_evaluate(self):
+        assert [batch_.evaluate(v) for v in self.lines] == self.expected
+
+    def test_evaluate_type_error(self):
+        # 予期しない例外もその行のエラーにする
+        class Cache:
+            def eval(self, input):
+                raise TypeError("unsupported operand")
+
+        cache = batch_._cache
+        batch_._cache = Cache()
+        try:
+            assert batch_.evaluate("1") == "ERROR: unsupported operand"
+        finally:
+            batch_._cache = cache
+
+    def test_option(self):
+        argv = ["batch_.py", "in.txt", "--workers", "3"]
+        assert batch_.option(argv, "--workers", None) == 3
+        assert argv == ["batch_.py", "in.txt"]
+        assert batch_.option(argv, "--chunksize", 8) == 8
+
+        for argv in (["batch_.py", "--workers"], ["batch_.py", "--workers", "x"],
+                     ["batch_.py", "--workers", "0"]):
+            with contextlib.redirect_stderr(io.StringIO()) as err:
+                with self.assertRaises(SystemExit):
+                    batch_.option(argv, "--workers", None)
+            assert err.getvalue().startswith(batch_.USAGE)
+
+    def test_run(self):
+        for workers in (1, 2):
+            out = io.StringIO()
+            errors = batch_.run(self.lines * 50, out, workers=workers, chunksize=3)
+            assert out.getvalue().split("\n")[:-1] == self.expected * 50
+            assert errors == 5 * 50
+
+    def test_window(self):
+        # 入力を先に全部は読まない
+        read = []
+
+        def lines():
+            for i in range(1000):
+                read.append(i)
+                yield f"{i} + 1"
+
+        class Out(io.StringIO):
+            first = None
+
+            def write(self, s):
+                if self.first is None:
+                    self.first = len(read)
+                return super().write(s)
+
+        out = Out()
+        assert batch_.run(lines(), out, workers=2, chunksize=4) == 0
+        assert out.first == 2 * 4 * batch_.WINDOW_CHUNKS
+        assert out.getvalue().split() == [str(i + 1) for i in range(1000)]
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+# python -m unittest test_cache_.TestCache.test_lru
+import unittest
+import parser_
+import cache_
+
+
+class TestCache(unittest.TestCase):
+
+    def test_eval(self):
+        cache = cache_.Cache()
+        assert cache.eval("1 + 2") == 3
+        # 空白の違いは同じ式
+        assert cache.eval("  1   +  2 ") == 3
+        assert cache.eval("x * 2", {"x": 5}) == 10
+        assert cache.eval("x  *  2", {"x": 6}) == 12
+        assert cache.stats()["hits"] == 2
+        assert cache.stats()["misses"] == 2
+        assert cache.entries["1 + 2"].constant
+        assert cache.entries["x * 2"].program is not None
+        assert cache.parse("x * 2") is cache.entries["x * 2"].node
+
+    def test_lru(self):
+        cache = cache_.Cache(2)
+        cache.eval("1")
+        cache.eval("2")
+        cache.eval("1")
+        cache.eval("3")
+        # 一番前に使った "2" が追い出される
+        assert list(cache.entries) == ["1", "3"]
+        assert cache.stats() == {
+            "size": 2, "maxsize": 2, "hits": 1, "misses": 3, "evictions": 1, "hit_rate": 0.25,
+        }
+
+    def test_errors(self):
+        cache = cache_.Cache()
+        with self.assertRaises(ZeroDivisionError):
+            cache.eval("1 / 0")
+        with self.assertRaises(parser_.ParseError):
+            cache.eval("1 2")
+        # エラーは覚えない
+        assert len(cache.entries) == 0
+
+
+if __name__ == '__main__':
+    unittest.main()
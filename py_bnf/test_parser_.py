@@ -0,0 +1,107 @@
+# python -m unittest test_parser_.TestParser.test_parse
+import sys
+import unittest
+import parser_
+
+
+def dump(node):
+    # 木を前置順の (種類, 値) のリストにする
+    out = []
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if node is None:
+            out.append(None)
+            continue
+        out.append((node.kind, node.val))
+        stack.append(node.right)
+        stack.append(node.left)
+    return out
+
+
+class TestParser(unittest.TestCase):
+
+    def test_tokenize(self):
+        tokens = parser_.tokenize("x1 + 3.5 * (2 - .)")
+        first = next(tokens)
+        assert (first.type, first.literal) == (parser_.IDENT, "x1")
+        rest = [(v.type, v.literal) for v in tokens]
+        assert rest == [
+            ("+", ""), ("FLOAT", "3.5"), ("*", ""), ("(", ""), ("INT", "2"),
+            ("-", ""), ("ILLEGAL", "."), ("EOF", ""),
+        ]
+
+    def test_parse(self):
+        tests = [
+            ("1 + 2 * 3", 7),
+            ("(1 + 2) * 3", 9),
+            ("-(1 + 2) * 3", -9),
+            ("2 * -3", -6),
+            ("+3", 3),
+            ("1 - 2 - 3", -4),
+            ("8 / 2 / 2", 2.0),
+            ("3.14 * 2", 6.28),
+        ]
+        for input, expected in tests:
+            # 再帰しない parse() は expr() と同じ木を作る
+            node = parser_.new_parser(input).parse()
+            assert dump(node) == dump(parser_.new_parser(input).expr())
+            self.assertAlmostEqual(parser_.eval(node), expected)
+
+    def test_deep(self):
+        depth = sys.getrecursionlimit() * 10
+        input = "(" * depth + "1" + ")" * depth + " + 2"
+        assert parser_.eval(parser_.parse(input)) == 3
+
+    def test_errors(self):
+        for input, message in [
+            ("1 +", "数ではありません"),
+            ("(1", ") ではありません"),
+            (".", ". は数ではありません"),
+            ("1 2", "2 は余分です"),
+            ("(1 + 2))", ") は余分です"),
+        ]:
+            with self.assertRaises(parser_.ParseError) as cm:
+                parser_.parse(input)
+            assert str(cm.exception) == message
+
+    def test_variables(self):
+        node = parser_.parse("(x + 2) * -y / 3 - x * x")
+        assert parser_.variables_of(node) == ["x", "y"]
+        assert parser_.eval(node, {"x": 2.0, "y": 3.0}) == -8.0
+        with self.assertRaises(KeyError):
+            parser_.eval(node, {"x": 1})
+
+    def test_compile(self):
+        node = parser_.parse("(x + 2) * -y / 3 - x * x")
+        compiled = parser_.compile_node(node)
+        assert compiled.variables == ["x", "y"]
+        assert compiled(2.0, 3.0) == -8.0
+        assert compiled(y=3.0, x=2.0) == -8.0
+        assert compiled(2.0, y=3.0) == -8.0
+        with self.assertRaises(TypeError):
+            compiled(x=1, y=2, z=3)
+        with self.assertRaises(TypeError):
+            compiled(x=1)
+
+        # inf になる定数もそのまま使える
+        node = parser_.parse("1" * 400 + ".0 * x")
+        assert parser_.compile_node(node)(x=1) == parser_.eval(node, {"x": 1}) == float("inf")
+
+        depth = sys.getrecursionlimit() * 10
+        node = parser_.parse("(" * depth + "x" + ")" * depth + " * 2")
+        assert parser_.compile_node(node)(x=4) == 8
+
+    def test_compile_numpy(self):
+        try:
+            import numpy as np
+        except ImportError:
+            self.skipTest("numpy is not installed")
+        compiled = parser_.compile_node(parser_.parse("x * 2 + y / 4"))
+        x = np.arange(5.0)
+        y = np.ones(5)
+        assert np.allclose(compiled(x=x, y=y), x * 2 + y / 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
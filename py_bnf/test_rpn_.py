@@ -0,0 +1,54 @@
+# python -m unittest test_rpn_.TestRpn.test_run
+import sys
+import random
+import unittest
+import parser_
+import rpn_
+
+
+class TestRpn(unittest.TestCase):
+
+    def test_compile(self):
+        program = rpn_.compile_input("(x + 2) * -y / 2")
+        assert list(program.ops) == [
+            rpn_.LOAD, rpn_.CONST, rpn_.ADD, rpn_.CONST, rpn_.LOAD, rpn_.SUB, rpn_.MUL,
+            rpn_.CONST, rpn_.DIV,
+        ]
+        assert list(program.args) == [0, 0, 0, 1, 1, 0, 0, 0, 0]
+        # 同じ定数は一つにまとめる
+        assert program.constants == (2, 0)
+        assert program.names == ("x", "y")
+
+    def test_run(self):
+        rng = random.Random(1)
+        for _ in range(200):
+            input = " ".join(f"{rng.randint(1, 9)}.{rng.randint(0, 9)} {rng.choice('+-*/')}" for _ in range(8))
+            input += " (x - 1)"
+            node = parser_.parse(input)
+            program = rpn_.compile_node(node)
+            self.assertAlmostEqual(rpn_.run(program, {"x": 3}), parser_.eval(node, {"x": 3}))
+
+        with self.assertRaises(KeyError):
+            rpn_.run(program)
+        with self.assertRaises(ZeroDivisionError):
+            rpn_.run(rpn_.compile_input("1 / (2 - 2)"))
+
+        depth = sys.getrecursionlimit() * 10
+        program = rpn_.compile_input("(" * depth + "x" + ")" * depth + " * 2")
+        assert rpn_.run(program, {"x": 4}) == 8
+
+    def test_dumps(self):
+        program = rpn_.compile_input("x * 2.5 - 1")
+        loaded = rpn_.loads(rpn_.dumps(program))
+        assert loaded.ops == program.ops
+        assert loaded.args == program.args
+        assert loaded.constants == program.constants
+        assert loaded.names == program.names
+        assert rpn_.run(loaded, {"x": 2}) == 4.0
+
+        with self.assertRaises(ValueError):
+            rpn_.loads(b"XXXX")
+
+
+if __name__ == '__main__':
+    unittest.main()
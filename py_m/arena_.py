@@ -0,0 +1,432 @@
+import marshal
+from array import array
+import ast_
+import parser_
+import object_
+import evaluator_
+from token_ import Token, TokenType, TYPES
+
+
+# 平坦な AST
+# ノードを ast_ のオブジェクトではなく整数の番号で表し、種類・子・定数を
+# 型付きの配列に並べて持つ。子を並べる文 (ブロックの文、引数など) は
+# children 配列の連続した範囲に置き、ノードには先頭の位置と個数を持たせる。
+# 識別子や演算子などの文字列と数値は constants に一度だけ置く。
+
+# ノードの種類
+PROGRAM = 1
+LET = 2
+RETURN = 3
+EXPRESSION = 4
+BLOCK = 5
+IDENTIFIER = 6
+INTEGER = 7
+FLOAT = 8
+BOOLEAN = 9
+STRING = 10
+PREFIX = 11
+INFIX = 12
+IF = 13
+FUNCTION = 14
+CALL = 15
+ARRAY = 16
+
+# 子がないことを表す番号
+NONE = -1
+# Token のないノードの位置
+NO_POSITION = 0xFFFFFFFF
+
+KINDS = {
+    ast_.Program: PROGRAM,
+    ast_.LetStatement: LET,
+    ast_.ReturnStatement: RETURN,
+    ast_.ExpressionStatement: EXPRESSION,
+    ast_.BlockStatement: BLOCK,
+    ast_.Identifier: IDENTIFIER,
+    ast_.IntegerLiteral: INTEGER,
+    ast_.FloatLiteral: FLOAT,
+    ast_.Boolean: BOOLEAN,
+    ast_.StringLiteral: STRING,
+    ast_.PrefixExpression: PREFIX,
+    ast_.InfixExpression: INFIX,
+    ast_.IfExpression: IF,
+    ast_.FunctionLiteral: FUNCTION,
+    ast_.CallExpression: CALL,
+    ast_.ArrayLiteral: ARRAY,
+}
+
+CLASSES = {v: k for k, v in KINDS.items()}
+
+
+class Arena:
+    """AST の各ノードを番号で表し、配列に詰めて持つ"""
+
+    def __init__(self):
+        self.kinds = array("B")
+        # 番号は 4 バイトの符号付き整数で持つ
+        # 子ノードの番号、または children の範囲 (ノードの種類ごとに意味が違う)
+        self.a = array("i")
+        self.b = array("i")
+        self.c = array("i")
+        # 値 (識別子の名前、数値、演算子など) の constants での位置
+        self.values = array("i")
+        # ノードの Token の種類と、文字列の constants での位置
+        self.token_kinds = array("B")
+        self.token_literals = array("i")
+        # Token の入力中の位置。SourceSet の基点と同じく符号なしで持つ
+        self.token_positions = array("I")
+        # ブロックの文、関数の引数などを並べる
+        self.children = array("i")
+        self.constants = []
+        self.constant_index = {}
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def constant(self, value):
+        # 1 と 1.0 と True を区別するため型も鍵に含める
+        key = (type(value), value)
+        i = self.constant_index.get(key)
+        if i is None:
+            i = len(self.constants)
+            self.constants.append(value)
+            self.constant_index[key] = i
+        return i
+
+    def new_node(self, kind, token, a=NONE, b=NONE, c=NONE, value=None):
+        i = len(self.kinds)
+        self.kinds.append(kind)
+        self.a.append(a)
+        self.b.append(b)
+        self.c.append(c)
+        self.values.append(NONE if value is None else self.constant(value))
+        if token is None:
+            self.token_kinds.append(0)
+            self.token_literals.append(NONE)
+            self.token_positions.append(NO_POSITION)
+        else:
+            self.token_kinds.append(token.token_type.value)
+            self.token_literals.append(self.constant(token.literal))
+            self.token_positions.append(token.pos)
+        return i
+
+    def new_list(self, ids):
+        start = len(self.children)
+        self.children.extend(ids)
+        return start
+
+    # 読み出し
+
+    def kind(self, i):
+        return self.kinds[i]
+
+    def value(self, i):
+        v = self.values[i]
+        if v == NONE:
+            return None
+        return self.constants[v]
+
+    def token(self, i):
+        literal = self.token_literals[i]
+        if literal == NONE:
+            return None
+        return Token(TYPES[self.token_kinds[i]], self.constants[literal], self.token_positions[i])
+
+    def token_literal(self, i):
+        return self.constants[self.token_literals[i]]
+
+    def span(self, start, count):
+        return self.children[start:start + count].tolist()
+
+    def statements(self, i):
+        # PROGRAM, BLOCK
+        return self.span(self.a[i], self.b[i])
+
+    def name(self, i):
+        # LET
+        return self.a[i]
+
+    def expression(self, i):
+        # LET の値、RETURN の値、EXPRESSION の式
+        if self.kinds[i] == LET:
+            return self.b[i]
+        return self.a[i]
+
+    def operator(self, i):
+        # PREFIX, INFIX
+        return self.value(i)
+
+    def left(self, i):
+        # INFIX
+        return self.a[i]
+
+    def right(self, i):
+        # PREFIX, INFIX
+        if self.kinds[i] == PREFIX:
+            return self.a[i]
+        return self.b[i]
+
+    def condition(self, i):
+        # IF
+        return self.a[i]
+
+    def consequence(self, i):
+        # IF
+        return self.b[i]
+
+    def alternative(self, i):
+        # IF
+        return self.c[i]
+
+    def parameters(self, i):
+        # FUNCTION
+        return self.span(self.a[i], self.b[i])
+
+    def body(self, i):
+        # FUNCTION
+        return self.c[i]
+
+    def function(self, i):
+        # CALL
+        return self.a[i]
+
+    def arguments(self, i):
+        # CALL
+        return self.span(self.b[i], self.c[i])
+
+    def elements(self, i):
+        # ARRAY
+        return self.span(self.a[i], self.b[i])
+
+    def child_nodes(self, i):
+        """子ノードの番号を順に返す (子がない位置は NONE)"""
+        kind = self.kinds[i]
+        if kind == PROGRAM or kind == BLOCK or kind == ARRAY:
+            return self.span(self.a[i], self.b[i])
+        elif kind == LET or kind == INFIX:
+            return [self.a[i], self.b[i]]
+        elif kind == RETURN or kind == EXPRESSION or kind == PREFIX:
+            return [self.a[i]]
+        elif kind == IF:
+            return [self.a[i], self.b[i], self.c[i]]
+        elif kind == FUNCTION:
+            return self.span(self.a[i], self.b[i]) + [self.c[i]]
+        elif kind == CALL:
+            return [self.a[i]] + self.span(self.b[i], self.c[i])
+        return []
+
+    def walk(self, root):
+        """root から行きがけ順にノードの番号を返す。再帰しない"""
+        stack = [root]
+        while stack:
+            i = stack.pop()
+            if i == NONE:
+                continue
+            yield i
+            children = self.child_nodes(i)
+            children.reverse()
+            stack.extend(children)
+
+    def rebase(self, delta):
+        """Token の位置をすべて delta ずらす (入力の基点を変える)"""
+        if delta != 0:
+            self.token_positions = array(
+                "I", (v + delta if v != NO_POSITION else v for v in self.token_positions))
+
+    def nbytes(self):
+        """配列が使うバイト数 (constants を除く)"""
+        total = 0
+        for v in (self.kinds, self.a, self.b, self.c, self.values,
+                  self.token_kinds, self.token_literals, self.token_positions,
+                  self.children):
+            total += v.itemsize * len(v)
+        return total
+
+    def __str__(self):
+        return "Arena()"
+
+
+# 直列化した Arena の先頭に置く印
+MAGIC = b"MKA1"
+
+# 直列化する配列の並び
+ARRAYS = ("kinds", "a", "b", "c", "values", "token_kinds", "token_literals",
+          "token_positions", "children")
+
+
+def dumps(arena):
+    """arena をバイト列にする。配列はそのままのバイト列、定数は marshal で持つ"""
+    return MAGIC + marshal.dumps(
+        tuple(getattr(arena, v).tobytes() for v in ARRAYS) + (arena.constants,)
+    )
+
+
+def loads(data):
+    """dumps で作ったバイト列から Arena を作る"""
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError("not a serialized arena")
+    *arrays, constants = marshal.loads(data[len(MAGIC):])
+    arena = Arena()
+    for name, raw in zip(ARRAYS, arrays):
+        getattr(arena, name).frombytes(raw)
+    arena.constants = constants
+    arena.constant_index = {(type(v), v): i for i, v in enumerate(constants)}
+    return arena
+
+
+def add(arena, root):
+    """オブジェクトの AST を arena に加え、根の番号を返す。再帰しない"""
+    ids = {}
+
+    def ref(v):
+        return NONE if v is None else ids.pop(id(v))
+
+    stack = [(root, False)]
+    while stack:
+        node, ready = stack.pop()
+        if not ready:
+            stack.append((node, True))
+            for v in reversed(ast_.children(node)):
+                if v is not None:
+                    stack.append((v, False))
+            continue
+
+        t = type(node)
+        kind = KINDS[t]
+        token = getattr(node, "token", None)
+        if t is ast_.Program or t is ast_.BlockStatement:
+            statements = [ref(v) for v in node.statements]
+            i = arena.new_node(kind, token, arena.new_list(statements), len(statements))
+        elif t is ast_.LetStatement:
+            i = arena.new_node(kind, token, ref(node.name), ref(node.value))
+        elif t is ast_.ReturnStatement:
+            i = arena.new_node(kind, token, ref(node.return_value))
+        elif t is ast_.ExpressionStatement:
+            i = arena.new_node(kind, token, ref(node.expression))
+        elif t is ast_.PrefixExpression:
+            i = arena.new_node(kind, token, ref(node.right), value=node.operator)
+        elif t is ast_.InfixExpression:
+            i = arena.new_node(kind, token, ref(node.left), ref(node.right), value=node.operator)
+        elif t is ast_.IfExpression:
+            i = arena.new_node(kind, token, ref(node.condition),
+                               ref(node.consequence), ref(node.alternative))
+        elif t is ast_.FunctionLiteral:
+            params = [ref(v) for v in node.parameters or []]
+            i = arena.new_node(kind, token, arena.new_list(params), len(params), ref(node.body))
+        elif t is ast_.CallExpression:
+            args = [ref(v) for v in node.arguments or []]
+            i = arena.new_node(kind, token, ref(node.function), arena.new_list(args), len(args))
+        elif t is ast_.ArrayLiteral:
+            elements = [ref(v) for v in node.elements or []]
+            i = arena.new_node(kind, token, arena.new_list(elements), len(elements))
+        else:
+            # 識別子とリテラル
+            i = arena.new_node(kind, token, value=node.value)
+        ids[id(node)] = i
+
+    return ids[id(root)]
+
+
+def from_ast(root):
+    """オブジェクトの AST から Arena を作る"""
+    arena = Arena()
+    return arena, add(arena, root)
+
+
+def to_ast(arena, root, functions=None):
+    """arena の root 以下をオブジェクトの AST に戻す。再帰しない
+
+    functions にリストを渡すと、作った FunctionLiteral を加える。
+    """
+    nodes = {}
+
+    def ref(v):
+        return None if v == NONE else nodes.pop(v)
+
+    stack = [(root, False)]
+    while stack:
+        i, ready = stack.pop()
+        if not ready:
+            stack.append((i, True))
+            for v in arena.child_nodes(i):
+                if v != NONE:
+                    stack.append((v, False))
+            continue
+
+        kind = arena.kinds[i]
+        token = arena.token(i)
+        if kind == PROGRAM:
+            node = ast_.Program()
+            node.statements = [ref(v) for v in arena.statements(i)]
+        elif kind == BLOCK:
+            node = ast_.BlockStatement(token=token)
+            node.statements = [ref(v) for v in arena.statements(i)]
+        elif kind == LET:
+            node = ast_.LetStatement(token=token, name=ref(arena.a[i]), value=ref(arena.b[i]))
+        elif kind == RETURN:
+            node = ast_.ReturnStatement(token=token, return_value=ref(arena.a[i]))
+        elif kind == EXPRESSION:
+            node = ast_.ExpressionStatement(token=token, expression=ref(arena.a[i]))
+        elif kind == PREFIX:
+            node = ast_.PrefixExpression(token=token, operator=arena.value(i),
+                                         right=ref(arena.a[i]))
+        elif kind == INFIX:
+            node = ast_.InfixExpression(token=token, operator=arena.value(i),
+                                        left=ref(arena.a[i]), right=ref(arena.b[i]))
+        elif kind == IF:
+            node = ast_.IfExpression(token=token, condition=ref(arena.a[i]),
+                                     consequence=ref(arena.b[i]),
+                                     alternative=ref(arena.c[i]))
+        elif kind == FUNCTION:
+            node = ast_.FunctionLiteral(token=token)
+            node.parameters = [ref(v) for v in arena.parameters(i)]
+            node.body = ref(arena.c[i])
+            if functions is not None:
+                functions.append(node)
+        elif kind == CALL:
+            node = ast_.CallExpression(token=token, function=ref(arena.a[i]))
+            node.arguments = [ref(v) for v in arena.arguments(i)]
+        elif kind == ARRAY:
+            node = ast_.ArrayLiteral(token, [ref(v) for v in arena.elements(i)])
+        else:
+            node = CLASSES[kind](token=token, value=arena.value(i))
+        nodes[i] = node
+
+    return nodes[root]
+
+
+def parse(input, base=0):
+    """入力を構文解析して Arena に詰める
+
+    文を一つ読むたびに Arena へ移すので、オブジェクトの AST は
+    一度に一つの文の分しか作らない。(arena, 根の番号, エラー) を返す。
+    エラーには "行:列: " を付ける。
+    """
+    p = parser_.new_parser(input, base)
+    arena = Arena()
+    statements = []
+    while not p.cur_token_is(TokenType.EOF):
+        stmt = p.parse_statement()
+        if stmt is not None:
+            statements.append(add(arena, stmt))
+        p.next_token()
+    root = arena.new_node(PROGRAM, None, arena.new_list(statements), len(statements))
+    return arena, root, p.located_errors()
+
+
+def evalProgram(arena, root, env, functions=None):
+    """arena のプログラムを評価する
+
+    配列のまま評価するのではない。トップレベルの文を一つずつ to_ast で
+    オブジェクトの AST に戻して evaluator_ で評価し、評価し終わった文は
+    捨てる。Arena で省けるのは、構文解析から評価までの間とキャッシュの
+    AST のメモリで、評価の手間は変わらない。
+    """
+    result = None
+    for i in arena.statements(root):
+        result = evaluator_.Eval(to_ast(arena, i, functions), env)
+        if type(result) is object_.ReturnValue:
+            return result.value
+        elif type(result) is object_.Error:
+            return result
+    return result
@@ -1,5 +1,6 @@
 from abc import ABCMeta, abstractmethod
 import token_
+import printer_
 
 
 class Node(metaclass=ABCMeta):
@@ -11,6 +12,10 @@ class Node(metaclass=ABCMeta):
     def string(self):
         pass
 
+    def parts(self):
+        """文字列表現の並び (文字列と子ノード)。printer_ が書き出す"""
+        return [self.string()]
+
 
 class Statement(Node):
     @abstractmethod
@@ -34,11 +39,11 @@ class Program(Node):
         else:
             return ""
 
+    def parts(self):
+        return list(self.statements)
+
     def string(self):
-        s = ""
-        for v in self.statements:
-            s += v.string()
-        return s
+        return printer_.render(self)
 
     def __str__(self):
         return "Program(Node)"
@@ -58,15 +63,11 @@ class LetStatement(Statement):
     def statement_node(self):
         pass
 
+    def parts(self):
+        return [self.token_literal(), " ", self.name, " = ", self.value, ";"]
+
     def string(self):
-        out = self.token_literal()
-        out += " "
-        out += self.name.string()
-        out += " = "
-        if self.value is not None:
-            out += self.value.string()
-        out += ";"
-        return out
+        return printer_.render(self)
 
     def __str__(self):
         return "LetStatement(Statement)"
@@ -105,13 +106,11 @@ class ReturnStatement(Statement):
     def statement_node(self):
         pass
 
+    def parts(self):
+        return [self.token_literal(), " ", self.return_value, ";"]
+
     def string(self):
-        out = self.token_literal()
-        out += " "
-        if self.return_value is not None:
-            out += self.return_value.string()
-        out += ";"
-        return out
+        return printer_.render(self)
 
     def __str__(self):
         return "ReturnStatement(Statement)"
@@ -130,11 +129,11 @@ class ExpressionStatement(Statement):
     def statement_node(self):
         pass
 
-    def string(self):
-        if self.expression is not None:
-            return self.expression.string()
+    def parts(self):
+        return [self.expression]
 
-        return ""
+    def string(self):
+        return printer_.render(self)
 
     def __str__(self):
         return "ExpressionStatement(Statement)"
@@ -195,12 +194,11 @@ class PrefixExpression(Expression):
     def expression_node(self):
         pass
 
+    def parts(self):
+        return ["(", self.operator, self.right, ")"]
+
     def string(self):
-        out = "("
-        out += self.operator
-        out += self.right.string()
-        out += ")"
-        return out
+        return printer_.render(self)
 
     def __str__(self):
         return "PrefixExpression(Expression)"
@@ -214,6 +212,10 @@ class InfixExpression(Expression):
         self.left = left
         self.operator = operator
         self.right = right
+        # 評価器が書き込む特殊化済みの演算 (evaluator_.quicken を参照)
+        self.quick = None
+        # 特殊化が外れた回数
+        self.misses = 0
 
     def token_literal(self):
         return self.token.literal
@@ -221,15 +223,11 @@ class InfixExpression(Expression):
     def expression_node(self):
         pass
 
+    def parts(self):
+        return ["(", self.left, " ", self.operator, " ", self.right, ")"]
+
     def string(self):
-        out = "("
-        out += self.left.string()
-        out += " "
-        out += self.operator
-        out += " "
-        out += self.right.string()
-        out += ")"
-        return out
+        return printer_.render(self)
 
     def __str__(self):
         return "InfixExpression(Expression)"
@@ -270,16 +268,15 @@ class IfExpression(Expression):
     def expression_node(self):
         pass
 
-    def string(self):
-        out = "if"
-        out += self.condition.string()
-        out += " "
-        out += self.consequence.string()
+    def parts(self):
+        out = ["if", self.condition, " ", self.consequence]
         if self.alternative is not None:
-            out += "else "
-            out += self.alternative.string()
+            out += ["else ", self.alternative]
         return out
 
+    def string(self):
+        return printer_.render(self)
+
     def __str__(self):
         return "IfExpression(Expression)"
 
@@ -297,11 +294,11 @@ class BlockStatement(Statement):
     def statement_node(self):
         pass
 
+    def parts(self):
+        return list(self.statements)
+
     def string(self):
-        s = ""
-        for v in self.statements:
-            s += v.string()
-        return s
+        return printer_.render(self)
 
     def __str__(self):
         return "BlockStatement(Statement)"
@@ -316,6 +313,8 @@ class FunctionLiteral(Expression):
         self.parameters = []
         # BlockStatement
         self.body = body
+        # 変数の解析結果 (closure_.analyze を参照)
+        self.scope = None
 
     def token_literal(self):
         return self.token.literal
@@ -323,18 +322,15 @@ class FunctionLiteral(Expression):
     def expression_node(self):
         pass
 
-    def string(self):
-        params = []
-        for v in self.parameters:
-            params.append(v.string())
-
-        out = self.token_literal()
-        out += "("
-        out += ", ".join(params)
-        out += ")"
-        out += self.body.string()
+    def parts(self):
+        out = [self.token_literal(), "("]
+        out += printer_.separated(self.parameters)
+        out += [")", self.body]
         return out
 
+    def string(self):
+        return printer_.render(self)
+
     def __str__(self):
         return "FunctionLiteral(Expression)"
 
@@ -355,18 +351,15 @@ class CallExpression(Expression):
     def expression_node(self):
         pass
 
-    def string(self):
-        args = []
-        for v in self.arguments:
-            args.append(v.string())
-
-        out = self.function.string()
-        out += "("
-        out += ", ".join(args)
-        out += ")"
-
+    def parts(self):
+        out = [self.function, "("]
+        out += printer_.separated(self.arguments)
+        out.append(")")
         return out
 
+    def string(self):
+        return printer_.render(self)
+
     def __str__(self):
         return "CallExpression(Expression)"
 
@@ -406,21 +399,45 @@ class ArrayLiteral(Expression):
     def expression_node(self):
         pass
 
-    def string(self):
-        el = []
-        for v in self.elements:
-            el.append(v.string())
-
-        out = "["
-        out += ", ".join(el)
-        out += "]"
-
+    def parts(self):
+        out = ["["]
+        out += printer_.separated(self.elements)
+        out.append("]")
         return out
 
+    def string(self):
+        return printer_.render(self)
+
     def __str__(self):
         return "ArrayLiteral(Expression)"
 
 
+def children(node):
+    """子ノードを順に返す (None を含むことがある)"""
+    t = type(node)
+    if t is Program or t is BlockStatement:
+        return node.statements
+    elif t is LetStatement:
+        return [node.name, node.value]
+    elif t is ReturnStatement:
+        return [node.return_value]
+    elif t is ExpressionStatement:
+        return [node.expression]
+    elif t is PrefixExpression:
+        return [node.right]
+    elif t is InfixExpression:
+        return [node.left, node.right]
+    elif t is IfExpression:
+        return [node.condition, node.consequence, node.alternative]
+    elif t is FunctionLiteral:
+        return (node.parameters or []) + [node.body]
+    elif t is CallExpression:
+        return [node.function] + (node.arguments or [])
+    elif t is ArrayLiteral:
+        return node.elements or []
+    return []
+
+
 if __name__ == "__main__":
     from token_ import Token, TokenType
     ls = LetStatement(
@@ -1,5 +1,6 @@
 import object_
 import evaluator_ as env
+import vector_
 
 
 def builtin_len(args):
@@ -7,8 +8,139 @@ def builtin_len(args):
         return env.newError(f"wrong number of arguments. got={len(args)}, want=1")
     if type(args[0]) is object_.String:
         return object_.Integer(len(args[0].value))
+    if type(args[0]) is object_.Array:
+        return object_.Integer(len(args[0].elements))
     return env.newError(f"argument to `len` not supported, got {args[0].Type()}")
 
 
+def builtin_sum(args):
+    if len(args) != 1:
+        return env.newError(f"wrong number of arguments. got={len(args)}, want=1")
+    if type(args[0]) is not object_.Array:
+        return env.newError(f"argument to `sum` not supported, got {args[0].Type()}")
+    return vector_.arraySum(args[0])
+
+
+def builtin_min(args):
+    if len(args) != 1:
+        return env.newError(f"wrong number of arguments. got={len(args)}, want=1")
+    if type(args[0]) is not object_.Array:
+        return env.newError(f"argument to `min` not supported, got {args[0].Type()}")
+    return vector_.arrayMin(args[0])
+
+
+def builtin_max(args):
+    if len(args) != 1:
+        return env.newError(f"wrong number of arguments. got={len(args)}, want=1")
+    if type(args[0]) is not object_.Array:
+        return env.newError(f"argument to `max` not supported, got {args[0].Type()}")
+    return vector_.arrayMax(args[0])
+
+
+def builtin_dot(args):
+    if len(args) != 2:
+        return env.newError(f"wrong number of arguments. got={len(args)}, want=2")
+    for v in args:
+        if type(v) is not object_.Array:
+            return env.newError(f"argument to `dot` not supported, got {v.Type()}")
+    return vector_.arrayDot(args[0], args[1])
+
+
+def builtin_map(args):
+    if len(args) != 2:
+        return env.newError(f"wrong number of arguments. got={len(args)}, want=2")
+    if type(args[0]) is not object_.Array:
+        return env.newError(f"argument to `map` must be ARRAY, got {args[0].Type()}")
+    call = env.functionCaller(args[1], 1)
+    if type(call) is object_.Error:
+        return call
+
+    result = []
+    for v in args[0].elements:
+        mapped = call(v)
+        if type(mapped) is object_.Error:
+            return mapped
+        result.append(mapped)
+    return object_.Array(result)
+
+
+def builtin_filter(args):
+    if len(args) != 2:
+        return env.newError(f"wrong number of arguments. got={len(args)}, want=2")
+    if type(args[0]) is not object_.Array:
+        return env.newError(f"argument to `filter` must be ARRAY, got {args[0].Type()}")
+    call = env.functionCaller(args[1], 1)
+    if type(call) is object_.Error:
+        return call
+
+    result = []
+    for v in args[0].elements:
+        keep = call(v)
+        if type(keep) is object_.Error:
+            return keep
+        if env.isTruthy(keep):
+            result.append(v)
+    return object_.Array(result)
+
+
+def builtin_reduce(args):
+    if len(args) != 3:
+        return env.newError(f"wrong number of arguments. got={len(args)}, want=3")
+    if type(args[0]) is not object_.Array:
+        return env.newError(f"argument to `reduce` must be ARRAY, got {args[0].Type()}")
+    call = env.functionCaller(args[2], 2)
+    if type(call) is object_.Error:
+        return call
+
+    result = args[1]
+    for v in args[0].elements:
+        result = call(result, v)
+        if type(result) is object_.Error:
+            return result
+    return result
+
+
+def builtin_sort(args):
+    if len(args) != 1 and len(args) != 2:
+        return env.newError(f"wrong number of arguments. got={len(args)}, want=1 or 2")
+    if type(args[0]) is not object_.Array:
+        return env.newError(f"argument to `sort` must be ARRAY, got {args[0].Type()}")
+
+    elements = args[0].elements
+    keys = elements
+    if len(args) == 2:
+        # キーは要素ごとに一度だけ計算する
+        call = env.functionCaller(args[1], 1)
+        if type(call) is object_.Error:
+            return call
+        keys = []
+        for v in elements:
+            key = call(v)
+            if type(key) is object_.Error:
+                return key
+            keys.append(key)
+
+    values = []
+    for v in keys:
+        if type(v) is not object_.Integer and type(v) is not object_.Float \
+                and type(v) is not object_.String:
+            return env.newError(f"sort key not supported, got {v.Type()}")
+        values.append(v.value)
+
+    try:
+        order = sorted(range(len(values)), key=values.__getitem__)
+    except TypeError:
+        return env.newError("sort keys must be all numbers or all strings")
+    return object_.Array([elements[i] for i in order])
+
+
 builtins = {}
 builtins["len"] = object_.Builtin(builtin_len)
+builtins["sum"] = object_.Builtin(builtin_sum)
+builtins["min"] = object_.Builtin(builtin_min)
+builtins["max"] = object_.Builtin(builtin_max)
+builtins["dot"] = object_.Builtin(builtin_dot)
+builtins["map"] = object_.Builtin(builtin_map)
+builtins["filter"] = object_.Builtin(builtin_filter)
+builtins["reduce"] = object_.Builtin(builtin_reduce)
+builtins["sort"] = object_.Builtin(builtin_sort)
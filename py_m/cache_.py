@@ -0,0 +1,183 @@
+import os
+import sys
+import hashlib
+import marshal
+import tempfile
+import token_
+import lexer_
+import parser_
+import ast_
+import arena_
+import closure_
+import object_
+import env_
+import tier_
+
+
+# コンパイル結果のキャッシュ
+# .pyc と同じように、スクリプトの隣の __monkeycache__ に構文解析した Arena と
+# tier_ がコンパイルしたコードを置き、次に同じスクリプトを実行するときは
+# 字句解析・構文解析・コンパイルを飛ばす。
+#
+# ファイルはソースのハッシュとインタープリターの版で検証し、合わなければ
+# 作り直す。インタープリターの版は、キャッシュに置くものを作るモジュール
+# (字句解析・構文解析・AST・Arena・変数の解析・tier_ のコード生成) のソースの
+# ハッシュなので、それらを変えれば VERSION を上げなくても作り直す。一時ファイルに書いてから os.replace で置き換えるので、同時に
+# 動く別のプロセスが書きかけのファイルを読むことはない。
+
+# 形式を変えたら上げる
+VERSION = 2
+MAGIC = b"MKC1"
+# marshal したコードは Python の版に依存する
+TAG = sys.implementation.cache_tag
+CACHE_DIR = "__monkeycache__"
+
+# キャッシュに置くものを作るモジュール
+MODULES = [token_, lexer_, parser_, ast_, arena_, closure_, tier_]
+
+_interpreter = None
+
+
+class Entry:
+    """キャッシュの中身"""
+
+    def __init__(self, digest, arena, root, errors, codes):
+        self.digest = digest
+        self.arena = arena
+        self.root = root
+        self.errors = errors
+        # tier_ が生成したソース -> コード
+        self.codes = codes
+
+    def __str__(self):
+        return "Entry()"
+
+
+def cache_path(path):
+    directory, name = os.path.split(os.path.abspath(path))
+    return os.path.join(directory, CACHE_DIR, f"{name}.{TAG}.mkc")
+
+
+def source_hash(input):
+    return hashlib.sha256(input.encode("utf-8")).digest()
+
+
+def interpreter_hash():
+    """MODULES のソースのハッシュ"""
+    global _interpreter
+    if _interpreter is None:
+        h = hashlib.sha256()
+        for v in MODULES:
+            with open(v.__file__, "rb") as f:
+                h.update(f.read())
+        _interpreter = h.digest()
+    return _interpreter
+
+
+def read(path, digest):
+    """キャッシュを読む。無い、壊れている、版やハッシュが合わないときは None"""
+    try:
+        with open(cache_path(path), "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    if data[:len(MAGIC)] != MAGIC:
+        return None
+
+    try:
+        version, tag, interpreter, cached, arena, root, errors, codes = marshal.loads(data[len(MAGIC):])
+    except (ValueError, EOFError, TypeError):
+        return None
+    if version != VERSION or tag != TAG or interpreter != interpreter_hash() or cached != digest:
+        return None
+
+    try:
+        arena = arena_.loads(arena)
+    except ValueError:
+        return None
+    return Entry(digest, arena, root, errors, codes)
+
+
+def write(path, entry):
+    """キャッシュを書く。書けないときは何もしない"""
+    target = cache_path(path)
+    data = MAGIC + marshal.dumps((
+        VERSION, TAG, interpreter_hash(), entry.digest, arena_.dumps(entry.arena),
+        entry.root, entry.errors, entry.codes,
+    ))
+    try:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(target), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, target)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+    except OSError:
+        pass
+
+
+def load(path, base=0):
+    """スクリプトを読み込み、キャッシュがあれば使う。Entry を返す
+
+    キャッシュの Arena は基点 0 で持ち、読み込んだ後で base にずらす。
+    """
+    with open(path, encoding="utf-8") as f:
+        input = f.read()
+    digest = source_hash(input)
+
+    entry = read(path, digest)
+    if entry is None:
+        arena, root, errors = arena_.parse(input)
+        entry = Entry(digest, arena, root, errors, {})
+        write(path, entry)
+
+    entry.arena.rebase(base)
+    return entry
+
+
+def run(path, env=None):
+    """スクリプトを評価して結果を返す
+
+    キャッシュにあるコードを tier_ に渡しておき、評価中にこのスクリプトの
+    関数リテラルから新しくコンパイルしたコードがあればキャッシュに加える。
+    """
+    if env is None:
+        env = env_.NewEnvironment()
+
+    entry = load(path)
+    if len(entry.errors) != 0:
+        return object_.Error(entry.errors[0])
+
+    for source, code in entry.codes.items():
+        tier_.codes.setdefault(source, code)
+
+    functions = []
+    result = arena_.evalProgram(entry.arena, entry.root, env, functions)
+
+    # 他のスクリプトの関数のコードは置かない
+    new = {}
+    for v in functions:
+        scope = v.scope
+        if scope is None or not scope.compiled:
+            continue
+        if scope.source not in entry.codes and scope.source in tier_.codes:
+            new[scope.source] = tier_.codes[scope.source]
+    if new:
+        entry.codes.update(new)
+        write(path, entry)
+    return result
+
+
+if __name__ == "__main__":
+    # python cache_.py スクリプト
+    tier_.enable()
+    result = run(sys.argv[1])
+    if result is not None:
+        print(result.Inspect())
+    if type(result) is object_.Error:
+        sys.exit(1)
@@ -0,0 +1,182 @@
+import ast_
+import object_
+import env_
+
+
+# クロージャーの変換
+# 関数の値は定義した環境をまるごと持つので、小さなクロージャーが外側の
+# 関数の一時的な値まで生かし続け、変数を引くたびに長い環境の連なりを
+# たどる。関数リテラルが使う外側の変数 (自由変数) を調べておき、関数を
+# 作るときにその値だけを小さな環境に写して、外側はトップレベルの環境に
+# つなぐ。トップレベルの変数と組み込み関数はこれまでどおり名前で引く。
+#
+# 値を写すと、後から同じ名前を let し直したときに結果が変わる。そこで
+# 呼び出しの環境に関数の Scope を持たせ、次のときは環境をまるごと持つ。
+# - 変数を束縛する関数の中で、その名前を二度以上束縛している
+# - 関数を作る時点で、外側の関数の変数がまだ束縛されていない (再帰など)
+# - どの関数の環境か分からない環境を通る
+
+
+class Scope:
+    """関数リテラルの変数"""
+
+    def __init__(self, names, rebound, free, escapes=True, pos=-1):
+        # 引数と本体で let する名前
+        self.names = names
+        # 二度以上束縛する名前
+        self.rebound = rebound
+        # 外側の変数
+        self.free = free
+        # 本体に関数リテラルがあり、呼び出しの環境が呼び出しの後まで残りうる
+        self.escapes = escapes
+        # 関数リテラルの位置 (memprof_ が関数の名前に使う)
+        self.pos = pos
+        # tier_ がコンパイルした本体 (False ならコンパイルできない) とそのソース
+        self.compiled = None
+        self.source = None
+
+    def __str__(self):
+        return "Scope()"
+
+
+# 写した値を持つ環境の印
+CAPTURED = Scope(frozenset(), frozenset(), ())
+
+
+def analyze(fn):
+    """関数リテラル fn の変数を調べる。結果は fn.scope に覚える"""
+    counts = {}
+    for v in fn.parameters or []:
+        counts[v.value] = counts.get(v.value, 0) + 1
+
+    uses = set()
+    escapes = False
+    stack = [fn.body]
+    while stack:
+        node = stack.pop()
+        t = type(node)
+        if node is None:
+            continue
+        elif t is ast_.Identifier:
+            uses.add(node.value)
+        elif t is ast_.LetStatement:
+            name = node.name.value
+            counts[name] = counts.get(name, 0) + 1
+            stack.append(node.value)
+        elif t is ast_.FunctionLiteral:
+            inner = node.scope
+            if inner is None:
+                inner = analyze(node)
+            uses.update(inner.free)
+            escapes = True
+        else:
+            stack.extend(ast_.children(node))
+
+    names = frozenset(counts)
+    rebound = frozenset(k for k, v in counts.items() if v > 1)
+    free = tuple(sorted(uses - names))
+    pos = fn.token.pos if fn.token is not None else -1
+    fn.scope = Scope(names, rebound, free, escapes, pos)
+    return fn.scope
+
+
+def capture(scope, env):
+    """関数を作るときの環境 env から、関数が持つ環境を作る"""
+    if env.outer is None:
+        return env
+
+    root = env
+    while root.outer is not None:
+        root = root.outer
+
+    store = {}
+    for name in scope.free:
+        e = env
+        while e is not root:
+            s = e.scope
+            if s is None:
+                return env
+            val = e.store.get(name)
+            if val is not None:
+                if name in s.rebound:
+                    return env
+                store[name] = val
+                break
+            if name in s.names:
+                # 外側の関数の変数だが、まだ束縛されていない
+                return env
+            e = e.outer
+
+    captured = env_.NewEnclosedEnvironment(root)
+    captured.store = store
+    captured.scope = CAPTURED
+    return captured
+
+
+def newFunction(node, env):
+    """関数リテラル node を env で評価した関数の値を作る"""
+    scope = node.scope
+    if scope is None:
+        scope = analyze(node)
+    fn = object_.Function(parameters=node.parameters, body=node.body, env=capture(scope, env))
+    fn.scope = scope
+    fn.compiled = scope.compiled
+    return fn
+
+
+def compact(root):
+    """トップレベルの環境 root から届く関数の環境を、使う変数だけの環境にする
+
+    関数の呼び出しの途中でないとき (REPL の行と行の間) に呼ぶ。そのとき
+    呼び出しの環境はもう束縛が変わらないので、環境をまるごと持っていた
+    関数も自由変数の値だけを写せば結果は変わらない。内側の束縛に隠された
+    外側の束縛や、使わない一時的な値を持つ環境はどこからも参照されなくなる。
+    届いた関数のリストを返す。
+    """
+    functions = []
+    seen = set()
+    stack = list(root.store.values())
+    while stack:
+        v = stack.pop()
+        t = type(v)
+        if t is object_.Array:
+            if v.numbers is None or v.numbers is False:
+                stack.extend(v.elements)
+        elif t is object_.Function and id(v) not in seen:
+            seen.add(id(v))
+            functions.append(v)
+            env = v.env
+            if env is root:
+                continue
+            if env.scope is not CAPTURED and v.scope is not None:
+                env = freeze(v.scope, env, root)
+                v.env = env
+            stack.extend(env.store.values())
+    return functions
+
+
+def freeze(scope, env, root):
+    """env の連なりから scope の自由変数の値を写した環境を作る
+
+    env の連なりが root に届かなければ env をそのまま返す。
+    """
+    e = env
+    while e is not root:
+        if e is None:
+            return env
+        e = e.outer
+
+    store = {}
+    for name in scope.free:
+        e = env
+        while e is not root:
+            val = e.store.get(name)
+            if val is not None:
+                store[name] = val
+                break
+            e = e.outer
+
+    frozen = env_.NewEnclosedEnvironment(root)
+    frozen.store = store
+    frozen.scope = CAPTURED
+    return frozen
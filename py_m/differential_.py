@@ -0,0 +1,204 @@
+import os
+import sys
+import math
+import random
+import importlib.util
+from time import perf_counter
+import token_
+import lexer_
+import parser_
+import object_
+import evaluator_
+import env_
+
+
+# py_m と py_bnf の突き合わせ
+# 四則演算と括弧、整数、小数の式は py_m と py_bnf のどちらでも評価できる。
+# 大きさと括弧の深さを決めて乱数で式を作り、両方で評価して結果が合うかを
+# 確かめ、字句解析・構文解析・評価の速さをそれぞれ測る。
+#
+# - py_m は整数同士で割り切れる割り算を整数にするので、結果は math.isclose で比べる
+# - ゼロ除算は py_m ではエラー、py_bnf では ZeroDivisionError になる。どちらも
+#   エラーなら合っているものとする
+
+BNF_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "py_bnf", "parser_.py")
+
+OPERATORS = ["+", "-", "*", "/"]
+# 数を括弧の中の式にする割合
+PAREN_RATE = 0.3
+# 数に単項の - を付ける割合
+MINUS_RATE = 0.1
+
+
+def load_bnf(path=BNF_PATH):
+    """py_bnf/parser_.py を py_m の parser_ とぶつからない名前で読み込む"""
+    spec = importlib.util.spec_from_file_location("bnf_parser_", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def number(rng):
+    if rng.random() < 0.3:
+        literal = f"{rng.randint(0, 99)}.{rng.randint(0, 99)}"
+    else:
+        literal = str(rng.randint(0, 99))
+    if rng.random() < MINUS_RATE:
+        return "-" + literal
+    return literal
+
+
+def generate(rng, size, depth):
+    """size 個の数を depth 段までの括弧で組み合わせた式を作る"""
+    parts = []
+    remaining = size
+    while remaining > 0:
+        if parts:
+            parts.append(rng.choice(OPERATORS))
+        k = 1
+        if depth > 0 and remaining > 1 and rng.random() < PAREN_RATE:
+            k = rng.randint(2, max(2, remaining // 2))
+            parts.append("(" + generate(rng, k, depth - 1) + ")")
+        else:
+            parts.append(number(rng))
+        remaining -= k
+    return " ".join(parts)
+
+
+class Timing:
+    """一つの処理系の時間"""
+
+    def __init__(self, name):
+        self.name = name
+        self.lex = 0.0
+        self.parse = 0.0
+        self.eval = 0.0
+
+    def __str__(self):
+        return "Timing()"
+
+
+class Report:
+    """突き合わせの結果"""
+
+    def __init__(self, count, chars):
+        self.count = count
+        self.chars = chars
+        # (式, py_m の結果, py_bnf の結果)
+        self.mismatches = []
+        self.errors = 0
+        self.timings = []
+
+    def describe(self):
+        out = [f"{self.count} expressions, {self.chars} chars, "
+               f"{self.errors} errors, {len(self.mismatches)} mismatches"]
+        for t in self.timings:
+            for phase in ("lex", "parse", "eval"):
+                seconds = getattr(t, phase)
+                rate = self.count / seconds if seconds > 0 else float("inf")
+                out.append(f"{t.name:6} {phase:5} {seconds:8.4f}s {rate:12.0f} expr/s")
+        for input, m, b in self.mismatches[:10]:
+            out.append(f"mismatch: {input} => py_m {m}, py_bnf {b}")
+        return "\n".join(out)
+
+    def __str__(self):
+        return "Report()"
+
+
+def run_m(inputs, timing):
+    """py_m で評価する。結果は数か None (エラー)"""
+    start = perf_counter()
+    for v in inputs:
+        lex = lexer_.Lexer(v)
+        while lex.next_token().token_type is not token_.TokenType.EOF:
+            pass
+    timing.lex = perf_counter() - start
+
+    start = perf_counter()
+    programs = []
+    for v in inputs:
+        p = parser_.Parser(lexer_.Lexer(v))
+        programs.append((p.parse_program(), len(p.Errors()) != 0))
+    timing.parse = perf_counter() - start
+
+    results = []
+    start = perf_counter()
+    for program, failed in programs:
+        if failed:
+            results.append(None)
+            continue
+        obj = evaluator_.Eval(program, env_.NewEnvironment())
+        t = type(obj)
+        results.append(obj.value if t is object_.Integer or t is object_.Float else None)
+    timing.eval = perf_counter() - start
+    return results
+
+
+def run_bnf(bnf, inputs, timing):
+    """py_bnf で評価する。結果は数か None (エラー)"""
+    start = perf_counter()
+    for v in inputs:
+        lex = bnf.Lexer(v)
+        while lex.next_token().type != bnf.EOF:
+            pass
+    timing.lex = perf_counter() - start
+
+    start = perf_counter()
+    nodes = [bnf.new_parser(v).expr() for v in inputs]
+    timing.parse = perf_counter() - start
+
+    results = []
+    start = perf_counter()
+    for node in nodes:
+        try:
+            results.append(bnf.eval(node))
+        except ZeroDivisionError:
+            results.append(None)
+    timing.eval = perf_counter() - start
+    return results
+
+
+def agree(m, b):
+    if m is None or b is None:
+        return m is None and b is None
+    if m == b:
+        return True
+    return math.isclose(m, b, rel_tol=1e-9, abs_tol=1e-9)
+
+
+def compare(inputs, bnf=None):
+    """inputs の式を両方で評価して Report を返す"""
+    if bnf is None:
+        bnf = load_bnf()
+    report = Report(len(inputs), sum(len(v) for v in inputs))
+    m_timing = Timing("py_m")
+    b_timing = Timing("py_bnf")
+    m_results = run_m(inputs, m_timing)
+    b_results = run_bnf(bnf, inputs, b_timing)
+    report.timings = [m_timing, b_timing]
+
+    for input, m, b in zip(inputs, m_results, b_results):
+        if m is None or b is None:
+            report.errors += 1
+        if not agree(m, b):
+            report.mismatches.append((input, m, b))
+    return report
+
+
+def run(count=1000, size=20, depth=3, seed=0):
+    rng = random.Random(seed)
+    inputs = [generate(rng, size, depth) for _ in range(count)]
+    return compare(inputs)
+
+
+if __name__ == "__main__":
+    # python differential_.py [--count N] [--size N] [--depth N] [--seed N]
+    def option(name, default):
+        if name in sys.argv[1:]:
+            return int(sys.argv[sys.argv.index(name) + 1])
+        return default
+
+    report = run(option("--count", 1000), option("--size", 20), option("--depth", 3), option("--seed", 0))
+    print(report.describe())
+    if report.mismatches:
+        sys.exit(1)
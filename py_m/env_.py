@@ -2,6 +2,8 @@ class Environment:
     def __init__(self):
         self.store = {}
         self.outer = None
+        # 関数呼び出しの環境なら、その関数の closure_.Scope
+        self.scope = None
 
     # 辞書のデフォルト引数は、違うオブジェクトを作ったとき
     # 引数を省略して関数を呼び出すと、前の値が使われるので注意
@@ -21,6 +23,10 @@ class Environment:
         self.store[name] = val
         return val
 
+    def Delete(self, name):
+        """この環境の束縛を消す。消したら True"""
+        return self.store.pop(name, None) is not None
+
     def __str__(self):
         return "Environment"
 
@@ -33,3 +39,30 @@ def NewEnclosedEnvironment(outer):
     e = NewEnvironment()
     e.outer = outer
     return e
+
+
+# 関数呼び出しの環境 (フレーム) の空き
+# 本体に関数リテラルのない関数は、呼び出しが終われば環境をどこからも
+# 参照されない (closure_.Scope.escapes を参照)。その環境を空にして取っておき、
+# 次の呼び出しで使い回す。
+frames = []
+FRAME_POOL_LIMIT = 64
+
+
+def NewFrame(outer, scope):
+    if frames:
+        e = frames.pop()
+    else:
+        e = Environment()
+    e.outer = outer
+    e.scope = scope
+    return e
+
+
+def ReleaseFrame(e):
+    """使い終わったフレームを空きに戻す。e を参照するものが残っていてはいけない"""
+    if len(frames) < FRAME_POOL_LIMIT:
+        e.store.clear()
+        e.outer = None
+        e.scope = None
+        frames.append(e)
@@ -2,6 +2,8 @@ import ast_
 import object_
 import env_
 import builtin_
+import closure_
+import vector_
 
 NULL = object_.Null()
 TRUE = object_.Boolean(True)
@@ -23,15 +25,12 @@ def Eval(node, env):
         right = Eval(node.right, env)
         if isError(right):
             return right
-        return evalPrefixExpression(node.operator, right)
+        result = evalPrefixExpression(node.operator, right)
+        if type(result) is object_.Error:
+            return locate(result, node)
+        return result
     elif type(node) is ast_.InfixExpression:
-        left = Eval(node.left, env)
-        if isError(left):
-            return left
-        right = Eval(node.right, env)
-        if isError(right):
-            return right
-        return evalInfixExpression(node.operator, left, right)
+        return box(evalInfixNode(node, env))
     elif type(node) is ast_.BlockStatement:
         return evalBlockStatement(node, env)
     elif type(node) is ast_.IfExpression:
@@ -49,9 +48,7 @@ def Eval(node, env):
     elif type(node) is ast_.Identifier:
         return evalIdentifier(node, env)
     elif type(node) is ast_.FunctionLiteral:
-        params = node.parameters
-        body = node.body
-        return object_.Function(parameters=params, body=body, env=env)
+        return closure_.newFunction(node, env)
     elif type(node) is ast_.CallExpression:
         function = Eval(node.function, env)
         if isError(function):
@@ -60,9 +57,17 @@ def Eval(node, env):
         if len(args) == 1 and isError(args[0]):
             return args[0]
 
-        return applyFunction(function, args)
+        result = applyFunction(function, args)
+        if type(result) is object_.Error:
+            return locate(result, node)
+        return result
     elif type(node) is ast_.StringLiteral:
         return object_.String(node.value)
+    elif type(node) is ast_.ArrayLiteral:
+        elements = evalExpressions(node.elements, env)
+        if len(elements) == 1 and isError(elements[0]):
+            return elements[0]
+        return object_.Array(nullify(elements))
 
     return None
 
@@ -115,8 +120,10 @@ def evalMinusPrefixOperatorExpression(right):
 
 
 def evalInfixExpression(operator, left, right):
-    if left.Type() == object_.INTEGER_OBJ and right.Type() == object_.INTEGER_OBJ:
-        return evalIntegerInfixExpression(operator, left, right)
+    if left.Type() in NUMBER_OBJS and right.Type() in NUMBER_OBJS:
+        return box(evalNumberInfixExpression(operator, left.value, right.value))
+    elif left.Type() == object_.ARRAY_OBJ or right.Type() == object_.ARRAY_OBJ:
+        return vector_.evalArrayInfixExpression(operator, left, right)
     elif operator == "==":
         return nativeBoolToBooleanObject(left == right)
     elif operator == "!=":
@@ -129,28 +136,258 @@ def evalInfixExpression(operator, left, right):
         return newError("unknown operator: ", left.Type(), operator, right.Type())
 
 
-def evalIntegerInfixExpression(operator, left, right):
-    left_val = left.value
-    right_val = right.value
+# 数値の塔
+# 中置式の中では数値を object_.Integer / object_.Float に包まず
+# Python の int / float のまま受け渡し、Eval に返すところで包む。
+# int と float が混ざったときは float に昇格する。
+
+NUMBER_OBJS = (object_.INTEGER_OBJ, object_.FLOAT_OBJ)
+
+
+def box(value):
+    if type(value) is int:
+        return object_.Integer(value)
+    elif type(value) is float:
+        return object_.Float(value)
+    return value
+
+
+def numberType(value):
+    if type(value) is int:
+        return object_.INTEGER_OBJ
+    return object_.FLOAT_OBJ
+
+
+def evalInfixNode(node, env):
+    """中置式を評価する。数値は包まずに返す"""
+    left = evalOperand(node.left, env)
+    if type(left) is object_.Error:
+        return left
+    right = evalOperand(node.right, env)
+    if type(right) is object_.Error:
+        return right
+
+    quick = node.quick
+    if quick is not None:
+        result = quick(left, right)
+        if result is not None:
+            return result
+        despecialize(node)
+    result = evalInfixValues(node.operator, left, right)
+    if type(result) is object_.Error:
+        return locate(result, node)
+    specialize(node, left, right)
+    return result
+
+
+def evalOperand(node, env):
+    """中置式のオペランドを評価する。数値は包まずに返す"""
+    t = type(node)
+    if t is ast_.InfixExpression:
+        return evalInfixNode(node, env)
+    elif t is ast_.IntegerLiteral or t is ast_.FloatLiteral:
+        return node.value
+    elif t is ast_.PrefixExpression and node.operator == "-":
+        right = evalOperand(node.right, env)
+        rt = type(right)
+        if rt is int or rt is float:
+            return -right
+        elif rt is object_.Error:
+            return right
+        result = evalPrefixExpression(node.operator, right)
+        if type(result) is object_.Error:
+            return locate(result, node)
+        return result
+
+    obj = Eval(node, env)
+    t = type(obj)
+    if t is object_.Integer or t is object_.Float:
+        return obj.value
+    return obj
+
 
+def evalInfixValues(operator, left, right):
+    lt = type(left)
+    rt = type(right)
+    if (lt is int or lt is float) and (rt is int or rt is float):
+        return evalNumberInfixExpression(operator, left, right)
+    return evalInfixExpression(operator, box(left), box(right))
+
+
+def evalNumberInfixExpression(operator, left, right):
     if operator == "+":
-        return object_.Integer(left_val + right_val)
+        return left + right
     elif operator == "-":
-        return object_.Integer(left_val - right_val)
+        return left - right
     elif operator == "*":
-        return object_.Integer(left_val * right_val)
+        return left * right
     elif operator == "/":
-        return object_.Integer(left_val / right_val)
+        return divide(left, right)
     elif operator == "<":
-        return nativeBoolToBooleanObject(left_val < right_val)
+        return nativeBoolToBooleanObject(left < right)
     elif operator == ">":
-        return nativeBoolToBooleanObject(left_val > right_val)
+        return nativeBoolToBooleanObject(left > right)
     elif operator == "==":
-        return nativeBoolToBooleanObject(left_val == right_val)
+        return nativeBoolToBooleanObject(left == right)
     elif operator == "!=":
-        return nativeBoolToBooleanObject(left_val != right_val)
+        return nativeBoolToBooleanObject(left != right)
     else:
-        return newError("unknown operator: ", left.Type(), operator, right.Type())
+        return newError("unknown operator: ", numberType(left), operator, numberType(right))
+
+
+def divide(left, right):
+    # 整数同士で割り切れるときは整数、それ以外は実数
+    if right == 0:
+        return newError("division by zero")
+    if type(left) is int and type(right) is int and left % right == 0:
+        return left // right
+    return left / right
+
+
+# Quickening
+# 中置式ノードは初回の評価で見たオペランドの型に合わせて特殊化した演算を
+# node.quick に書き込み、次回からは型文字列の比較と演算子の分岐を飛ばす。
+# 特殊化した演算は型が合わないときに None を返し、汎用の経路に戻る。
+# 数値のオペランドは包まれていない int / float で渡ってくる。
+
+# 特殊化が外れる回数の上限。超えたノードは汎用の経路のまま特殊化しない
+QUICKEN_LIMIT = 4
+
+
+def IntAdd(left, right):
+    if type(left) is int and type(right) is int:
+        return left + right
+    return None
+
+
+def IntSub(left, right):
+    if type(left) is int and type(right) is int:
+        return left - right
+    return None
+
+
+def IntMul(left, right):
+    if type(left) is int and type(right) is int:
+        return left * right
+    return None
+
+
+def IntDiv(left, right):
+    if type(left) is int and type(right) is int and right != 0:
+        if left % right == 0:
+            return left // right
+        return left / right
+    return None
+
+
+def IntLt(left, right):
+    if type(left) is int and type(right) is int:
+        return TRUE if left < right else FALSE
+    return None
+
+
+def IntGt(left, right):
+    if type(left) is int and type(right) is int:
+        return TRUE if left > right else FALSE
+    return None
+
+
+def IntEq(left, right):
+    if type(left) is int and type(right) is int:
+        return TRUE if left == right else FALSE
+    return None
+
+
+def IntNotEq(left, right):
+    if type(left) is int and type(right) is int:
+        return TRUE if left != right else FALSE
+    return None
+
+
+def FloatAdd(left, right):
+    if type(left) is float and type(right) is float:
+        return left + right
+    return None
+
+
+def FloatSub(left, right):
+    if type(left) is float and type(right) is float:
+        return left - right
+    return None
+
+
+def FloatMul(left, right):
+    if type(left) is float and type(right) is float:
+        return left * right
+    return None
+
+
+def FloatDiv(left, right):
+    if type(left) is float and type(right) is float and right != 0:
+        return left / right
+    return None
+
+
+def FloatLt(left, right):
+    if type(left) is float and type(right) is float:
+        return TRUE if left < right else FALSE
+    return None
+
+
+def FloatGt(left, right):
+    if type(left) is float and type(right) is float:
+        return TRUE if left > right else FALSE
+    return None
+
+
+def StrConcat(left, right):
+    if type(left) is object_.String and type(right) is object_.String:
+        return object_.String(left.value + right.value)
+    return None
+
+
+def BoolEq(left, right):
+    if type(left) is object_.Boolean and type(right) is object_.Boolean:
+        return TRUE if left is right else FALSE
+    return None
+
+
+def BoolNotEq(left, right):
+    if type(left) is object_.Boolean and type(right) is object_.Boolean:
+        return TRUE if left is not right else FALSE
+    return None
+
+
+quickened = {
+    ("+", int, int): IntAdd,
+    ("-", int, int): IntSub,
+    ("*", int, int): IntMul,
+    ("/", int, int): IntDiv,
+    ("<", int, int): IntLt,
+    (">", int, int): IntGt,
+    ("==", int, int): IntEq,
+    ("!=", int, int): IntNotEq,
+    ("+", float, float): FloatAdd,
+    ("-", float, float): FloatSub,
+    ("*", float, float): FloatMul,
+    ("/", float, float): FloatDiv,
+    ("<", float, float): FloatLt,
+    (">", float, float): FloatGt,
+    ("+", object_.String, object_.String): StrConcat,
+    ("==", object_.Boolean, object_.Boolean): BoolEq,
+    ("!=", object_.Boolean, object_.Boolean): BoolNotEq,
+}
+
+
+def specialize(node, left, right):
+    if node.misses >= QUICKEN_LIMIT:
+        return
+    node.quick = quickened.get((node.operator, type(left), type(right)))
+
+
+def despecialize(node):
+    node.quick = None
+    node.misses += 1
 
 
 def evalBlockStatement(block, env):
@@ -192,6 +429,13 @@ def newError(format, *a):
     return object_.Error(f"{format}{' '.join(a)}")
 
 
+def locate(obj, node):
+    """エラー obj がまだ位置を持たなければ node の位置を付ける"""
+    if obj.pos < 0:
+        obj.pos = node.token.pos
+    return obj
+
+
 def isError(obj):
     if obj is not None:
         return obj.Type() == object_.ERROR_OBJ
@@ -207,7 +451,7 @@ def evalIdentifier(node, env):
     if builtin is not None:
         return builtin
 
-    return newError("identifier not found: " + node.value)
+    return locate(newError("identifier not found: " + node.value), node)
 
 
 def evalExpressions(exps, env):
@@ -215,7 +459,7 @@ def evalExpressions(exps, env):
     for v in exps:
         evaluated = Eval(v, env)
         if isError(evaluated):
-            return []
+            return [evaluated]
         result.append(evaluated)
     return result
 
@@ -224,15 +468,18 @@ def applyFunction(fn, args):
     if type(fn) is object_.Function:
         extendedEnv = extendFunctionEnv(fn, args)
         evaluated = Eval(fn.body, extendedEnv)
+        scope = fn.scope
+        if scope is not None and not scope.escapes:
+            env_.ReleaseFrame(extendedEnv)
         return unwrapReturnValue(evaluated)
     elif type(fn) is object_.Builtin:
-        return fn.fn(args)
+        return fn.fn(nullify(args))
     else:
         return newError("not a function: ", fn.Type())
 
 
 def extendFunctionEnv(fn, args):
-    env = env_.NewEnclosedEnvironment(fn.env)
+    env = env_.NewFrame(fn.env, fn.scope)
 
     for paramIdx, param in enumerate(fn.parameters):
         env.Set(param.value, args[paramIdx])
@@ -240,6 +487,55 @@ def extendFunctionEnv(fn, args):
     return env
 
 
+def functionCaller(fn, argc):
+    """組み込み関数から Monkey の関数を繰り返し呼ぶための呼び出し口を返す
+
+    CallExpression の評価を経由せず、引数の束縛と本体の評価だけを行う。
+    引数の数が合わないときは Error を返す。
+    """
+    if type(fn) is object_.Builtin:
+        builtin = fn.fn
+
+        def callBuiltin(*args):
+            return builtin(nullify(list(args)))
+
+        return callBuiltin
+    elif type(fn) is not object_.Function:
+        return newError("not a function: ", fn.Type())
+
+    names = [v.value for v in fn.parameters]
+    if len(names) != argc:
+        return newError(f"wrong number of arguments to callback. got={argc}, want={len(names)}")
+    outer = fn.env
+    body = fn.body
+    scope = fn.scope
+    release = scope is not None and not scope.escapes
+
+    def call(*args):
+        env = env_.NewFrame(outer, scope)
+        env.store.update(zip(names, args))
+        result = evalBlockStatement(body, env)
+        if release:
+            env_.ReleaseFrame(env)
+        if type(result) is object_.ReturnValue:
+            return result.value
+        if result is None:
+            return NULL
+        return result
+
+    return call
+
+
+def nullify(values):
+    """値のない評価結果 (None) を NULL にしたリストを返す
+
+    空のブロックなどは None になるので、配列の要素や組み込み関数の引数にする前に通す。
+    """
+    if None in values:
+        return [NULL if v is None else v for v in values]
+    return values
+
+
 def unwrapReturnValue(obj):
     if type(obj) is object_.ReturnValue:
         return obj.value
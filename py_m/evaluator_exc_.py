@@ -0,0 +1,198 @@
+import ast_
+import object_
+import env_
+import evaluator_
+import closure_
+from evaluator_ import NULL, isTruthy, nativeBoolToBooleanObject
+
+
+# 例外で制御を移す評価器
+# evaluator_.Eval はノードごとに isError を確かめ、ブロックは結果の Type() を見て
+# ReturnValue と Error を上へ運ぶ。こちらは return と実行時エラーを Python の例外で
+# 送り出し、関数とプログラムの境目でだけ受け止めるので、何も起きない経路では
+# 確認の費用がかからない。評価結果は evaluator_.Eval と同じになる。
+#
+# evaluator_ では、式の中の if のブロックで return すると、その if の値が
+# ReturnValue になる。文としての if ならブロックが上へ運んで関数から戻るが、
+# let の値や演算子のオペランドなどでは ReturnValue がそのまま値として使われる
+# (let v = if (c) { return 1; }; 2 は 2 になる)。これに合わせて、if は
+# ブロックからの ReturnSignal を ReturnValue の値にし、式文がその値を
+# ReturnSignal にして送り直す。
+
+
+class ReturnSignal(Exception):
+    """return文"""
+
+    def __init__(self, value):
+        self.value = value
+
+
+class MonkeyError(Exception):
+    """実行時エラー"""
+
+    def __init__(self, error):
+        self.error = error
+
+
+def Eval(node, env):
+    try:
+        if type(node) is ast_.Program:
+            return evalProgram(node, env)
+        return evalNode(node, env)
+    except ReturnSignal as r:
+        return r.value
+    except MonkeyError as e:
+        return e.error
+
+
+def evalProgram(program, env):
+    result = None
+    try:
+        for v in program.statements:
+            result = evalNode(v, env)
+    except ReturnSignal as r:
+        return r.value
+    return result
+
+
+def check(obj, node=None):
+    if type(obj) is object_.Error:
+        if node is not None:
+            evaluator_.locate(obj, node)
+        raise MonkeyError(obj)
+    return obj
+
+
+def evalNode(node, env):
+    t = type(node)
+    if t is ast_.ExpressionStatement:
+        result = evalNode(node.expression, env)
+        if type(result) is object_.ReturnValue:
+            raise ReturnSignal(result.value)
+        return result
+    elif t is ast_.InfixExpression:
+        return evaluator_.box(evalInfixNode(node, env))
+    elif t is ast_.Identifier:
+        return check(evaluator_.evalIdentifier(node, env))
+    elif t is ast_.IntegerLiteral:
+        return object_.Integer(node.value)
+    elif t is ast_.FloatLiteral:
+        return object_.Float(node.value)
+    elif t is ast_.Boolean:
+        return nativeBoolToBooleanObject(node.value)
+    elif t is ast_.PrefixExpression:
+        right = evalNode(node.right, env)
+        return check(evaluator_.evalPrefixExpression(node.operator, right), node)
+    elif t is ast_.BlockStatement:
+        return evalBlockStatement(node, env)
+    elif t is ast_.IfExpression:
+        return evalIfExpression(node, env)
+    elif t is ast_.ReturnStatement:
+        raise ReturnSignal(evalNode(node.return_value, env))
+    elif t is ast_.LetStatement:
+        env.Set(node.name.value, evalNode(node.value, env))
+    elif t is ast_.FunctionLiteral:
+        return closure_.newFunction(node, env)
+    elif t is ast_.CallExpression:
+        function = evalNode(node.function, env)
+        args = [evalNode(v, env) for v in node.arguments]
+        try:
+            return applyFunction(function, args)
+        except MonkeyError as e:
+            evaluator_.locate(e.error, node)
+            raise
+    elif t is ast_.StringLiteral:
+        return object_.String(node.value)
+    elif t is ast_.ArrayLiteral:
+        return object_.Array(evaluator_.nullify([evalNode(v, env) for v in node.elements]))
+    elif t is ast_.Program:
+        return evalProgram(node, env)
+
+    return None
+
+
+def evalInfixNode(node, env):
+    left = evalOperand(node.left, env)
+    right = evalOperand(node.right, env)
+
+    quick = node.quick
+    if quick is not None:
+        result = quick(left, right)
+        if result is not None:
+            return result
+        evaluator_.despecialize(node)
+    result = check(evaluator_.evalInfixValues(node.operator, left, right), node)
+    evaluator_.specialize(node, left, right)
+    return result
+
+
+def evalOperand(node, env):
+    t = type(node)
+    if t is ast_.InfixExpression:
+        return evalInfixNode(node, env)
+    elif t is ast_.IntegerLiteral or t is ast_.FloatLiteral:
+        return node.value
+    elif t is ast_.PrefixExpression and node.operator == "-":
+        right = evalOperand(node.right, env)
+        rt = type(right)
+        if rt is int or rt is float:
+            return -right
+        return check(evaluator_.evalPrefixExpression(node.operator, right), node)
+
+    obj = evalNode(node, env)
+    t = type(obj)
+    if t is object_.Integer or t is object_.Float:
+        return obj.value
+    return obj
+
+
+def evalBlockStatement(block, env):
+    result = None
+    for v in block.statements:
+        result = evalNode(v, env)
+    return result
+
+
+def evalFunctionBody(block, env):
+    # 本体の直下にある return は例外を使わずにそのまま返す
+    result = None
+    for v in block.statements:
+        if type(v) is ast_.ReturnStatement:
+            return evalNode(v.return_value, env)
+        if type(v) is ast_.ExpressionStatement:
+            result = evalNode(v.expression, env)
+            if type(result) is object_.ReturnValue:
+                return result.value
+        else:
+            result = evalNode(v, env)
+    return result
+
+
+def evalIfExpression(ie, env):
+    condition = evalNode(ie.condition, env)
+    try:
+        if isTruthy(condition):
+            return evalNode(ie.consequence, env)
+        elif ie.alternative is not None:
+            return evalNode(ie.alternative, env)
+        else:
+            return NULL
+    except ReturnSignal as r:
+        return object_.ReturnValue(r.value)
+
+
+def applyFunction(fn, args):
+    if type(fn) is object_.Function:
+        extendedEnv = evaluator_.extendFunctionEnv(fn, args)
+        try:
+            return evalFunctionBody(fn.body, extendedEnv)
+        except ReturnSignal as r:
+            return r.value
+        finally:
+            scope = fn.scope
+            if scope is not None and not scope.escapes:
+                env_.ReleaseFrame(extendedEnv)
+    elif type(fn) is object_.Builtin:
+        return check(fn.fn(evaluator_.nullify(args)))
+    else:
+        raise MonkeyError(evaluator_.newError("not a function: ", fn.Type()))
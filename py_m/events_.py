@@ -0,0 +1,200 @@
+import sys
+import ast_
+import object_
+import env_
+import evaluator_
+import evaluator_exc_
+
+
+# 評価器のイベント
+# 道具は subscribe(種類, 関数) で評価器のイベントを受け取る。差し込みは
+# 購読者のいる種類の分だけ行い、evaluator_ と evaluator_exc_ のモジュールの
+# 関数を通知する版に差し替える。購読者がいなくなれば元に戻すので、
+# 購読のないときの評価器は何も変わらない。
+#
+# 差し替えはプロセス全体のモジュールの関数 (とクラスの __init__) に対して
+# 行うので、購読者はどの REPL のセッションやスレッドの評価でも、そのプロセスの
+# すべての評価のイベントを受け取る。評価器のインスタンスごとには分けられない。
+#
+# CALL   callback(fn, args)    関数 (組み込み関数を含む) を呼ぶ前
+# RETURN callback(fn, result)  関数から戻った後 (例外で抜けたときは通知しない)
+# ERROR  callback(error)       object_.Error を作ったとき (位置はまだ付いていない)
+# NODE   callback(node, env)   ノードを評価する前
+# ENV    callback(env)         関数呼び出しと内側の環境を作ったとき
+#                              (使い回したフレームを含み、トップレベルの環境は除く)
+# ALLOC  callback(obj)         object_ のオブジェクトを作ったとき
+#
+# 中置式のオペランドの数値リテラルは Eval を通らないので NODE を通知しない。
+# tier_ がコンパイルした関数同士の直接の呼び出しと、map などの組み込み関数が
+# functionCaller で呼ぶ関数は CALL / RETURN を通知しない。
+
+CALL = "call"
+RETURN = "return"
+ERROR = "error"
+NODE = "node"
+ENV = "env"
+ALLOC = "alloc"
+
+# 通知中に購読が変わってもよいように、購読者はタプルで持ち替える
+_subscribers = {CALL: (), RETURN: (), ERROR: (), NODE: (), ENV: (), ALLOC: ()}
+
+# 差し替えた関数 (モジュールかクラス, 名前) -> (元の関数, 差し替えた関数)
+# 元の関数が None なら、クラスが継承していたもの
+_installed = {}
+
+
+def fire(kind, *args):
+    for callback in _subscribers[kind]:
+        callback(*args)
+
+
+def wrapApply(original):
+    def applyFunction(fn, args):
+        fire(CALL, fn, args)
+        result = original(fn, args)
+        fire(RETURN, fn, result)
+        return result
+
+    return applyFunction
+
+
+def wrapError(original):
+    def newError(format, *a):
+        error = original(format, *a)
+        fire(ERROR, error)
+        return error
+
+    return newError
+
+
+def wrapNode(original):
+    def evalNode(node, env):
+        fire(NODE, node, env)
+        return original(node, env)
+
+    return evalNode
+
+
+def wrapDispatch(original):
+    # 中置式は evalInfixNode で通知するので二度は通知しない
+    def evalNode(node, env):
+        if type(node) is not ast_.InfixExpression:
+            fire(NODE, node, env)
+        return original(node, env)
+
+    return evalNode
+
+
+def wrapEnv(original):
+    def newEnvironment(*a):
+        env = original(*a)
+        fire(ENV, env)
+        return env
+
+    return newEnvironment
+
+
+def wrapInit(original):
+    def __init__(self, *a, **k):
+        original(self, *a, **k)
+        fire(ALLOC, self)
+
+    return __init__
+
+
+# ALLOC を通知するクラス
+OBJECT_CLASSES = [
+    object_.Integer, object_.Float, object_.Boolean, object_.Null, object_.ReturnValue,
+    object_.Error, object_.Function, object_.String, object_.Builtin, object_.Array,
+]
+
+# 種類ごとに差し替える関数
+PATCHES = [
+    ((CALL, RETURN), evaluator_, "applyFunction", wrapApply),
+    ((CALL, RETURN), evaluator_exc_, "applyFunction", wrapApply),
+    ((ERROR,), evaluator_, "newError", wrapError),
+    ((NODE,), evaluator_, "Eval", wrapDispatch),
+    ((NODE,), evaluator_, "evalInfixNode", wrapNode),
+    ((NODE,), evaluator_exc_, "evalNode", wrapDispatch),
+    ((NODE,), evaluator_exc_, "evalInfixNode", wrapNode),
+    ((ENV,), env_, "NewFrame", wrapEnv),
+    ((ENV,), env_, "NewEnclosedEnvironment", wrapEnv),
+] + [((ALLOC,), v, "__init__", wrapInit) for v in OBJECT_CLASSES]
+
+
+def sync():
+    """購読者のいる種類の関数だけを差し替えた状態にする"""
+    for kinds, mod, name, wrap in PATCHES:
+        key = (mod, name)
+        wanted = any(_subscribers[k] for k in kinds)
+        if wanted and key not in _installed:
+            original = getattr(mod, name)
+            own = name in vars(mod)
+            wrapper = wrap(original)
+            setattr(mod, name, wrapper)
+            _installed[key] = (original if own else None, wrapper)
+        elif not wanted and key in _installed:
+            original, wrapper = _installed.pop(key)
+            # 後から別のものが差し替えていれば触らない
+            if vars(mod).get(name) is not wrapper:
+                continue
+            if original is None:
+                delattr(mod, name)
+            else:
+                setattr(mod, name, original)
+
+
+def subscribe(kind, callback):
+    if kind not in _subscribers:
+        raise ValueError(f"unknown event: {kind}")
+    _subscribers[kind] += (callback,)
+    sync()
+    return callback
+
+
+def unsubscribe(kind, callback):
+    callbacks = list(_subscribers[kind])
+    callbacks.remove(callback)
+    _subscribers[kind] = tuple(callbacks)
+    sync()
+
+
+def functionName(fn):
+    if type(fn) is object_.Function:
+        return "fn(" + ", ".join(v.value for v in fn.parameters) + ")"
+    elif type(fn) is object_.Builtin:
+        return "builtin"
+    return fn.Type()
+
+
+class Tracer:
+    """関数の呼び出しと戻りを字下げして書き出す (go_m/parser/parser_tracing.go にならう)"""
+
+    def __init__(self, out=sys.stdout):
+        self.out = out
+        self.level = 0
+
+    def __enter__(self):
+        subscribe(CALL, self.call)
+        subscribe(RETURN, self.ret)
+        return self
+
+    def __exit__(self, *exc):
+        unsubscribe(CALL, self.call)
+        unsubscribe(RETURN, self.ret)
+
+    def print(self, s):
+        self.out.write("\t" * (self.level - 1) + s + "\n")
+
+    def call(self, fn, args):
+        self.level += 1
+        inspected = ", ".join(v.Inspect() for v in args if v is not None)
+        self.print(f"BEGIN {functionName(fn)} [{inspected}]")
+
+    def ret(self, fn, result):
+        inspected = result.Inspect() if result is not None else ""
+        self.print(f"END {functionName(fn)} {inspected}")
+        self.level -= 1
+
+    def __str__(self):
+        return "Tracer()"
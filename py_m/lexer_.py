@@ -1,11 +1,16 @@
-from token_ import TokenType, Token
+import re
+from array import array
+from bisect import bisect_right
+from token_ import TokenType, Token, TokenBuffer
 
 
 class Lexer:
     """字句解析"""
 
-    def __init__(self, input, position=0, next_position=0, ch=""):
+    def __init__(self, input, position=0, next_position=0, ch="", base=0):
         self.input = input
+        # Token の位置に足す値 (SourceSet を参照)
+        self.base = base
         self.position = position
         self.next_position = next_position
         self.ch = ch
@@ -72,102 +77,292 @@ class Lexer:
         return self.input[position:self.position]
 
     def next_token(self):
-        tok = Token()
+        token_type = self.scan()
+        return Token(token_type, self.input[self.start:self.end], self.base + self.start)
 
+    def scan(self):
+        """次の字句の種類を返す。字句の範囲は self.start と self.end に残す"""
         self.skip_whitespace()
+        self.start = self.position
 
         if self.ch == "=":
             if self.peek_char() == "=":
                 self.read_char()
-                tok.token_type = TokenType.EQ
-                tok.literal = "=="
+                token_type = TokenType.EQ
             else:
-                tok.token_type = TokenType.ASSIGN
-                tok.literal = "="
+                token_type = TokenType.ASSIGN
         elif self.ch == "+":
-            tok.token_type = TokenType.PLUS
-            tok.literal = self.ch
+            token_type = TokenType.PLUS
         elif self.ch == "-":
-            tok.token_type = TokenType.MINUS
-            tok.literal = self.ch
+            token_type = TokenType.MINUS
         elif self.ch == "!":
             if self.peek_char() == "=":
                 self.read_char()
-                tok.token_type = TokenType.NOT_EQ
-                tok.literal = "!="
+                token_type = TokenType.NOT_EQ
             else:
-                tok.token_type = TokenType.BANG
-                tok.literal = "!"
+                token_type = TokenType.BANG
         elif self.ch == "/":
-            tok.token_type = TokenType.SLASH
-            tok.literal = self.ch
+            token_type = TokenType.SLASH
         elif self.ch == "*":
-            tok.token_type = TokenType.ASTERISK
-            tok.literal = self.ch
+            token_type = TokenType.ASTERISK
         elif self.ch == "<":
-            tok.token_type = TokenType.LT
-            tok.literal = self.ch
+            token_type = TokenType.LT
         elif self.ch == ">":
-            tok.token_type = TokenType.GT
-            tok.literal = self.ch
+            token_type = TokenType.GT
         elif self.ch == ";":
-            tok.token_type = TokenType.SEMICOLON
-            tok.literal = self.ch
+            token_type = TokenType.SEMICOLON
         elif self.ch == ",":
-            tok.token_type = TokenType.COMMA
-            tok.literal = self.ch
+            token_type = TokenType.COMMA
         elif self.ch == "{":
-            tok.token_type = TokenType.LBRACE
-            tok.literal = self.ch
+            token_type = TokenType.LBRACE
         elif self.ch == "}":
-            tok.token_type = TokenType.RBRACE
-            tok.literal = self.ch
+            token_type = TokenType.RBRACE
         elif self.ch == "(":
-            tok.token_type = TokenType.LPAREN
-            tok.literal = self.ch
+            token_type = TokenType.LPAREN
         elif self.ch == ")":
-            tok.token_type = TokenType.RPAREN
-            tok.literal = self.ch
+            token_type = TokenType.RPAREN
         elif self.ch == '"':
-            tok.token_type = TokenType.STRING
-            tok.literal = self.read_string()
+            # 字句の範囲は引用符の内側
+            self.read_string()
+            self.start += 1
+            self.end = self.position
+            self.read_char()
+            return TokenType.STRING
         elif self.ch == "[":
-            tok.token_type = TokenType.LBRACKET
-            tok.literal = self.ch
+            token_type = TokenType.LBRACKET
         elif self.ch == "]":
-            tok.token_type = TokenType.RBRACKET
-            tok.literal = self.ch
+            token_type = TokenType.RBRACKET
         elif self.ch == "":
-            tok.token_type = TokenType.EOF
-            tok.literal = ""
+            self.end = self.start
+            return TokenType.EOF
         else:
             if self.is_letter(self.ch):
-                tok.literal = self.read_identifier()
-                tok.token_type = tok.lookup_ident(tok.literal)
-                return tok
+                literal = self.read_identifier()
+                self.end = self.position
+                return Token.lookup_ident(literal)
             elif self.is_digit(self.ch):
                 literal = self.read_number()
+                self.end = self.position
                 if literal.count(".") == 0:
-                    tok.token_type = TokenType.INT
-                    tok.literal = literal
-                    return tok
+                    return TokenType.INT
                 elif literal.count(".") == 1:
-                    tok.token_type = TokenType.FLOAT
-                    tok.literal = literal
-                    return tok
+                    return TokenType.FLOAT
                 else:
-                    tok.token_type = TokenType.ILLEGAL
-                    tok.literal = literal
+                    self.read_char()
+                    return TokenType.ILLEGAL
             else:
-                tok.token_type = TokenType.ILLEGAL
-                tok.literal = self.ch
+                token_type = TokenType.ILLEGAL
 
         self.read_char()
-        return tok
+        self.end = self.position
+        return token_type
 
     def __str__(self):
         return "Lexer()"
 
 
+class LineTable:
+    """入力の各行の先頭位置
+
+    字句やノードには入力の先頭からの位置だけを持たせ、エラーを
+    知らせるときにここで行と列に直す。
+    """
+
+    def __init__(self, input, base=0):
+        self.base = base
+        self.starts = array("I", [0])
+        i = input.find("\n")
+        while i != -1:
+            self.starts.append(i + 1)
+            i = input.find("\n", i + 1)
+
+    def position(self, pos):
+        """位置から (行, 列) を返す。どちらも 1 から数える"""
+        pos -= self.base
+        line = bisect_right(self.starts, pos) - 1
+        return line + 1, pos - self.starts[line] + 1
+
+    def describe(self, pos):
+        """"行:列" の文字列を返す"""
+        line, column = self.position(pos)
+        return f"{line}:{column}"
+
+    def __str__(self):
+        return "LineTable()"
+
+
+class SourceSet:
+    """複数の入力の位置をまとめて扱う
+
+    入力ごとに重ならない基点を割り当て、字句解析器に base として渡す。
+    別の入力で定義した関数の中で起きたエラーも、位置から入力の名前と
+    行・列を引ける。
+    release() で手放した先頭の入力は名前ごと捨て、その位置は RELEASED で示す。
+    """
+
+    RELEASED = "?"
+
+    def __init__(self):
+        self.bases = array("I")
+        self.names = []
+        # 入力の文字列。None ならファイル paths[i] を必要になったときに読む
+        self.inputs = []
+        self.paths = []
+        self.tables = {}
+        self.size = 0
+        # 手放して捨てた入力の数。i 番目の入力は names[i - offset] にある
+        self.offset = 0
+
+    def __len__(self):
+        """加えた入力の数 (手放したものを含む)"""
+        return self.offset + len(self.names)
+
+    def add(self, name, input=None, path=None, size=0):
+        """入力を加えて基点を返す。input を渡さないときは path と size (以上の値) を渡す"""
+        base = self.size
+        self.bases.append(base)
+        self.names.append(name)
+        self.inputs.append(input)
+        self.paths.append(path)
+        self.size = base + (len(input) if input is not None else size) + 1
+        return base
+
+    def table(self, i):
+        table = self.tables.get(i)
+        if table is None:
+            j = i - self.offset
+            input = self.inputs[j]
+            if input is None:
+                with open(self.paths[j], encoding="utf-8") as f:
+                    input = f.read()
+            table = LineTable(input, self.bases[j])
+            self.tables[i] = table
+        return table
+
+    def release(self, i):
+        """i 番目までの入力を手放す。以後その位置は RELEASED で示す"""
+        n = i + 1 - self.offset
+        if n <= 0:
+            return
+        del self.bases[:n]
+        del self.names[:n]
+        del self.inputs[:n]
+        del self.paths[:n]
+        self.offset += n
+        for k in [k for k in self.tables if k < self.offset]:
+            del self.tables[k]
+
+    def describe(self, pos):
+        """"名前:行:列" の文字列を返す"""
+        j = bisect_right(self.bases, pos) - 1
+        if j < 0:
+            return self.RELEASED
+        return f"{self.names[j]}:{self.table(j + self.offset).describe(pos)}"
+
+    def __str__(self):
+        return "SourceSet()"
+
+
+# ASCII だけの入力を一度に字句に分ける正規表現。Lexer.scan と同じ字句を返す
+TOKEN_RE = re.compile(
+    r'[ \t\n\r]*(?:'
+    r'(?P<ident>[A-Za-z_]+)'
+    r'|(?P<number>[0-9.]+)'
+    r'|"(?P<string>[^"]*)"?'
+    r'|(?P<op>==|!=|[-=+!/*<>;,{}()\[\]])'
+    r'|(?P<illegal>[^ \t\n\r]))'
+)
+WHITESPACE_RE = re.compile(r"[ \t\n\r]*")
+
+OPERATORS = {
+    "==": TokenType.EQ,
+    "!=": TokenType.NOT_EQ,
+    "=": TokenType.ASSIGN,
+    "+": TokenType.PLUS,
+    "-": TokenType.MINUS,
+    "!": TokenType.BANG,
+    "/": TokenType.SLASH,
+    "*": TokenType.ASTERISK,
+    "<": TokenType.LT,
+    ">": TokenType.GT,
+    ";": TokenType.SEMICOLON,
+    ",": TokenType.COMMA,
+    "{": TokenType.LBRACE,
+    "}": TokenType.RBRACE,
+    "(": TokenType.LPAREN,
+    ")": TokenType.RPAREN,
+    "[": TokenType.LBRACKET,
+    "]": TokenType.RBRACKET,
+}
+
+
+def tokenize(input, base=0):
+    """入力全体を字句に分け、TokenBuffer に詰めて返す"""
+    buf = TokenBuffer(input, base)
+    if input.isascii():
+        scan_ascii(input, buf)
+    else:
+        scan_lexer(input, buf)
+    return buf
+
+
+def scan_lexer(input, buf):
+    lex = Lexer(input)
+    kinds = buf.kinds
+    starts = buf.starts
+    ends = buf.ends
+    while True:
+        token_type = lex.scan()
+        kinds.append(token_type._value_)
+        starts.append(lex.start)
+        ends.append(lex.end)
+        if token_type is TokenType.EOF:
+            break
+
+
+def scan_ascii(input, buf):
+    kinds = buf.kinds
+    starts = buf.starts
+    ends = buf.ends
+    keywords = {k: v._value_ for k, v in Token.keywords.items()}
+    operators = {k: v._value_ for k, v in OPERATORS.items()}
+    ident = TokenType.IDENT._value_
+    match = TOKEN_RE.match
+    pos = 0
+    while True:
+        m = match(input, pos)
+        if m is None:
+            break
+        group = m.lastgroup
+        start, end = m.span(group)
+        pos = m.end()
+        if group == "ident":
+            kind = keywords.get(input[start:end], ident)
+        elif group == "op":
+            kind = operators[input[start:end]]
+        elif group == "number":
+            dots = input.count(".", start, end)
+            if dots == 0:
+                kind = TokenType.INT._value_
+            elif dots == 1:
+                kind = TokenType.FLOAT._value_
+            else:
+                # Lexer と同じく、不正な数の直後の 1 文字は読み飛ばされる
+                kind = TokenType.ILLEGAL._value_
+                pos += 1
+        elif group == "string":
+            kind = TokenType.STRING._value_
+        else:
+            kind = TokenType.ILLEGAL._value_
+        kinds.append(kind)
+        starts.append(start)
+        ends.append(end)
+
+    pos = WHITESPACE_RE.match(input, pos).end() if pos <= len(input) else pos
+    kinds.append(TokenType.EOF._value_)
+    starts.append(pos)
+    ends.append(pos)
+
+
 if __name__ == "__main__":
     pass
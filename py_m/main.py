@@ -1,7 +1,29 @@
 import sys
+import atexit
 import getpass
+import evaluator_
+import evaluator_exc_
+import tier_
+import metrics_
 from repl_ import start
 
+USAGE = "usage: python main.py [--raise] [--tier] [--history N] [--metrics FILE]"
+
+
+def usage(message):
+    print(USAGE)
+    print(message)
+    sys.exit(2)
+
+
+def option(name):
+    """name の次の引数を返す。なければ使い方を示して終わる"""
+    i = sys.argv.index(name) + 1
+    if i >= len(sys.argv) or sys.argv[i].startswith("--"):
+        usage(f"{name} の値がありません")
+    return sys.argv[i]
+
+
 # 再帰回数の上限を変更
 sys.setrecursionlimit(2000)
 
@@ -9,4 +31,26 @@ name = getpass.getuser()
 print(f"Hello {name}! This is the Monkey programming language!")
 print("Feel free to type in commands")
 
-start()
+# --raise で例外で制御を移す評価器を使う
+evaluator = evaluator_exc_ if "--raise" in sys.argv[1:] else evaluator_
+
+# --history N で位置を引くために覚えておく入力を N 行に限る
+history = None
+if "--history" in sys.argv[1:]:
+    value = option("--history")
+    if not value.isdigit():
+        usage("--history には 0 以上の整数を指定してください")
+    history = int(value)
+
+# --tier でよく呼ぶ関数を Python のコードにコンパイルする
+if "--tier" in sys.argv[1:]:
+    tier_.enable()
+
+# --metrics FILE で計測し、終了時に FILE へ JSON で書き出す
+metrics = None
+if "--metrics" in sys.argv[1:]:
+    path = option("--metrics")
+    metrics = metrics_.Metrics().start()
+    atexit.register(metrics.dump, path)
+
+start(evaluator, history, metrics)
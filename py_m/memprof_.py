@@ -0,0 +1,280 @@
+import gc
+import sys
+import tracemalloc
+import lexer_
+import parser_
+import object_
+import evaluator_
+import env_
+import builtin_
+import events_
+
+
+# メモリーの計測
+# tracemalloc の確保量を、評価器のイベント (events_) で組み立てた Monkey の
+# 呼び出しの影のスタックと合わせて、Monkey の関数と object_ の型に割り当てる。
+# tracemalloc だけでは確保した場所が evaluator_.py の行になり、どの Monkey の
+# コードが使ったのか分からない。
+#
+# 関数 (関数リテラルの位置ごと。組み込み関数は名前ごと)
+#   peak      呼び出しの間に増えた確保量の最大 (呼び出した関数の分を含む)
+#   retained  呼び出しの後に残った確保量の合計 (戻り値を含む。再帰の内側の
+#             呼び出しは外側に含まれるので数えない)
+# 型
+#   allocated 作った数とその大きさ (sys.getsizeof)
+#   retained  stop() の時点で生きている、計測中に作ったものの数と大きさ
+#             (start() のときに生きていたオブジェクトの id を覚えておいて除く)
+#
+# 確保量には計測そのもの (影のスタックなど) と、env_ の空きのフレームの分も入る。
+#
+# 例外で抜けた呼び出しは戻りを通知しないので、evaluator_exc_ で評価したら
+# unwind() で影のスタックを空にする。tier_ がコンパイルした関数同士の直接の
+# 呼び出しは数えない。
+
+
+class FunctionStats:
+    """関数ごとの確保量"""
+
+    def __init__(self, label):
+        self.label = label
+        self.calls = 0
+        self.peak = 0
+        self.retained = 0
+        # 影のスタックにある呼び出しの数 (再帰で二重に数えないため)
+        self.active = 0
+
+    def __str__(self):
+        return "FunctionStats()"
+
+
+class Frame:
+    """影のスタックの要素"""
+
+    def __init__(self, stats, start):
+        self.stats = stats
+        # 呼び出したときの確保量
+        self.start = start
+        # 呼び出しの間の確保量の最大 (reset_peak の前の分)
+        self.peak = start
+
+    def __str__(self):
+        return "Frame()"
+
+
+def objectSize(obj):
+    size = sys.getsizeof(obj)
+    d = getattr(obj, "__dict__", None)
+    if d is not None:
+        size += sys.getsizeof(d)
+    return size
+
+
+def objectInstances():
+    return [v for v in gc.get_objects() if type(v).__module__ == object_.__name__]
+
+
+def builtinNames():
+    return {id(v): k for k, v in builtin_.builtins.items()}
+
+
+class Profiler:
+    """Monkey の関数と object_ の型ごとにメモリーを計測する
+
+    describe は位置を "行:列" などの文字列にする関数 (LineTable.describe や
+    SourceSet.describe)。None なら位置の数字のまま示す。
+    """
+
+    def __init__(self, describe=None, frames=1):
+        self.describe = describe
+        # tracemalloc が覚える Python のスタックの深さ
+        self.frames = frames
+        self.running = False
+        self.started_tracing = False
+        self.functions = {}
+        self.stack = []
+        # 型の名前 -> [数, 大きさ]
+        self.allocated = {}
+        # start() の時点で生きていたオブジェクトの id
+        self.existing = set()
+        self.retained = {}
+        self.peak = 0
+
+    def start(self):
+        if self.running:
+            return self
+        gc.collect()
+        self.existing = set(id(v) for v in objectInstances())
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self.started_tracing = True
+        tracemalloc.reset_peak()
+        events_.subscribe(events_.CALL, self.call)
+        events_.subscribe(events_.RETURN, self.ret)
+        events_.subscribe(events_.ALLOC, self.alloc)
+        self.running = True
+        return self
+
+    def stop(self):
+        if not self.running:
+            return
+        events_.unsubscribe(events_.CALL, self.call)
+        events_.unsubscribe(events_.RETURN, self.ret)
+        events_.unsubscribe(events_.ALLOC, self.alloc)
+        self.running = False
+        self.unwind()
+
+        current, peak = tracemalloc.get_traced_memory()
+        self.peak = max(self.peak, peak)
+        self.retained = self.live_objects()
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def unwind(self):
+        """影のスタックを空にする。途中の呼び出しは数えない"""
+        for v in self.stack:
+            v.stats.active -= 1
+        self.stack.clear()
+
+    # イベント
+
+    def key(self, fn):
+        if type(fn) is object_.Builtin:
+            name = builtinNames().get(id(fn), "builtin")
+            return name, name
+        scope = getattr(fn, "scope", None)
+        pos = scope.pos if scope is not None else -1
+        params = ", ".join(v.value for v in getattr(fn, "parameters", []))
+        if pos < 0:
+            where = "?"
+        elif self.describe is not None:
+            where = self.describe(pos)
+        else:
+            where = str(pos)
+        return pos, f"{where} fn({params})"
+
+    def call(self, fn, args):
+        key, label = self.key(fn)
+        stats = self.functions.get(key)
+        if stats is None:
+            stats = FunctionStats(label)
+            self.functions[key] = stats
+        stats.calls += 1
+        stats.active += 1
+
+        current, peak = tracemalloc.get_traced_memory()
+        if self.stack:
+            top = self.stack[-1]
+            top.peak = max(top.peak, peak)
+        self.peak = max(self.peak, peak)
+        tracemalloc.reset_peak()
+        self.stack.append(Frame(stats, current))
+
+    def ret(self, fn, result):
+        if not self.stack:
+            return
+        frame = self.stack.pop()
+        current, peak = tracemalloc.get_traced_memory()
+        peak = max(frame.peak, peak)
+        stats = frame.stats
+        stats.peak = max(stats.peak, peak - frame.start)
+        stats.active -= 1
+        if stats.active == 0:
+            stats.retained += current - frame.start
+
+        # 呼び出した側の最大に、この呼び出しの間の最大を含める
+        if self.stack:
+            top = self.stack[-1]
+            top.peak = max(top.peak, peak)
+        self.peak = max(self.peak, peak)
+        tracemalloc.reset_peak()
+
+    def alloc(self, obj):
+        name = type(obj).__name__
+        counts = self.allocated.get(name)
+        if counts is None:
+            counts = [0, 0]
+            self.allocated[name] = counts
+        counts[0] += 1
+        counts[1] += objectSize(obj)
+
+    def live_objects(self):
+        """計測中に作り、まだ生きている object_ のオブジェクトを型ごとに数える"""
+        gc.collect()
+        out = {}
+        for v in objectInstances():
+            if id(v) in self.existing:
+                continue
+            counts = out.get(type(v).__name__)
+            if counts is None:
+                counts = [0, 0]
+                out[type(v).__name__] = counts
+            counts[0] += 1
+            counts[1] += objectSize(v)
+        self.existing = set()
+        return out
+
+    # 読み出し
+
+    def as_dict(self):
+        return {
+            "peak": self.peak,
+            "functions": [
+                {"function": v.label, "calls": v.calls, "peak": v.peak, "retained": v.retained}
+                for v in sorted(self.functions.values(), key=lambda v: -v.peak)
+            ],
+            "allocated": {k: {"count": v[0], "bytes": v[1]} for k, v in sorted(self.allocated.items())},
+            "retained": {k: {"count": v[0], "bytes": v[1]} for k, v in sorted(self.retained.items())},
+        }
+
+    def report(self, limit=10):
+        out = [f"peak: {self.peak} bytes", "", "function  calls  peak  retained"]
+        functions = sorted(self.functions.values(), key=lambda v: -v.peak)
+        for v in functions[:limit]:
+            out.append(f"{v.label}  {v.calls}  {v.peak}  {v.retained}")
+        out.append("")
+        out.append("type  allocated  bytes  retained  bytes")
+        for name in sorted(set(self.allocated) | set(self.retained)):
+            a = self.allocated.get(name, [0, 0])
+            r = self.retained.get(name, [0, 0])
+            out.append(f"{name}  {a[0]}  {a[1]}  {r[0]}  {r[1]}")
+        return "\n".join(out)
+
+    def __str__(self):
+        return "Profiler()"
+
+
+def profile(input, env=None, evaluator=evaluator_):
+    """input を評価しながら計測する。(評価結果, Profiler) を返す"""
+    if env is None:
+        env = env_.NewEnvironment()
+    p = parser_.new_parser(input)
+    program = p.parse_program()
+    if len(p.Errors()) != 0:
+        return object_.Error(p.located_errors()[0]), None
+
+    profiler = Profiler(lexer_.LineTable(input).describe)
+    with profiler:
+        result = evaluator.Eval(program, env)
+        profiler.unwind()
+    return result, profiler
+
+
+if __name__ == "__main__":
+    # python memprof_.py スクリプト
+    sys.setrecursionlimit(10000)
+    with open(sys.argv[1], encoding="utf-8") as f:
+        result, profiler = profile(f.read())
+    if profiler is None:
+        print(result.Inspect())
+        sys.exit(1)
+    print(profiler.report())
+    if result is not None:
+        print()
+        print(result.Inspect())
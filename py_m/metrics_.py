@@ -0,0 +1,151 @@
+import json
+from time import perf_counter
+import parser_
+import object_
+import evaluator_
+import env_
+import events_
+
+
+# 実行時の計測
+# Metrics は評価器のイベント (events_) を購読して数を数える。数はインスタンスが
+# 持つが、events_ の差し替えはプロセス全体に効くので、動いている Metrics は
+# どれもそのプロセスのすべての評価を数える (二つ動かせば両方が同じものを数える)。
+# REPL のセッションやワーカーごとに分けて数えるには、プロセスを分ける。
+# start() から stop() までに評価したものを数え、as_dict() / to_json() で読み出す。
+#
+# 計測には費用がかかる。bench() の fib(20) では、計測しないときのおよそ
+# 1.4〜1.5 倍の時間になる (CPython 3.11)。費用のほとんどは関数呼び出しと環境の
+# 通知によるもので、allocations=False (ALLOC を購読せず object_ の __init__ を
+# 差し替えない) にしても少ししか減らない。
+#
+# calls          Monkey の関数の呼び出し (map などが呼ぶ関数は数えない。events_ を参照)
+# builtin_calls  組み込み関数の呼び出し
+# environments   関数呼び出しと内側の環境の数 (使い回したフレームを含む)
+# max_depth      環境の連なりの最大の深さ (トップレベルの環境が 1)
+# allocations    object_ の型ごとに作ったオブジェクトの数
+# errors         作ったエラーの数
+
+
+class Metrics:
+    """評価器の計測"""
+
+    def __init__(self, allocations=True):
+        # False なら型ごとの数を数えない
+        self.count_allocations = allocations
+        self.running = False
+        self.reset()
+
+    def reset(self):
+        self.calls = 0
+        self.builtin_calls = 0
+        self.environments = 0
+        self.max_depth = 0
+        self.allocations = {}
+        self.errors = 0
+
+    def start(self):
+        if self.running:
+            return self
+        events_.subscribe(events_.CALL, self.call)
+        events_.subscribe(events_.ERROR, self.error)
+        events_.subscribe(events_.ENV, self.env)
+        if self.count_allocations:
+            events_.subscribe(events_.ALLOC, self.alloc)
+        self.running = True
+        return self
+
+    def stop(self):
+        if not self.running:
+            return
+        events_.unsubscribe(events_.CALL, self.call)
+        events_.unsubscribe(events_.ERROR, self.error)
+        events_.unsubscribe(events_.ENV, self.env)
+        if self.count_allocations:
+            events_.unsubscribe(events_.ALLOC, self.alloc)
+        self.running = False
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # イベント
+
+    def call(self, fn, args):
+        t = type(fn)
+        if t is object_.Function:
+            self.calls += 1
+        elif t is object_.Builtin:
+            self.builtin_calls += 1
+
+    def error(self, error):
+        self.errors += 1
+
+    def env(self, env):
+        self.environments += 1
+        depth = 0
+        while env is not None:
+            depth += 1
+            env = env.outer
+        if depth > self.max_depth:
+            self.max_depth = depth
+
+    def alloc(self, obj):
+        name = type(obj).__name__
+        self.allocations[name] = self.allocations.get(name, 0) + 1
+
+    # 読み出し
+
+    def as_dict(self):
+        return {
+            "calls": self.calls,
+            "builtin_calls": self.builtin_calls,
+            "environments": self.environments,
+            "max_depth": self.max_depth,
+            "allocations": dict(sorted(self.allocations.items())),
+            "errors": self.errors,
+        }
+
+    def to_json(self, indent=None):
+        return json.dumps(self.as_dict(), indent=indent)
+
+    def dump(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.to_json(indent=2) + "\n")
+
+    def __str__(self):
+        return "Metrics()"
+
+
+BENCH = "let fib = fn(n) { if (n < 2) { n } else { fib(n - 1) + fib(n - 2) } }; fib(20)"
+
+
+def bench(input=BENCH, repeat=5):
+    """input の評価にかかる時間 (最小) を、計測なし・計測あり・allocations=False で返す"""
+    program = parser_.new_parser(input).parse_program()
+
+    def run():
+        best = None
+        for _ in range(repeat):
+            start = perf_counter()
+            evaluator_.Eval(program, env_.NewEnvironment())
+            elapsed = perf_counter() - start
+            if best is None or elapsed < best:
+                best = elapsed
+        return best
+
+    off = run()
+    with Metrics():
+        on = run()
+    with Metrics(allocations=False):
+        no_alloc = run()
+    return {"off": off, "on": on, "no_allocations": no_alloc}
+
+
+if __name__ == "__main__":
+    # python metrics_.py で計測の費用を示す
+    times = bench()
+    for k, v in times.items():
+        print(f"{k:15} {v:8.4f}s {v / times['off']:5.2f}x")
@@ -1,4 +1,5 @@
 from abc import ABCMeta, abstractmethod
+import printer_
 
 NULL_OBJ = "NULL"
 ERROR_OBJ = "ERROR"
@@ -9,6 +10,7 @@ RETURN_VALUE_OBJ = "RETURN_VALUE"
 FUNCTION_OBJ = "FUNCTION"
 STRING_OBJ = "STRING"
 BUILTIN_OBJ = "BUILTIN"
+ARRAY_OBJ = "ARRAY"
 
 
 class Object(metaclass=ABCMeta):
@@ -101,8 +103,10 @@ class ReturnValue(Object):
 class Error(Object):
     """エラー"""
 
-    def __init__(self, message):
+    def __init__(self, message, pos=-1):
         self.message = message
+        # エラーの起きた式の入力中の位置。不明なら -1
+        self.pos = pos
 
     def Type(self):
         return ERROR_OBJ
@@ -121,23 +125,17 @@ class Function(Object):
         self.parameters = parameters
         self.body = body
         self.env = env
+        # 関数リテラルの変数の解析結果 (closure_.Scope)
+        self.scope = None
+        # 呼び出された回数と、コンパイルした本体 (tier_ を参照)
+        self.calls = 0
+        self.compiled = None
 
     def Type(self):
         return FUNCTION_OBJ
 
     def Inspect(self):
-        params = []
-        for v in self.parameters:
-            params.append(v.string())
-
-        out = "fn"
-        out += "("
-        out += ", ".join(params)
-        out += ") {\n"
-        out += self.body.string()
-        out += "\n}"
-
-        return out
+        return printer_.inspect_function(self)
 
     def __str__(self):
         return "Function(Object)"
@@ -175,6 +173,45 @@ class Builtin(Object):
         return "Builtin(Object)"
 
 
+class Array(Object):
+    """配列"""
+
+    def __init__(self, elements=None, numbers=None):
+        # Object のリスト。numbers から作った配列は必要になるまで作らない
+        self._elements = elements
+        # 数値だけの配列の中身 (NumPy 配列か int / float のリスト)
+        # None は未計算、False は数値以外を含む
+        self.numbers = numbers
+
+    @property
+    def elements(self):
+        if self._elements is None:
+            numbers = self.numbers
+            if hasattr(numbers, "tolist"):
+                numbers = numbers.tolist()
+            self._elements = [
+                Integer(v) if type(v) is int else Float(v) for v in numbers
+            ]
+        return self._elements
+
+    def Type(self):
+        return ARRAY_OBJ
+
+    def Inspect(self):
+        el = []
+        for v in self.elements:
+            el.append(v.Inspect())
+
+        out = "["
+        out += ", ".join(el)
+        out += "]"
+
+        return out
+
+    def __str__(self):
+        return "Array(Object)"
+
+
 if __name__ == "__main__":
     obj = Null()
     print(obj.Type())
@@ -1,5 +1,6 @@
-from token_ import TokenType
+from token_ import TokenType, TYPES
 import ast_
+import lexer_
 
 
 priority = {
@@ -12,6 +13,12 @@ priority = {
     "CALL": 7,  # myFunction(X)
 }
 
+# 構文解析関数の表に置く印。前置演算子・括弧・中置演算子は関数を呼ばずに
+# parse_expression が自分のスタックで読む
+PREFIX_OPERATOR = "prefix operator"
+GROUPED = "grouped"
+INFIX_OPERATOR = "infix operator"
+
 
 class Parser:
     precedences = {
@@ -28,9 +35,19 @@ class Parser:
 
     def __init__(self, lex):
         self.lex = lex
+        self.input = lex.input
+        self.base = lex.base
         self.errors = []
+        # errors と同じ並びで、エラーの起きた入力中の位置を持つ
+        self.error_positions = []
         self.cur_token = None
         self.peek_token = None
+        self.register_parse_fns()
+
+        self.next_token()
+        self.next_token()
+
+    def register_parse_fns(self):
         # 前置構文解析関数
         self.prefix_parse_fns = {}
         # 中置構文解析関数
@@ -40,36 +57,39 @@ class Parser:
         self.prefix_parse_fns[TokenType.IDENT] = self.parse_identifier
         self.prefix_parse_fns[TokenType.INT] = self.parse_integerLiteral_literal
         self.prefix_parse_fns[TokenType.FLOAT] = self.parse_floatLiteral_literal
-        self.prefix_parse_fns[TokenType.BANG] = self.parse_prefix_expression
-        self.prefix_parse_fns[TokenType.MINUS] = self.parse_prefix_expression
+        self.prefix_parse_fns[TokenType.BANG] = PREFIX_OPERATOR
+        self.prefix_parse_fns[TokenType.MINUS] = PREFIX_OPERATOR
         self.prefix_parse_fns[TokenType.TRUE] = self.parse_boolean
         self.prefix_parse_fns[TokenType.FALSE] = self.parse_boolean
-        self.prefix_parse_fns[TokenType.LPAREN] = self.parse_grouped_expression
+        self.prefix_parse_fns[TokenType.LPAREN] = GROUPED
         self.prefix_parse_fns[TokenType.IF] = self.parse_if_expression
         self.prefix_parse_fns[TokenType.FUNCTION] = self.parse_function_literal
         self.prefix_parse_fns[TokenType.STRING] = self.parse_string_literal
         self.prefix_parse_fns[TokenType.LBRACKET] = self.parse_array_literal
         # 中置構文解析関数追加
-        self.infix_parse_fns[TokenType.PLUS] = self.parse_infix_expression
-        self.infix_parse_fns[TokenType.MINUS] = self.parse_infix_expression
-        self.infix_parse_fns[TokenType.SLASH] = self.parse_infix_expression
-        self.infix_parse_fns[TokenType.ASTERISK] = self.parse_infix_expression
-        self.infix_parse_fns[TokenType.EQ] = self.parse_infix_expression
-        self.infix_parse_fns[TokenType.NOT_EQ] = self.parse_infix_expression
-        self.infix_parse_fns[TokenType.LT] = self.parse_infix_expression
-        self.infix_parse_fns[TokenType.GT] = self.parse_infix_expression
+        self.infix_parse_fns[TokenType.PLUS] = INFIX_OPERATOR
+        self.infix_parse_fns[TokenType.MINUS] = INFIX_OPERATOR
+        self.infix_parse_fns[TokenType.SLASH] = INFIX_OPERATOR
+        self.infix_parse_fns[TokenType.ASTERISK] = INFIX_OPERATOR
+        self.infix_parse_fns[TokenType.EQ] = INFIX_OPERATOR
+        self.infix_parse_fns[TokenType.NOT_EQ] = INFIX_OPERATOR
+        self.infix_parse_fns[TokenType.LT] = INFIX_OPERATOR
+        self.infix_parse_fns[TokenType.GT] = INFIX_OPERATOR
         self.infix_parse_fns[TokenType.LPAREN] = self.parse_call_expression
 
-        self.next_token()
-        self.next_token()
-
     def next_token(self):
         self.cur_token = self.peek_token
         self.peek_token = self.lex.next_token()
 
+    def cur_type(self):
+        return self.cur_token.token_type
+
+    def peek_type(self):
+        return self.peek_token.token_type
+
     def parse_program(self):
         program = ast_.Program()
-        while self.cur_token.token_type != TokenType.EOF:
+        while not self.cur_token_is(TokenType.EOF):
             stmt = self.parse_statement()
             if stmt is not None:
                 program.statements.append(stmt)
@@ -77,9 +97,9 @@ class Parser:
         return program
 
     def parse_statement(self):
-        if self.cur_token.token_type == TokenType.LET:
+        if self.cur_token_is(TokenType.LET):
             return self.parse_let_statement()
-        elif self.cur_token.token_type == TokenType.RETURN:
+        elif self.cur_token_is(TokenType.RETURN):
             return self.parse_return_statement()
         else:
             return self.parse_expression_statement()
@@ -134,8 +154,23 @@ class Parser:
         return self.peek_token.token_type == t
 
     def peek_error(self, t):
-        msg = f"期待 {t}、現実 {self.peek_token.token_type}"
+        msg = f"期待 {t}、現実 {self.peek_type()}"
+        self.add_error(msg, self.peek_token)
+
+    def add_error(self, msg, token):
         self.errors.append(msg)
+        self.error_positions.append(token.pos)
+
+    def located_errors(self):
+        """エラーの前に "行:列: " を付けて返す"""
+        table = lexer_.LineTable(self.input, self.base)
+        out = []
+        for msg, pos in zip(self.errors, self.error_positions):
+            if pos < 0:
+                out.append(msg)
+            else:
+                out.append(f"{table.describe(pos)}: {msg}")
+        return out
 
     def parse_expression_statement(self):
         stmt = ast_.ExpressionStatement(token=self.cur_token)
@@ -148,22 +183,71 @@ class Parser:
         return stmt
 
     def parse_expression(self, precedence):
-        prefix = self.prefix_parse_fns.get(self.cur_token.token_type)
-        if prefix is None:
-            self.no_prefix_parse_fn_error(self.cur_token.token_type)
-            return None
-
-        left_exp = prefix()
-
-        while not self.peek_token_is(TokenType.SEMICOLON) and (precedence < self.peek_precedence()):
-            infix = self.infix_parse_fns.get(self.peek_token.token_type)
-            if infix is None:
-                return left_exp
-
-            self.next_token()
-            left_exp = infix(left_exp)
-
-        return left_exp
+        # 前置演算子・括弧・中置演算子は再帰せずに明示的なスタックで読む。
+        # 再帰下降で parse_expression を呼び出す代わりにスタックへ積み、
+        # 右辺ができたところで取り出して組み立てる。
+        # スタックの要素は (右辺待ちの式, 呼び出し元の優先順位)。括弧は式が None
+        stack = []
+        while True:
+            # オペランドを読む
+            prefix = self.prefix_parse_fns.get(self.cur_type())
+            if prefix is PREFIX_OPERATOR:
+                expression = ast_.PrefixExpression(
+                    token=self.cur_token,
+                    operator=self.cur_token.literal
+                )
+                stack.append((expression, precedence))
+                precedence = priority["PREFIX"]
+                self.next_token()
+                continue
+            elif prefix is GROUPED:
+                stack.append((None, precedence))
+                precedence = priority["LOWEST"]
+                self.next_token()
+                continue
+            elif prefix is None:
+                self.no_prefix_parse_fn_error(self.cur_type())
+                left_exp = None
+                finished = True
+            else:
+                left_exp = prefix()
+                finished = False
+
+            # 中置演算子を読み、この優先順位で読める式がなくなったら畳む
+            while True:
+                if not finished and not self.peek_token_is(TokenType.SEMICOLON) \
+                        and precedence < self.peek_precedence():
+                    infix = self.infix_parse_fns.get(self.peek_type())
+                    if infix is None:
+                        finished = True
+                        continue
+
+                    self.next_token()
+                    if infix is INFIX_OPERATOR:
+                        expression = ast_.InfixExpression(
+                            token=self.cur_token,
+                            operator=self.cur_token.literal,
+                            left=left_exp
+                        )
+                        stack.append((expression, precedence))
+                        precedence = self.cur_precedence()
+                        self.next_token()
+                        break
+
+                    left_exp = infix(left_exp)
+                    continue
+
+                if len(stack) == 0:
+                    return left_exp
+
+                expression, precedence = stack.pop()
+                finished = False
+                if expression is None:
+                    if not self.expect_peek(TokenType.RPAREN):
+                        left_exp = None
+                else:
+                    expression.right = left_exp
+                    left_exp = expression
 
     def parse_identifier(self):
         return ast_.Identifier(token=self.cur_token, value=self.cur_token.literal)
@@ -173,7 +257,7 @@ class Parser:
         try:
             obj.value = int(self.cur_token.literal)
         except Exception as e:
-            self.errors.append(f"{self.cur_token.literal}がintに変換できません {e}")
+            self.add_error(f"{self.cur_token.literal}がintに変換できません {e}", self.cur_token)
             return None
 
         return obj
@@ -183,60 +267,33 @@ class Parser:
         try:
             obj.value = float(self.cur_token.literal)
         except Exception as e:
-            self.errors.append(f"{self.cur_token.literal}がfloatに変換できません {e}")
+            self.add_error(f"{self.cur_token.literal}がfloatに変換できません {e}", self.cur_token)
             return None
 
         return obj
 
     def no_prefix_parse_fn_error(self, t):
         msg = f"no prefix parse function for {t} found"
-        self.errors.append(msg)
-
-    def parse_prefix_expression(self):
-        expression = ast_.PrefixExpression(
-            token=self.cur_token,
-            operator=self.cur_token.literal
-        )
-        self.next_token()
-        expression.right = self.parse_expression(priority["PREFIX"])
-        return expression
+        self.add_error(msg, self.cur_token)
 
     def peek_precedence(self):
-        p = Parser.precedences.get(self.peek_token.token_type)
+        p = Parser.precedences.get(self.peek_type())
         if p:
             return p
         return priority["LOWEST"]
 
     def cur_precedence(self):
-        p = Parser.precedences.get(self.cur_token.token_type)
+        p = Parser.precedences.get(self.cur_type())
         if p:
             return p
         return priority["LOWEST"]
 
-    def parse_infix_expression(self, left):
-        expression = ast_.InfixExpression(
-            token=self.cur_token,
-            operator=self.cur_token.literal,
-            left=left
-        )
-        precedence = self.cur_precedence()
-        self.next_token()
-        expression.right = self.parse_expression(precedence)
-        return expression
-
     def parse_boolean(self):
         return ast_.Boolean(
             token=self.cur_token,
             value=self.cur_token_is(TokenType.TRUE)
         )
 
-    def parse_grouped_expression(self):
-        self.next_token()
-        exp = self.parse_expression(priority["LOWEST"])
-        if not self.expect_peek(TokenType.RPAREN):
-            return None
-        return exp
-
     def parse_if_expression(self):
         expression = ast_.IfExpression(token=self.cur_token)
 
@@ -376,5 +433,401 @@ class Parser:
         return args
 
 
+# CompactParser が比べる字句の種類の番号
+_EOF = TokenType.EOF._value_
+_IDENT = TokenType.IDENT._value_
+_LET = TokenType.LET._value_
+_RETURN = TokenType.RETURN._value_
+_ASSIGN = TokenType.ASSIGN._value_
+_SEMICOLON = TokenType.SEMICOLON._value_
+_COMMA = TokenType.COMMA._value_
+_LPAREN = TokenType.LPAREN._value_
+_RPAREN = TokenType.RPAREN._value_
+_LBRACE = TokenType.LBRACE._value_
+_RBRACE = TokenType.RBRACE._value_
+_RBRACKET = TokenType.RBRACKET._value_
+_ELSE = TokenType.ELSE._value_
+_TRUE = TokenType.TRUE._value_
+
+
+class CompactParser(Parser):
+    """TokenBuffer を添字で読み進める構文解析器
+
+    読んでいる位置は kinds の添字 cur / peek だけで持ち、字句の種類は番号のまま
+    比べる。Token は AST のノードを作るときにだけ token() で作る。
+    """
+
+    def __init__(self, buf):
+        self.buf = buf
+        self.input = buf.input
+        self.base = buf.base
+        self.kinds = buf.kinds
+        self.errors = []
+        self.error_positions = []
+        # 最後の字句 (EOF) の添字
+        self.last = len(buf.kinds) - 1
+        self.cur = 0
+        self.peek = min(1, self.last)
+        # 文とその先頭の式は同じ字句から作るので、最後に作った Token を覚えておく
+        self.token_index = -1
+        self.last_token = None
+        self.register_parse_fns()
+
+        # 種類の番号で引く構文解析関数と優先順位
+        self.prefix_kinds = {t._value_: fn for t, fn in self.prefix_parse_fns.items()}
+        self.infix_kinds = {t._value_: fn for t, fn in self.infix_parse_fns.items()}
+        self.kind_precedences = [priority["LOWEST"]] * len(TYPES)
+        for t, p in Parser.precedences.items():
+            self.kind_precedences[t._value_] = p
+
+    def token(self, i):
+        if i != self.token_index:
+            self.last_token = self.buf.token(i)
+            self.token_index = i
+        return self.last_token
+
+    # エラーの報告と Parser から受け継いだ処理のための Token
+
+    @property
+    def cur_token(self):
+        return self.token(self.cur)
+
+    @property
+    def peek_token(self):
+        return self.token(self.peek)
+
+    def next_token(self):
+        self.cur = self.peek
+        if self.peek < self.last:
+            self.peek += 1
+
+    def cur_type(self):
+        return TYPES[self.kinds[self.cur]]
+
+    def peek_type(self):
+        return TYPES[self.kinds[self.peek]]
+
+    def cur_token_is(self, t):
+        return self.kinds[self.cur] == t._value_
+
+    def peek_token_is(self, t):
+        return self.kinds[self.peek] == t._value_
+
+    def expect_peek(self, t):
+        if self.kinds[self.peek] == t._value_:
+            self.next_token()
+            return True
+        self.peek_error(t)
+        return False
+
+    def peek_precedence(self):
+        return self.kind_precedences[self.kinds[self.peek]]
+
+    def cur_precedence(self):
+        return self.kind_precedences[self.kinds[self.cur]]
+
+    # 文
+
+    def parse_program(self):
+        program = ast_.Program()
+        statements = program.statements
+        kinds = self.kinds
+        while kinds[self.cur] != _EOF:
+            stmt = self.parse_statement()
+            if stmt is not None:
+                statements.append(stmt)
+            self.next_token()
+        return program
+
+    def parse_statement(self):
+        kind = self.kinds[self.cur]
+        if kind == _LET:
+            return self.parse_let_statement()
+        elif kind == _RETURN:
+            return self.parse_return_statement()
+        else:
+            return self.parse_expression_statement()
+
+    def parse_let_statement(self):
+        stmt = ast_.LetStatement(token=self.token(self.cur))
+
+        if not self.expect_peek(TokenType.IDENT):
+            return None
+
+        name = self.token(self.cur)
+        stmt.name = ast_.Identifier(token=name, value=name.literal)
+
+        if not self.expect_peek(TokenType.ASSIGN):
+            return None
+
+        self.next_token()
+        stmt.value = self.parse_expression(priority["LOWEST"])
+
+        if self.kinds[self.peek] == _SEMICOLON:
+            self.next_token()
+        return stmt
+
+    def parse_return_statement(self):
+        stmt = ast_.ReturnStatement(token=self.token(self.cur))
+        self.next_token()
+        stmt.return_value = self.parse_expression(priority["LOWEST"])
+        if self.kinds[self.peek] == _SEMICOLON:
+            self.next_token()
+        return stmt
+
+    def parse_expression_statement(self):
+        stmt = ast_.ExpressionStatement(token=self.token(self.cur))
+        stmt.expression = self.parse_expression(priority["LOWEST"])
+        if self.kinds[self.peek] == _SEMICOLON:
+            self.next_token()
+        return stmt
+
+    def parse_block_statement(self):
+        block = ast_.BlockStatement(token=self.token(self.cur))
+        statements = block.statements
+        kinds = self.kinds
+        self.next_token()
+        while kinds[self.cur] != _RBRACE and kinds[self.cur] != _EOF:
+            stmt = self.parse_statement()
+            if stmt is not None:
+                statements.append(stmt)
+            self.next_token()
+        return block
+
+    # 式
+
+    def parse_expression(self, precedence):
+        # Parser.parse_expression と同じ手順を種類の番号で行う
+        kinds = self.kinds
+        prefix_kinds = self.prefix_kinds
+        infix_kinds = self.infix_kinds
+        precedences = self.kind_precedences
+        stack = []
+        while True:
+            prefix = prefix_kinds.get(kinds[self.cur])
+            if prefix is PREFIX_OPERATOR:
+                token = self.token(self.cur)
+                stack.append((ast_.PrefixExpression(token=token, operator=token.literal), precedence))
+                precedence = priority["PREFIX"]
+                self.next_token()
+                continue
+            elif prefix is GROUPED:
+                stack.append((None, precedence))
+                precedence = priority["LOWEST"]
+                self.next_token()
+                continue
+            elif prefix is None:
+                self.no_prefix_parse_fn_error(self.cur_type())
+                left_exp = None
+                finished = True
+            else:
+                left_exp = prefix()
+                finished = False
+
+            while True:
+                kind = kinds[self.peek]
+                if not finished and kind != _SEMICOLON and precedence < precedences[kind]:
+                    infix = infix_kinds.get(kind)
+                    if infix is None:
+                        finished = True
+                        continue
+
+                    self.next_token()
+                    if infix is INFIX_OPERATOR:
+                        token = self.token(self.cur)
+                        expression = ast_.InfixExpression(
+                            token=token,
+                            operator=token.literal,
+                            left=left_exp
+                        )
+                        stack.append((expression, precedence))
+                        precedence = precedences[kind]
+                        self.next_token()
+                        break
+
+                    left_exp = infix(left_exp)
+                    continue
+
+                if len(stack) == 0:
+                    return left_exp
+
+                expression, precedence = stack.pop()
+                finished = False
+                if expression is None:
+                    if not self.expect_peek(TokenType.RPAREN):
+                        left_exp = None
+                else:
+                    expression.right = left_exp
+                    left_exp = expression
+
+    def parse_identifier(self):
+        token = self.token(self.cur)
+        return ast_.Identifier(token=token, value=token.literal)
+
+    def parse_integerLiteral_literal(self):
+        token = self.token(self.cur)
+        obj = ast_.IntegerLiteral(token=token)
+        try:
+            obj.value = int(token.literal)
+        except Exception as e:
+            self.add_error(f"{token.literal}がintに変換できません {e}", token)
+            return None
+        return obj
+
+    def parse_floatLiteral_literal(self):
+        token = self.token(self.cur)
+        obj = ast_.FloatLiteral(token=token)
+        try:
+            obj.value = float(token.literal)
+        except Exception as e:
+            self.add_error(f"{token.literal}がfloatに変換できません {e}", token)
+            return None
+        return obj
+
+    def parse_boolean(self):
+        return ast_.Boolean(token=self.token(self.cur), value=self.kinds[self.cur] == _TRUE)
+
+    def parse_string_literal(self):
+        token = self.token(self.cur)
+        return ast_.StringLiteral(token, token.literal)
+
+    def parse_if_expression(self):
+        expression = ast_.IfExpression(token=self.token(self.cur))
+
+        if not self.expect_peek(TokenType.LPAREN):
+            return None
+        self.next_token()
+        expression.condition = self.parse_expression(priority["LOWEST"])
+        if not self.expect_peek(TokenType.RPAREN):
+            return None
+        if not self.expect_peek(TokenType.LBRACE):
+            return None
+        expression.consequence = self.parse_block_statement()
+
+        if self.kinds[self.peek] == _ELSE:
+            self.next_token()
+            if not self.expect_peek(TokenType.LBRACE):
+                return None
+            expression.alternative = self.parse_block_statement()
+        return expression
+
+    def parse_function_literal(self):
+        lit = ast_.FunctionLiteral(token=self.token(self.cur))
+        if not self.expect_peek(TokenType.LPAREN):
+            return None
+        lit.parameters = self.parse_function_parameters()
+        if not self.expect_peek(TokenType.LBRACE):
+            return None
+        lit.body = self.parse_block_statement()
+        return lit
+
+    def parse_function_parameters(self):
+        identifiers = []
+        kinds = self.kinds
+        if kinds[self.peek] == _RPAREN:
+            self.next_token()
+            return identifiers
+
+        self.next_token()
+        token = self.token(self.cur)
+        identifiers.append(ast_.Identifier(token=token, value=token.literal))
+        while kinds[self.peek] == _COMMA:
+            self.next_token()
+            self.next_token()
+            token = self.token(self.cur)
+            identifiers.append(ast_.Identifier(token=token, value=token.literal))
+
+        if not self.expect_peek(TokenType.RPAREN):
+            return None
+        return identifiers
+
+    def parse_call_expression(self, function):
+        exp = ast_.CallExpression(token=self.token(self.cur), function=function)
+        exp.arguments = self.parse_expression_list(TokenType.RPAREN)
+        return exp
+
+    def parse_array_literal(self):
+        array = ast_.ArrayLiteral(self.token(self.cur), [])
+        array.elements = self.parse_expression_list(TokenType.RBRACKET)
+        return array
+
+    def parse_expression_list(self, end):
+        args = []
+        kinds = self.kinds
+        if kinds[self.peek] == end._value_:
+            self.next_token()
+            return args
+
+        self.next_token()
+        args.append(self.parse_expression(priority["LOWEST"]))
+        while kinds[self.peek] == _COMMA:
+            self.next_token()
+            self.next_token()
+            args.append(self.parse_expression(priority["LOWEST"]))
+
+        if not self.expect_peek(end):
+            return None
+        return args
+
+    def __str__(self):
+        return "CompactParser()"
+
+
+def new_parser(input, base=0):
+    """input を読む構文解析器を返す。字句を配列に詰めて CompactParser で読む"""
+    return CompactParser(lexer_.tokenize(input, base))
+
+
+def bench_input(statements=2500):
+    """構文解析の速さを測るための、8 行ずつの文の並びを返す"""
+    def name(i):
+        out = "v"
+        while True:
+            out += chr(ord("a") + i % 26)
+            i //= 26
+            if i == 0:
+                return out
+
+    lines = []
+    for n in range(statements):
+        v = name(n)
+        lines += [
+            f"let f{v} = fn(a, b) {{ if (a < b) {{ return a * 2 + b; }} else {{ -a / (b - 1) }} }};",
+            f"let x{v} = f{v}({n}, 3.5) + len([1, 2, 3]);",
+            f'let s{v} = "name" + "{n}";',
+            f"let g{v} = fn(x) {{ !(x == {n}) }};",
+            f"map([1, 2, x{v}], fn(v) {{ v * v - 1 }});",
+            f"if (x{v} > 10) {{ x{v} }} else {{ g{v}(x{v}) }};",
+            f"let y{v} = (((x{v} + 1) * 2) - 3) / 4;",
+            f"y{v} != x{v};",
+        ]
+    return "\n".join(lines)
+
+
+def bench(input=None, repeat=5):
+    """Parser と、tokenize してから CompactParser で読む場合の時間 (最小) を返す"""
+    from time import perf_counter
+    if input is None:
+        input = bench_input()
+
+    def best(parse):
+        result = None
+        for _ in range(repeat):
+            start = perf_counter()
+            parse()
+            elapsed = perf_counter() - start
+            if result is None or elapsed < result:
+                result = elapsed
+        return result
+
+    return {
+        "Parser": best(lambda: Parser(lexer_.Lexer(input)).parse_program()),
+        "CompactParser": best(lambda: new_parser(input).parse_program()),
+    }
+
+
 if __name__ == "__main__":
-    pass
+    # python parser_.py で二つの構文解析器の速さを比べる
+    times = bench()
+    for k, v in times.items():
+        print(f"{k:14} {v:8.4f}s {v / times['Parser']:5.2f}x")
@@ -0,0 +1,103 @@
+import weakref
+import ast_
+
+
+# AST の文字列表現
+# ノードは parts() で自分の並び (文字列と子ノード) だけを返し、ここで
+# スタックを使って左から順に書き出す。部分文字列を何度も連結しないので
+# 出力の長さに比例した時間で済み、深い木でも再帰の上限に当たらない。
+
+# まとめて書き出す断片の数
+FLUSH_PARTS = 4096
+
+# 関数の値を表示するときに使う本体の文字列のキャッシュ
+rendered = weakref.WeakKeyDictionary()
+
+
+class _End:
+    """memo に記録するノードの終わり"""
+
+    __slots__ = ("node", "start")
+
+    def __init__(self, node, start):
+        self.node = node
+        self.start = start
+
+
+def memoizable(node):
+    """描画した文字列を覚えておく価値のあるノード"""
+    t = type(node)
+    return t is ast_.BlockStatement or t is ast_.FunctionLiteral
+
+
+def write(node, out, memo=None):
+    """node の文字列表現を out (write() を持つもの) に書き出す"""
+    if memo is not None:
+        out.write(render(node, memo))
+        return
+
+    parts = []
+    stack = [node]
+    while stack:
+        item = stack.pop()
+        if type(item) is str:
+            parts.append(item)
+            if len(parts) >= FLUSH_PARTS:
+                out.write("".join(parts))
+                parts.clear()
+        elif item is not None:
+            stack.extend(reversed(item.parts()))
+    out.write("".join(parts))
+
+
+def render(node, memo=None):
+    """node の文字列表現を返す。memo を渡すとブロックと関数の文字列を覚えて使い回す"""
+    parts = []
+    stack = [node]
+    while stack:
+        item = stack.pop()
+        t = type(item)
+        if t is str:
+            parts.append(item)
+        elif t is _End:
+            text = "".join(parts[item.start:])
+            del parts[item.start:]
+            parts.append(text)
+            memo[item.node] = text
+        elif item is not None:
+            if memo is not None and memoizable(item):
+                text = memo.get(item)
+                if text is not None:
+                    parts.append(text)
+                    continue
+                stack.append(_End(item, len(parts)))
+            stack.extend(reversed(item.parts()))
+    return "".join(parts)
+
+
+def separated(nodes, sep=", "):
+    """nodes の間に sep を挟んだ並び"""
+    out = []
+    for v in nodes or []:
+        if out:
+            out.append(sep)
+        out.append(v)
+    return out
+
+
+def function_parts(fn):
+    """object_.Function の Inspect の並び"""
+    out = ["fn", "("]
+    out += separated(fn.parameters)
+    out.append(") {\n")
+    out.append(fn.body)
+    out.append("\n}")
+    return out
+
+
+def inspect_function(fn):
+    """object_.Function の文字列表現。本体の文字列は rendered に覚えておく"""
+    parts = []
+    for v in function_parts(fn):
+        parts.append(v if type(v) is str else render(v, rendered))
+    return "".join(parts)
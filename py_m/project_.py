@@ -0,0 +1,190 @@
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+import arena_
+import cache_
+import lexer_
+import object_
+import env_
+
+
+# プロジェクトの読み込み
+# ディレクトリの下の Monkey のファイルを、プロセスプールの各ワーカーで
+# 字句解析・構文解析する。ワーカーは Arena をバイト列 (arena_.dumps) にして
+# 返すので、オブジェクトの AST を pickle して送るよりずっと小さい。
+# 評価はファイルの相対パスの順に、一つの環境で行う。
+
+EXTENSION = ".monkey"
+
+# resident=True のとき、ワーカーが解析済みのファイルを覚えておく
+# (パス, 基点, 更新時刻, 大きさ) -> (直列化した Arena, 根の番号, エラー)
+_resident = {}
+
+
+class Source:
+    """読み込んだファイル"""
+
+    def __init__(self, path, name, arena, root, errors):
+        self.path = path
+        # ディレクトリからの相対パス。評価の順番に使う
+        self.name = name
+        self.arena = arena
+        self.root = root
+        self.errors = errors
+
+    def __str__(self):
+        return "Source()"
+
+
+def find_sources(directory, extension=EXTENSION):
+    """directory の下の extension のファイルを相対パスの順に返す"""
+    paths = []
+    for dirpath, dirnames, filenames in os.walk(directory):
+        for v in filenames:
+            if v.endswith(extension):
+                paths.append(os.path.join(dirpath, v))
+    paths.sort(key=lambda v: os.path.relpath(v, directory))
+    return paths
+
+
+def parse_file(path, base=0, cache=False):
+    """ワーカーで実行する。(直列化した Arena, 根の番号, エラー) を返す
+
+    cache=True ならファイルの隣のキャッシュ (cache_) を使い、なければ作る。
+    """
+    if cache:
+        entry = cache_.load(path, base)
+        return arena_.dumps(entry.arena), entry.root, entry.errors
+
+    with open(path, encoding="utf-8") as f:
+        input = f.read()
+    arena, root, errors = arena_.parse(input, base)
+    return arena_.dumps(arena), root, errors
+
+
+def parse_file_resident(path, base=0, cache=False):
+    """parse_file と同じだが、変更のないファイルは前の結果を返す"""
+    st = os.stat(path)
+    key = (path, base, st.st_mtime_ns, st.st_size)
+    parsed = _resident.get(key)
+    if parsed is None:
+        parsed = parse_file(path, base, cache)
+        _resident[key] = parsed
+    return parsed
+
+
+class Project:
+    """ディレクトリの Monkey のファイルを並列に読み込んで評価する
+
+    resident=True ならプロセスプールを閉じずに持ち続け、ワーカーは
+    解析したファイルを覚えておく。load() を繰り返すと、変更のない
+    ファイルは解析し直さない。with 文か close() でプールを閉じる。
+    cache=True ならワーカーはファイルの隣のキャッシュ (cache_) を使う。
+    """
+
+    def __init__(self, directory, workers=None, resident=False, extension=EXTENSION,
+                 cache=False):
+        self.directory = directory
+        self.workers = workers
+        self.resident = resident
+        self.cache = cache
+        self.extension = extension
+        self.executor = None
+        self.sources = []
+        # エラーの位置をファイル名と行・列に直す
+        self.source_set = lexer_.SourceSet()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def load(self):
+        """全ファイルを解析し、相対パスの順に Source のリストを返す"""
+        paths = find_sources(self.directory, self.extension)
+        # ファイルの大きさ (バイト数は文字数以上) から重ならない基点を決める
+        self.source_set = lexer_.SourceSet()
+        bases = []
+        for path in paths:
+            name = os.path.relpath(path, self.directory)
+            bases.append(self.source_set.add(name, path=path, size=os.path.getsize(path)))
+
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+
+        fn = parse_file_resident if self.resident else parse_file
+        # 一度に送るファイルの数。ワーカーごとに数回に分ける
+        workers = self.workers or os.cpu_count() or 1
+        chunksize = max(1, len(paths) // (workers * 4))
+        try:
+            caches = [self.cache] * len(paths)
+            parsed = list(self.executor.map(fn, paths, bases, caches, chunksize=chunksize))
+        finally:
+            if not self.resident:
+                self.close()
+
+        self.sources = []
+        for path, (data, root, errors) in zip(paths, parsed):
+            name = os.path.relpath(path, self.directory)
+            self.sources.append(Source(path, name, arena_.loads(data), root, errors))
+        return self.sources
+
+    def errors(self):
+        """構文解析のエラーを (相対パス, "行:列: エラー") のリストで返す"""
+        out = []
+        for v in self.sources:
+            for e in v.errors:
+                out.append((v.name, e))
+        return out
+
+    def describe(self, error):
+        """評価のエラーを "相対パス:行:列: ERROR: ..." の文字列にする"""
+        if error.pos < 0:
+            return error.Inspect()
+        return f"{self.source_set.describe(error.pos)}: {error.Inspect()}"
+
+    def run(self, env=None):
+        """読み込んだファイルを順に評価する
+
+        構文解析のエラーがあれば何も評価せずに最初のエラーのファイルを、
+        評価中にエラーになればそのファイルで止めて返す。
+        (相対パス, 最後の評価結果) を返す。
+        """
+        if env is None:
+            env = env_.NewEnvironment()
+
+        for v in self.sources:
+            if len(v.errors) != 0:
+                return v.name, object_.Error(v.errors[0])
+
+        name, result = None, None
+        for v in self.sources:
+            name = v.name
+            result = arena_.evalProgram(v.arena, v.root, env)
+            if type(result) is object_.Error:
+                break
+        return name, result
+
+
+if __name__ == "__main__":
+    # python project_.py ディレクトリ
+    with Project(sys.argv[1]) as project:
+        project.load()
+        errors = project.errors()
+        for name, e in errors:
+            print(f"{name}:{e}")
+        if len(errors) != 0:
+            sys.exit(1)
+
+        name, result = project.run()
+        if type(result) is object_.Error:
+            print(project.describe(result))
+            sys.exit(1)
+        if result is not None:
+            print(f"{name}: {result.Inspect()}")
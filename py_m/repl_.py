@@ -1,9 +1,14 @@
+import gc
 import sys
+import collections
 import token_
 import lexer_
 import parser_
 import evaluator_
 import env_
+import object_
+import closure_
+import tier_
 
 
 PROMPT = ">> "
@@ -25,23 +30,114 @@ def print_parser_errors(errors):
     return out
 
 
-def start():
-    env = env_.NewEnvironment()
+class Session:
+    """REPL の状態
+
+    history は位置を引くために覚えておく入力の数。None なら制限しない。
+    history を指定すると、行を実行するたびに compact() で、再定義などで
+    届かなくなった束縛と環境を手放す。
+    metrics は計測中の metrics_.Metrics (:metrics で表示する)。
+    ":" で始まる行はコマンドとして扱う。
+    """
+
+    def __init__(self, evaluator=evaluator_, history=None, metrics=None):
+        # evaluator は Eval を持つモジュール (evaluator_ か evaluator_exc_)
+        self.evaluator = evaluator
+        self.history = history
+        self.metrics = metrics
+        self.clear()
+
+    def clear(self):
+        self.env = env_.NewEnvironment()
+        # 入力した行ごとに位置の基点を割り当てる。エラーは "[何行目]:行:列" で示す
+        self.sources = lexer_.SourceSet()
+        self.kept = collections.deque()
+
+    def execute(self, line):
+        """1 行を実行し、表示する文字列を返す。表示するものがなければ None"""
+        if line.startswith(":"):
+            return self.command(line[1:].split())
+
+        base = self.sources.add(f"[{len(self.sources) + 1}]", line)
+        self.kept.append(len(self.sources) - 1)
+        if self.history is not None:
+            while len(self.kept) > self.history:
+                self.sources.release(self.kept.popleft())
+
+        p = parser_.new_parser(line, base)
+        program = p.parse_program()
+        if len(p.Errors()) != 0:
+            return print_parser_errors(p.located_errors())
+
+        evaluated = self.evaluator.Eval(program, self.env)
+        if self.history is not None:
+            self.compact()
+        if type(evaluated) is object_.Error and evaluated.pos >= 0:
+            return f"{self.sources.describe(evaluated.pos)}: {evaluated.Inspect()}"
+        elif evaluated is not None:
+            return evaluated.Inspect()
+        return None
+
+    def compact(self):
+        """関数が持つ環境を使う変数だけにし、届かない関数のコンパイル結果を捨てる
+
+        トップレベルから届く値をすべてたどるので、値の数に比例して時間がかかる。
+        """
+        functions = closure_.compact(self.env)
+        tier_.retain({v.scope.source for v in functions
+                      if v.scope is not None and v.scope.source is not None})
+
+    def command(self, args):
+        if args == ["clear"]:
+            self.clear()
+            gc.collect()
+            return None
+        elif len(args) == 2 and args[0] == "unset":
+            if not self.env.Delete(args[1]):
+                return f"not bound: {args[1]}"
+            return None
+        elif args == ["mem"]:
+            return memory_report(self)
+        elif args == ["metrics"]:
+            if self.metrics is None:
+                return "metrics are off"
+            return self.metrics.to_json(indent=2)
+        return "commands: :unset <name>, :clear, :mem, :metrics"
+
+    def __str__(self):
+        return "Session()"
+
+
+def live_objects():
+    """生きている object_ と env_ のオブジェクトを型の名前ごとに数える"""
+    gc.collect()
+    counts = {}
+    for v in gc.get_objects():
+        t = type(v)
+        if t.__module__ in ("object_", "env_"):
+            counts[t.__name__] = counts.get(t.__name__, 0) + 1
+    return counts
+
+
+def memory_report(session):
+    counts = live_objects()
+    out = []
+    for name in sorted(counts):
+        out.append(f"{name}: {counts[name]}")
+    out.append(f"bindings: {len(session.env.store)}")
+    out.append(f"history: {len(session.kept)}")
+    return "\n".join(out)
+
+
+def start(evaluator=evaluator_, history=None, metrics=None):
+    session = Session(evaluator, history, metrics)
 
     try:
         while True:
             print(PROMPT, end="")
-            line = input()
-            lex = lexer_.Lexer(line)
-            p = parser_.Parser(lex)
-            program = p.parse_program()
-            if len(p.Errors()) != 0:
-                print(print_parser_errors(p.Errors()))
-                continue
-
-            evaluated = evaluator_.Eval(program, env)
-            if evaluated is not None:
-                print(evaluated.Inspect())
+            out = session.execute(input())
+            if out is not None:
+                print(out)
 
     except KeyboardInterrupt:
         sys.exit()
@@ -0,0 +1,77 @@
+# python -m unittest test_arena_.TestArena.test_round_trip
+import unittest
+import arena_
+import lexer_
+import parser_
+import object_
+import env_
+
+
+class TestArena(unittest.TestCase):
+
+    input = """
+let add = fn(x, y) { x + y; };
+let result = add(5, 10.5) * -2;
+if (result < 10) { return [1, "two", true]; } else { !false }
+add(1, 2);
+"""
+
+    def test_round_trip(self):
+        p = parser_.Parser(lexer_.Lexer(self.input))
+        program = p.parse_program()
+
+        arena, root = arena_.from_ast(program)
+        assert arena.kind(root) == arena_.PROGRAM
+        assert len(arena.statements(root)) == len(program.statements)
+        assert arena_.to_ast(arena, root).string() == program.string()
+
+    def test_parse(self):
+        program = parser_.Parser(lexer_.Lexer(self.input)).parse_program()
+        arena, root, errors = arena_.parse(self.input)
+        assert errors == []
+        assert arena_.to_ast(arena, root).string() == program.string()
+
+    def test_traversal(self):
+        arena, root, errors = arena_.parse("let a = 1 + b * 2;")
+        let = arena.statements(root)[0]
+        assert arena.kind(let) == arena_.LET
+        assert arena.value(arena.name(let)) == "a"
+
+        infix = arena.expression(let)
+        assert arena.kind(infix) == arena_.INFIX
+        assert arena.operator(infix) == "+"
+        assert arena.value(arena.left(infix)) == 1
+        assert arena.operator(arena.right(infix)) == "*"
+
+        kinds = [arena.kind(i) for i in arena.walk(root)]
+        assert kinds == [
+            arena_.PROGRAM, arena_.LET, arena_.IDENTIFIER, arena_.INFIX,
+            arena_.INTEGER, arena_.INFIX, arena_.IDENTIFIER, arena_.INTEGER,
+        ]
+
+    def test_positions(self):
+        # SourceSet の基点は符号なしなので、2**31 を超える位置も持てる
+        base = 2 ** 31
+        arena, root, errors = arena_.parse("let a = 1;", base)
+        let = arena.statements(root)[0]
+        assert arena.token(let).pos == base
+        arena.rebase(10)
+        assert arena.token(let).pos == base + 10
+        assert arena.token(root) is None
+
+    def test_dumps(self):
+        arena, root, errors = arena_.parse(self.input)
+        loaded = arena_.loads(arena_.dumps(arena))
+        assert len(loaded) == len(arena)
+        assert loaded.constants == arena.constants
+        assert arena_.to_ast(loaded, root).string() == arena_.to_ast(arena, root).string()
+
+    def test_eval(self):
+        arena, root, errors = arena_.parse(self.input)
+        evaluated = arena_.evalProgram(arena, root, env_.NewEnvironment())
+        assert type(evaluated) is object_.Array
+        assert evaluated.Inspect() == "[1, two, True]"
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+# python -m unittest test_cache_.TestCache.test_run
+import os
+import tempfile
+import unittest
+import cache_
+import env_
+import object_
+import project_
+import tier_
+
+
+class TestCache(unittest.TestCase):
+
+    input = """
+let fib = fn(n) { if (n < 2) { return n; } fib(n - 1) + fib(n - 2) };
+fib(10)
+"""
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "fib.monkey")
+        self.write(self.input)
+
+    def tearDown(self):
+        tier_.disable()
+        self.dir.cleanup()
+
+    def write(self, input):
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write(input)
+
+    def digest(self):
+        with open(self.path, encoding="utf-8") as f:
+            return cache_.source_hash(f.read())
+
+    def test_load(self):
+        assert cache_.read(self.path, self.digest()) is None
+        first = cache_.load(self.path)
+        assert os.path.exists(cache_.cache_path(self.path))
+
+        entry = cache_.read(self.path, self.digest())
+        assert entry is not None
+        assert entry.root == first.root
+        assert entry.arena.constants == first.arena.constants
+
+        # ソースが変わったら使わない
+        self.write(self.input + "1;")
+        assert cache_.read(self.path, self.digest()) is None
+        assert cache_.load(self.path).root != first.root
+
+    def test_invalid(self):
+        cache_.load(self.path)
+        for data in (b"", b"garbage", cache_.MAGIC + b"\x00\x01"):
+            with open(cache_.cache_path(self.path), "wb") as f:
+                f.write(data)
+            assert cache_.read(self.path, self.digest()) is None
+            assert cache_.run(self.path).Inspect() == "55"
+
+    def test_run(self):
+        tier_.enable()
+        assert cache_.run(self.path).Inspect() == "55"
+        entry = cache_.read(self.path, self.digest())
+        assert len(entry.codes) == 1
+
+        # キャッシュのコードを使っても同じ結果になる
+        tier_.codes.clear()
+        assert cache_.run(self.path).Inspect() == "55"
+        assert list(tier_.codes) == list(entry.codes)
+
+    def test_other_codes(self):
+        # 他のスクリプトでコンパイルしたコードは置かない
+        tier_.enable()
+        other = os.path.join(self.dir.name, "other.monkey")
+        with open(other, "w", encoding="utf-8") as f:
+            f.write("let sum = fn(n) { if (n < 1) { 0 } else { n + sum(n - 1) } }; sum(1);")
+        env = env_.NewEnvironment()
+        assert cache_.run(other, env).Inspect() == "1"
+        self.write(self.input + "sum(100);")
+        assert cache_.run(self.path, env).Inspect() == "5050"
+        entry = cache_.read(self.path, self.digest())
+        assert len(entry.codes) == 1
+        assert len(tier_.codes) == 2
+
+    def test_interpreter(self):
+        # インタープリターが変わったら使わない
+        cache_.load(self.path)
+        interpreter = cache_._interpreter
+        try:
+            cache_._interpreter = b"other"
+            assert cache_.read(self.path, self.digest()) is None
+        finally:
+            cache_._interpreter = interpreter
+        assert cache_.read(self.path, self.digest()) is not None
+
+    def test_errors(self):
+        self.write("let = 1;")
+        result = cache_.run(self.path)
+        assert type(result) is object_.Error
+        assert result.message.startswith("1:5: ")
+
+    def test_project(self):
+        with project_.Project(self.dir.name, workers=1, cache=True) as project:
+            project.load()
+            name, result = project.run()
+        assert result.Inspect() == "55"
+        assert os.path.exists(cache_.cache_path(self.path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,32 @@
+# python -m unittest test_differential_.TestDifferential.test_Compare
+import random
+import unittest
+import differential_
+
+
+class TestDifferential(unittest.TestCase):
+
+    def test_Generate(self):
+        rng = random.Random(1)
+        for size, depth in [(1, 0), (10, 0), (30, 2), (100, 5)]:
+            input = differential_.generate(rng, size, depth)
+            numbers = input.replace("(", " ").replace(")", " ").split()
+            self.assertEqual(len([v for v in numbers if v not in differential_.OPERATORS]), size)
+
+            nesting = deepest = 0
+            for c in input:
+                if c == "(":
+                    nesting += 1
+                    deepest = max(deepest, nesting)
+                elif c == ")":
+                    nesting -= 1
+            self.assertLessEqual(deepest, depth)
+
+    def test_Compare(self):
+        report = differential_.compare(["1 + 2 * 3", "-(4.5 - 1) / 2", "6 / 3", "1 / (2 - 2)"])
+        self.assertEqual(report.mismatches, [])
+        self.assertEqual(report.errors, 1)
+
+        report = differential_.run(count=100, size=15, depth=3, seed=1)
+        self.assertEqual(report.mismatches, [])
+        self.assertEqual([v.name for v in report.timings], ["py_m", "py_bnf"])
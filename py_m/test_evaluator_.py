@@ -4,6 +4,7 @@ import lexer_
 import parser_
 import object_
 import evaluator_
+import evaluator_exc_
 import env_
 
 
@@ -67,6 +68,45 @@ class TestEvaluator(unittest.TestCase):
             evaluated = self.test_Eval(v[0])
             assert self.test_FloatObject(evaluated, v[1])
 
+    def test_EvalNumberTower(self):
+        tests = [
+            ("1.5 + 2.5", 4.0),
+            ("1 + 2.0", 3.0),
+            ("2.0 * 3", 6.0),
+            ("7 / 2", 3.5),
+            ("1.5 * (2 - 0.5) + -1", 1.25),
+        ]
+
+        for v in tests:
+            evaluated = self.test_Eval(v[0])
+            assert self.test_FloatObject(evaluated, v[1])
+
+        tests = [
+            ("6 / 2", 3),
+            ("-6 / 3", -2),
+            ("let a = 2; (a * a + 1) * (a - 3)", -5),
+        ]
+
+        for v in tests:
+            evaluated = self.test_Eval(v[0])
+            assert self.test_IntegerObject(evaluated, v[1])
+
+        tests = [
+            ("1.5 < 2", True),
+            ("2.5 > 2.5", False),
+            ("1.5 == 1.5", True),
+            ("2 == 2.0", True),
+            ("2.0 != 2", False),
+        ]
+
+        for v in tests:
+            evaluated = self.test_Eval(v[0])
+            assert self.test_BooleanObject(evaluated, v[1])
+
+        evaluated = self.test_Eval("1 / 0")
+        assert type(evaluated) is object_.Error
+        assert evaluated.message == "division by zero"
+
     def test_EvalBooleanExpression(self):
         tests = [
             ("true", True),
@@ -258,6 +298,51 @@ x
         assert type(evaluated) is object_.Error
         assert evaluated.message == "identifier not found: x"
 
+    def test_ClosureCapture(self):
+        # 使う外側の変数だけを写し、外側はトップレベルの環境につなぐ
+        input = """
+let big = [1, 2, 3];
+let outer = fn(x, unused) {
+    let tmp = x * 2;
+    fn(y) { x + y + len(big) };
+};
+outer(1, 2);
+"""
+        env = env_.NewEnvironment()
+        evaluated = evaluator_.Eval(parser_.Parser(lexer_.Lexer(input)).parse_program(), env)
+        assert type(evaluated) is object_.Function
+        assert list(evaluated.env.store) == ["x"]
+        assert evaluated.env.outer is env
+        assert evaluated.scope.free == ("big", "len", "x")
+
+        tests = [
+            # 作った後で let し直した変数は環境ごと持つ
+            ("let f = fn() { let x = 1; let g = fn() { x }; let x = 2; g() }; f()", 2),
+            # まだ束縛されていない変数 (再帰)
+            ("let f = fn() { let g = fn(n) { if (n < 1) { 0 } else { n + g(n - 1) } }; g(4) }; f()", 10),
+            ("let mk = fn(a) { fn(b) { fn(c) { a + b + c } } }; mk(1)(2)(3)", 6),
+            ("let g = fn() { later }; let later = 5; g()", 5),
+        ]
+        for input, expected in tests:
+            assert self.test_IntegerObject(self.test_Eval(input), expected)
+
+    def test_FramePool(self):
+        # 本体に関数リテラルのない関数の環境は使い回す
+        env_.frames.clear()
+        input = "let add = fn(x, y) { x + y }; add(1, 2); add(3, 4)"
+        assert self.test_IntegerObject(self.test_Eval(input), 7)
+        assert len(env_.frames) == 1
+        assert env_.frames[0].store == {}
+
+        # 関数を返す関数の環境は残し、返された関数の環境だけを戻す
+        env_.frames.clear()
+        input = "let newAdder = fn(x) { let y = x; fn(z) { x + y + z } }; newAdder(1)(2)"
+        for mod in (evaluator_, evaluator_exc_):
+            program = parser_.Parser(lexer_.Lexer(input)).parse_program()
+            evaluated = mod.Eval(program, env_.NewEnvironment())
+            assert self.test_IntegerObject(evaluated, 4)
+            assert len(env_.frames) == 1
+
     def test_StringLiteral(self):
         input = '"Hello World!"'
         evaluated = self.test_Eval(input)
@@ -287,6 +372,254 @@ x
                 assert type(evaluated) is object_.Error
                 assert evaluated.message == v[1]
 
+    def test_Quickening(self):
+        lex = lexer_.Lexer('let add = fn(x, y) { x + y }; add(1, 2); add(3, 4);')
+        p = parser_.Parser(lex)
+        program = p.parse_program()
+        env = env_.NewEnvironment()
+        evaluated = evaluator_.Eval(program, env)
+        assert self.test_IntegerObject(evaluated, 7)
+
+        node = program.statements[0].value.body.statements[0].expression
+        assert node.quick is evaluator_.IntAdd
+
+        # 型が変わると汎用の経路に戻り、新しい型で特殊化し直す
+        lex = lexer_.Lexer('add("a", "b")')
+        evaluated = evaluator_.Eval(parser_.Parser(lex).parse_program(), env)
+        assert type(evaluated) is object_.String
+        assert evaluated.value == "ab"
+        assert node.quick is evaluator_.StrConcat
+        assert node.misses == 1
+
+        lex = lexer_.Lexer('add(1, true)')
+        evaluated = evaluator_.Eval(parser_.Parser(lex).parse_program(), env)
+        assert type(evaluated) is object_.Error
+        assert evaluated.message == "type mismatch: INTEGER + BOOLEAN"
+        assert node.quick is None
+
+    def test_QuickeningLimit(self):
+        lex = lexer_.Lexer('let add = fn(x, y) { x + y };')
+        program = parser_.Parser(lex).parse_program()
+        env = env_.NewEnvironment()
+        evaluator_.Eval(program, env)
+        node = program.statements[0].value.body.statements[0].expression
+
+        for _ in range(evaluator_.QUICKEN_LIMIT + 1):
+            for call in ('add(1, 2)', 'add("a", "b")'):
+                lex = lexer_.Lexer(call)
+                evaluator_.Eval(parser_.Parser(lex).parse_program(), env)
+
+        assert node.quick is None
+        assert node.misses == evaluator_.QUICKEN_LIMIT
+
+    def test_ArrayLiterals(self):
+        input = "[1, 2 * 2, 3 + 3]"
+        evaluated = self.test_Eval(input)
+        assert type(evaluated) is object_.Array
+        assert len(evaluated.elements) == 3
+        assert self.test_IntegerObject(evaluated.elements[0], 1)
+        assert self.test_IntegerObject(evaluated.elements[1], 4)
+        assert self.test_IntegerObject(evaluated.elements[2], 6)
+
+    def test_ArrayElementWise(self):
+        tests = [
+            ("[1, 2, 3] + [4, 5, 6]", "[5, 7, 9]"),
+            ("[1, 2, 3] * 2", "[2, 4, 6]"),
+            ("2 - [1, 2.5]", "[1.0, -0.5]"),
+            ("[2, 4] / 2", "[1, 2]"),
+            ("[3, 4] / 2", "[1.5, 2.0]"),
+            ("[1, 2, 3] < 2", "[True, False, False]"),
+            ("[1, 2] == [1, 3]", "[True, False]"),
+        ]
+        for v in tests:
+            evaluated = self.test_Eval(v[0])
+            assert type(evaluated) is object_.Array
+            assert evaluated.Inspect() == v[1]
+
+        tests = [
+            ("[1, 2] + [1]", "array length mismatch: 2 != 1"),
+            ("[1, 2] / 0", "division by zero"),
+            ('[1, "a"] + 1', "unknown operator: ARRAY + INTEGER"),
+        ]
+        for v in tests:
+            evaluated = self.test_Eval(v[0])
+            assert type(evaluated) is object_.Error
+            assert evaluated.message == v[1]
+
+    def test_ArrayBuiltinFunctions(self):
+        tests = [
+            ("sum([1, 2, 3])", 6),
+            ("sum([])", 0),
+            ("min([3, 1, 2])", 1),
+            ("max([3, 1, 2])", 3),
+            ("dot([1, 2], [3, 4])", 11),
+            ("len([1, 2])", 2),
+            ("sum([1, 2] * [3, 4])", 11),
+            ("min([3, 1.5])", 1.5),
+            ("sum([1, 2.5])", 3.5),
+            ("max([])", "argument to `max` is empty"),
+            ("sum(1)", "argument to `sum` not supported, got INTEGER"),
+            ("dot([1, 2], [3])", "array length mismatch: 2 != 1"),
+        ]
+        for v in tests:
+            evaluated = self.test_Eval(v[0])
+
+            if type(v[1]) is int:
+                assert self.test_IntegerObject(evaluated, v[1])
+            elif type(v[1]) is float:
+                assert self.test_FloatObject(evaluated, v[1])
+            elif type(v[1]) is str:
+                assert type(evaluated) is object_.Error
+                assert evaluated.message == v[1]
+
+    def test_ArrayOverflow(self):
+        # NumPy の int64 では回り込む結果も、Python の int と同じになる
+        big = 2 ** 63 - 1
+        tests = [
+            (f"sum([{big}, 1])", str(big + 1)),
+            (f"[{2 ** 62}, 1] * [4, 1]", f"[{2 ** 64}, 1]"),
+            (f"[{big}, 1] + 1", f"[{big + 1}, 2]"),
+            (f"[{-big - 1}, 2] / -1", f"[{big + 1}, -2]"),
+            (f"dot([{2 ** 62}, 2], [4, 1])", str(2 ** 64 + 2)),
+            ("sum([1, 2] * [3, 4])", "11"),
+        ]
+        for v in tests:
+            evaluated = self.test_Eval(v[0])
+            assert evaluated.Inspect() == v[1]
+
+    def test_ArrayNull(self):
+        # 値のない式は配列の要素や組み込み関数の引数では null になる
+        tests = [
+            ("[if (true) {}]", "[null]"),
+            ("let f = fn() {}; [f(), 1]", "[null, 1]"),
+            ("let f = fn() {}; len([f()])", "1"),
+            ("let f = fn() {}; sum([1, f()])", "ERROR: argument to `sum` must be a numeric ARRAY"),
+            ("let f = fn() {}; [1, f()] + 1", "ERROR: unknown operator: ARRAY + INTEGER"),
+            ("let f = fn() {}; len(f())", "ERROR: argument to `len` not supported, got NULL"),
+            ("let f = fn() {}; max(f())", "ERROR: argument to `max` not supported, got NULL"),
+            ("map([1, 2], fn(x) { if (x > 1) { x } })", "[null, 2]"),
+        ]
+        for v in tests:
+            evaluated = self.test_Eval(v[0])
+            assert evaluated.Inspect() == v[1], v
+            evaluated = evaluator_exc_.Eval(
+                parser_.Parser(lexer_.Lexer(v[0])).parse_program(), env_.NewEnvironment())
+            assert evaluated.Inspect() == v[1], v
+
+    def test_HigherOrderBuiltinFunctions(self):
+        tests = [
+            ("map([1, 2, 3], fn(x) { x * 2 })", "[2, 4, 6]"),
+            ('map(["a", "bc"], len)', "[1, 2]"),
+            ("filter([1, 2, 3], fn(x) { x > 1 })", "[2, 3]"),
+            ("reduce([1, 2, 3], 10, fn(acc, x) { acc + x })", "16"),
+            ("sort([3, 1, 2])", "[1, 2, 3]"),
+            ('sort(["b", "c", "a"])', "[a, b, c]"),
+            ("sort([3, 1, 2], fn(x) { 0 - x })", "[3, 2, 1]"),
+            ('sort(["bb", "a", "ccc"], len)', "[a, bb, ccc]"),
+        ]
+        for v in tests:
+            evaluated = self.test_Eval(v[0])
+            assert evaluated.Inspect() == v[1]
+
+        tests = [
+            ("map([1], fn(x, y) { x })", "wrong number of arguments to callback. got=1, want=2"),
+            ("map([1], len)", "argument to `len` not supported, got INTEGER"),
+            ("map(1, len)", "argument to `map` must be ARRAY, got INTEGER"),
+            ('sort([1, "a"])', "sort keys must be all numbers or all strings"),
+        ]
+        for v in tests:
+            evaluated = self.test_Eval(v[0])
+            assert type(evaluated) is object_.Error
+            assert evaluated.message == v[1]
+
+    def test_SortKeyCalledOnce(self):
+        # キー関数は要素ごとに一度だけ呼ばれる
+        calls = []
+
+        def key(args):
+            calls.append(args[0].value)
+            return args[0]
+
+        env = env_.NewEnvironment()
+        env.Set("key", object_.Builtin(key))
+        lex = lexer_.Lexer("sort([5, 3, 4, 1, 2], key)")
+        evaluated = evaluator_.Eval(parser_.Parser(lex).parse_program(), env)
+        assert evaluated.Inspect() == "[1, 2, 3, 4, 5]"
+        assert calls == [5, 3, 4, 1, 2]
+
+
+class TestRaisingEvaluator(unittest.TestCase):
+
+    def eval_both(self, input):
+        results = []
+        for mod in (evaluator_, evaluator_exc_):
+            lex = lexer_.Lexer(input)
+            program = parser_.Parser(lex).parse_program()
+            results.append(mod.Eval(program, env_.NewEnvironment()))
+        return results
+
+    def test_SameResults(self):
+        tests = [
+            "5 + 5 * 2",
+            "-3.5 * 2",
+            "if (1 > 2) { 10 } else { 20 }",
+            "if (false) { 10 }",
+            "9; return 2 * 5; 9;",
+            "if (10 > 1) { if (10 > 1) { return 10; } return 1; }",
+            "let f = fn(x) { if (x > 1) { return x; } 0 }; f(5) + f(1)",
+            "let fib = fn(n) { if (n < 2) { return n; } fib(n - 1) + fib(n - 2) }; fib(10)",
+            "let newAdder = fn(x) { fn(y) { x + y } }; let addTwo = newAdder(2); addTwo(3)",
+            '"Hello" + " " + "World!"',
+            "map([1, 2, 3], fn(x) { x * 2 })",
+            "[1, 2] + [3, 4]",
+            "let x = 1;",
+            # 式の中の if で return すると、その if の値が ReturnValue になる
+            "let c = true; let v = if (c) { return 1; }; 2",
+            "let f = fn(c) { let v = if (c) { return 1; }; 2 }; f(true)",
+            "let f = fn(c) { if (c) { if (c) { return 1; } 3 } 2 }; f(true)",
+            "let f = fn(c) { if (c) { if (c) { return 1; } } }; f(true)",
+            "let f = fn(c) { len([if (c) { return 1; }]) }; f(true)",
+            "let f = fn(c) { 1 + if (c) { return 1; } }; f(true)",
+        ]
+        for v in tests:
+            expected, actual = self.eval_both(v)
+            assert type(expected) is type(actual), v
+            if expected is not None:
+                assert expected.Inspect() == actual.Inspect(), v
+
+    def test_Errors(self):
+        tests = [
+            "5 + true; 5;",
+            "-true",
+            "if (10 > 1) { if (10 > 1) { return true + false; } return 1; }",
+            "foobar",
+            "let f = fn(x) { x + y }; f(1); 5",
+            '1; len(1); 2',
+            "[1, foo]",
+            "1(2)",
+        ]
+        for v in tests:
+            expected, actual = self.eval_both(v)
+            assert type(actual) is object_.Error, v
+            assert expected.message == actual.message, v
+            assert expected.pos == actual.pos, v
+
+    def test_ErrorPositions(self):
+        # エラーを作った式の位置 (中置式は演算子、呼び出しは "(")
+        tests = [
+            ("5 + true;", "1:3"),
+            ("1;\n  -true", "2:3"),
+            ("let f = fn(x) {\n  x * y\n};\nf(1)", "2:7"),
+            ("let f = fn(x) {\n  1 + x\n};\nf(true)", "2:5"),
+            ("1;\nlen(1)", "2:4"),
+            ("[1, 2] + [3]", "1:8"),
+        ]
+        for input, expected in tests:
+            table = lexer_.LineTable(input)
+            for error in self.eval_both(input):
+                assert type(error) is object_.Error, input
+                assert table.describe(error.pos) == expected, input
+
 
 # python -m unittest test_evaluator_.TestEvaluator.test_StringConcatenation
 # python -m unittest test_evaluator_.TestEvaluator.test_TestBuiltinFunctions
@@ -0,0 +1,83 @@
+# python -m unittest test_events_.TestEvents.test_Call
+import io
+import unittest
+import lexer_
+import parser_
+import evaluator_
+import evaluator_exc_
+import env_
+import events_
+
+
+class TestEvents(unittest.TestCase):
+
+    def eval(self, mod, input):
+        program = parser_.Parser(lexer_.Lexer(input)).parse_program()
+        return mod.Eval(program, env_.NewEnvironment())
+
+    def test_Install(self):
+        originals = (evaluator_.applyFunction, evaluator_exc_.applyFunction,
+                     evaluator_.newError, evaluator_.Eval, evaluator_exc_.evalNode)
+
+        def callback(*args):
+            pass
+
+        events_.subscribe(events_.CALL, callback)
+        self.assertIsNot(evaluator_.applyFunction, originals[0])
+        self.assertIsNot(evaluator_exc_.applyFunction, originals[1])
+        # 購読していない種類は差し替えない
+        self.assertIs(evaluator_.newError, originals[2])
+        self.assertIs(evaluator_.Eval, originals[3])
+
+        events_.unsubscribe(events_.CALL, callback)
+        self.assertEqual(originals, (evaluator_.applyFunction, evaluator_exc_.applyFunction,
+                                     evaluator_.newError, evaluator_.Eval, evaluator_exc_.evalNode))
+
+        with self.assertRaises(ValueError):
+            events_.subscribe("line", callback)
+
+    def test_Call(self):
+        input = "let f = fn(x) { x + 1 }; f(1) + f(len([1, 2]))"
+        for mod in (evaluator_, evaluator_exc_):
+            calls, returns = [], []
+            events_.subscribe(events_.CALL, lambda fn, args: calls.append(fn.Type()))
+            events_.subscribe(events_.RETURN, lambda fn, result: returns.append(result.Inspect()))
+            try:
+                result = self.eval(mod, input)
+            finally:
+                events_._subscribers[events_.CALL] = ()
+                events_._subscribers[events_.RETURN] = ()
+                events_.sync()
+            self.assertEqual(result.value, 5)
+            self.assertEqual(calls, ["FUNCTION", "BUILTIN", "FUNCTION"])
+            self.assertEqual(returns, ["2", "2", "3"])
+
+    def test_Error(self):
+        errors = []
+        callback = events_.subscribe(events_.ERROR, lambda e: errors.append(e.message))
+        try:
+            self.eval(evaluator_, "1 + true")
+            self.eval(evaluator_exc_, "foo")
+        finally:
+            events_.unsubscribe(events_.ERROR, callback)
+        self.assertEqual(errors, ["type mismatch: INTEGER + BOOLEAN", "identifier not found: foo"])
+
+    def test_Node(self):
+        for mod in (evaluator_, evaluator_exc_):
+            nodes = []
+            callback = events_.subscribe(
+                events_.NODE, lambda node, env: nodes.append((type(node).__name__, node.string())))
+            try:
+                self.eval(mod, "let a = 2; a * 3")
+            finally:
+                events_.unsubscribe(events_.NODE, callback)
+            self.assertEqual(nodes.count(("InfixExpression", "(a * 3)")), 1)
+            self.assertIn(("IntegerLiteral", "2"), nodes)
+            self.assertIn(("Identifier", "a"), nodes)
+
+    def test_Tracer(self):
+        out = io.StringIO()
+        with events_.Tracer(out):
+            self.eval(evaluator_, "let f = fn(x) { if (x < 1) { 0 } else { f(x - 1) } }; f(1)")
+        self.assertEqual(out.getvalue(), "BEGIN fn(x) [1]\n\tBEGIN fn(x) [0]\n\tEND fn(x) 0\nEND fn(x) 0\n")
+        self.assertEqual(events_._installed, {})
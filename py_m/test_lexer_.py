@@ -164,6 +164,53 @@ if (5 < 10) {
             assert tok.literal == v[1],\
                 f"tokentype wrong. expected={tok.literal}, got={v[1]}"
 
+    def test_tokenize(self):
+        input = """let add = fn(x, y) { x + y; };
+add(5, 10.5) == 15.5 != !true;
+"foo bar" [1, 2] 5.2.36 @ "unterminated
+"""
+        # ASCII だけの入力と、そうでない入力の両方を確かめる
+        for v in (input, input + '"日本語"'):
+            buf = lexer_.tokenize(v)
+            lex = lexer_.Lexer(v)
+
+            for i in range(len(buf)):
+                tok = lex.next_token()
+                assert buf.kind(i) == tok.token_type
+                assert buf.literal(i) == tok.literal
+
+            assert tok.token_type == token_.TokenType.EOF
+            assert buf.kinds.itemsize == 1
+
+    def test_positions(self):
+        input = "let x = 5;\n  x + 10;\n"
+        table = lexer_.LineTable(input)
+        lex = lexer_.Lexer(input)
+        buf = lexer_.tokenize(input)
+        expected = [
+            (1, 1), (1, 5), (1, 7), (1, 9), (1, 10),
+            (2, 3), (2, 5), (2, 7), (2, 9), (3, 1),
+        ]
+        for i, v in enumerate(expected):
+            tok = lex.next_token()
+            assert table.position(tok.pos) == v
+            assert buf.token(i).pos == tok.pos
+
+        # 入力ごとに基点をずらす
+        sources = lexer_.SourceSet()
+        sources.add("a", "let a = 1;")
+        base = sources.add("b", "1;\nfoo")
+        buf = lexer_.tokenize("1;\nfoo", base)
+        assert buf.token(2).literal == "foo"
+        assert sources.describe(buf.token(2).pos) == "b:2:1"
+        assert sources.describe(0) == "a:1:1"
+
+        # 手放した先頭の入力は捨てる
+        sources.release(0)
+        assert sources.names == ["b"] and len(sources) == 2
+        assert sources.describe(0) == lexer_.SourceSet.RELEASED
+        assert sources.describe(buf.token(2).pos) == "b:2:1"
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,46 @@
+# python -m unittest test_memprof_.TestMemprof.test_Functions
+import unittest
+import tracemalloc
+import evaluator_exc_
+import events_
+import memprof_
+
+
+class TestMemprof(unittest.TestCase):
+
+    def test_Functions(self):
+        input = """let cons = fn(h, t) { fn(f) { f(h, t) } };
+let build = fn(n, acc) { if (n < 1) { acc } else { build(n - 1, cons(n, acc)) } };
+let keep = build(30, 0);
+let drop = fn(n) { let big = build(n, 0); len([1]) };
+drop(60);
+"""
+        result, profiler = memprof_.profile(input)
+        functions = {v.label: v for v in profiler.functions.values()}
+        self.assertEqual(sorted(functions), ["1:12 fn(h, t)", "2:13 fn(n, acc)", "4:12 fn(n)", "len"])
+
+        build = functions["2:13 fn(n, acc)"]
+        drop = functions["4:12 fn(n)"]
+        self.assertEqual(build.calls, 92)
+        self.assertEqual(drop.calls, 1)
+        # drop は build の分を含めて確保し、戻るときに (空きのフレームを除いて) 手放す
+        self.assertGreater(drop.peak, 60 * 100)
+        self.assertLess(drop.retained, drop.peak // 2)
+        # keep の分は残る
+        self.assertGreater(build.retained, 30 * 100)
+
+        self.assertEqual(profiler.allocated["Function"][0], 93)
+        self.assertEqual(profiler.retained["Function"][0], 33)
+        self.assertEqual(profiler.stack, [])
+        self.assertEqual(events_._installed, {})
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_Unwind(self):
+        # 例外で抜けた呼び出しは影のスタックから捨てる
+        result, profiler = memprof_.profile("let f = fn(x) { x + true }; f(1); f(2)", evaluator=evaluator_exc_)
+        self.assertEqual(result.Type(), "ERROR")
+        self.assertEqual(profiler.stack, [])
+        stats = list(profiler.functions.values())[0]
+        self.assertEqual(stats.calls, 1)
+        self.assertEqual(stats.active, 0)
+        self.assertIn("peak: ", profiler.report())
@@ -0,0 +1,68 @@
+# python -m unittest test_metrics_.TestMetrics.test_Counts
+import json
+import unittest
+import lexer_
+import parser_
+import object_
+import evaluator_
+import evaluator_exc_
+import env_
+import events_
+import metrics_
+
+
+class TestMetrics(unittest.TestCase):
+
+    def eval(self, mod, input):
+        program = parser_.Parser(lexer_.Lexer(input)).parse_program()
+        return mod.Eval(program, env_.NewEnvironment())
+
+    def test_Counts(self):
+        input = """
+        let add = fn(a) { fn(b) { a + b } };
+        let f = fn(x) { x * 2 };
+        f(add(1)(2)) + len([1, 2]) + len("abc")
+        """
+        for mod in (evaluator_, evaluator_exc_):
+            with metrics_.Metrics() as m:
+                result = self.eval(mod, input)
+            self.assertEqual(result.value, 11)
+            self.assertEqual(m.calls, 3)
+            self.assertEqual(m.builtin_calls, 2)
+            # 三つの呼び出しと、fn(b) が a を写した環境
+            self.assertEqual(m.environments, 4)
+            # トップレベル -> add の呼び出し -> fn(b) の呼び出し
+            self.assertEqual(m.max_depth, 3)
+            self.assertEqual(m.allocations["Function"], 3)
+            self.assertEqual(m.allocations["Array"], 1)
+            self.assertEqual(m.errors, 0)
+
+        with metrics_.Metrics() as m:
+            self.eval(evaluator_, "let f = fn(x) { x + true }; f(1)")
+            self.eval(evaluator_exc_, "foo")
+        self.assertEqual(m.errors, 2)
+        self.assertEqual(m.allocations["Error"], 2)
+
+    def test_Shared(self):
+        # 差し替えはプロセス全体に効くので、動いている Metrics はどれも同じものを数える
+        with metrics_.Metrics() as a, metrics_.Metrics(allocations=False) as b:
+            self.eval(evaluator_, "let f = fn() { 1 }; f()")
+        self.assertEqual(a.calls, 1)
+        self.assertEqual(b.calls, 1)
+        self.assertEqual(a.allocations["Function"], 1)
+        self.assertEqual(b.allocations, {})
+        self.assertEqual(events_._installed, {})
+
+    def test_Stop(self):
+        m = metrics_.Metrics().start()
+        self.eval(evaluator_, "let f = fn() { 1 }; f()")
+        m.stop()
+        self.eval(evaluator_, "let f = fn() { 1 }; f()")
+        self.assertEqual(m.calls, 1)
+        self.assertEqual(events_._installed, {})
+        self.assertNotIn("__init__", vars(object_.Null))
+
+        data = json.loads(m.to_json())
+        self.assertEqual(data["calls"], 1)
+        self.assertEqual(sorted(data), ["allocations", "builtin_calls", "calls",
+                                        "environments", "errors", "max_depth"])
@@ -1,8 +1,10 @@
 # python -m unittest test_parser_.TestParser.test_let_statements
+import io
 import unittest
 import ast_
 import lexer_
 import parser_
+import printer_
 
 
 class TestParser(unittest.TestCase):
@@ -633,6 +635,98 @@ return 838383;
         assert self.check_infix_expression(exp.elements[1], 2, "*", 2)
         assert self.check_infix_expression(exp.elements[2], 3, "+", 3)
 
+    def test_compact_parser(self):
+        tests = [
+            "let x = 5; return x * (2 + y);",
+            "-a * b + !c / d == 3 < 4 != true",
+            "if (x < y) { x } else { add(y, fn(a, b) { a + b; }) }",
+            'let s = "foo bar"; [1, 2.5, len(s)]',
+            "a + add(b * c) + d; f()",
+            "let = 5; + ;",
+            "fn(a, ) { }; if (x { 1 }; [1, 2; f(1, 2; (1 + 2; let x 5; 1.2.3",
+            "if (a) { b } else c; fn a; -(!(x)); return;",
+            parser_.bench_input(30),
+        ]
+
+        for v in tests:
+            expected = parser_.Parser(lexer_.Lexer(v))
+            expected_program = expected.parse_program()
+            actual = parser_.new_parser(v)
+            actual_program = actual.parse_program()
+
+            assert actual_program.string() == expected_program.string()
+            assert actual.errors == expected.errors
+            assert actual.error_positions == expected.error_positions
+
+    def test_deeply_nested_expressions(self):
+        # 再帰の上限を超える深さでも構文解析できる
+        depth = 5000
+
+        input = "(" * depth + "a + 1" + ")" * depth
+        obj = parser_.Parser(lexer_.Lexer(input))
+        program = obj.parse_program()
+        assert self.check_parser_errors(obj)
+        assert self.check_infix_expression(program.statements[0].expression, "a", "+", 1)
+
+        input = " + ".join(["1"] * depth)
+        obj = parser_.Parser(lexer_.Lexer(input))
+        program = obj.parse_program()
+        assert self.check_parser_errors(obj)
+        exp = program.statements[0].expression
+        count = 0
+        while type(exp) is ast_.InfixExpression:
+            assert self.check_integer_literal(exp.right, 1)
+            exp = exp.left
+            count += 1
+        assert count == depth - 1
+
+        input = "-" * depth + "(1)"
+        obj = parser_.Parser(lexer_.Lexer(input))
+        program = obj.parse_program()
+        assert self.check_parser_errors(obj)
+        exp = program.statements[0].expression
+        count = 0
+        while type(exp) is ast_.PrefixExpression:
+            exp = exp.right
+            count += 1
+        assert count == depth
+        assert self.check_integer_literal(exp, 1)
+
+    def test_located_errors(self):
+        input = "let x = 5;\nlet = 10;\nlet y 3;"
+        for obj in (parser_.Parser(lexer_.Lexer(input)),
+                    parser_.CompactParser(lexer_.tokenize(input))):
+            obj.parse_program()
+            errors = obj.located_errors()
+            assert len(errors) == len(obj.errors)
+            assert errors[0] == "2:5: " + obj.errors[0]
+            assert errors[-1] == "3:7: " + obj.errors[-1]
+
+    def test_printer(self):
+        input = "let f = fn(a, b) { if (a < b) { return [a, b]; } else { g(a, -b) } }; f(1, 2.5);"
+        expected = "let f = fn(a, b)if(a < b) return [a, b];else g(a, (-b));f(1, 2.5)"
+        obj = parser_.Parser(lexer_.Lexer(input))
+        program = obj.parse_program()
+        assert self.check_parser_errors(obj)
+        assert program.string() == expected
+
+        out = io.StringIO()
+        printer_.write(program, out)
+        assert out.getvalue() == expected
+
+        # memo に覚えた本体の文字列を使い回す
+        memo = {}
+        assert printer_.render(program, memo) == expected
+        fn = program.statements[0].value
+        assert memo[fn.body] == fn.body.string()
+        assert printer_.render(program, memo) == expected
+
+        # 再帰の上限を超える深さでも文字列にできる
+        depth = 5000
+        input = " + ".join(["1"] * depth)
+        program = parser_.Parser(lexer_.Lexer(input)).parse_program()
+        assert program.string() == "(" * (depth - 1) + "1" + " + 1)" * (depth - 1)
+
 
 # python -m unittest test_parser_.TestParser.test_TestParsingArrayLiterals
 if __name__ == '__main__':
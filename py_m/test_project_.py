@@ -0,0 +1,83 @@
+# python -m unittest test_project_.TestProject.test_run
+import os
+import tempfile
+import unittest
+import project_
+import object_
+
+
+class TestProject(unittest.TestCase):
+
+    files = {
+        "b.monkey": "let total = add(one, 2);",
+        "a/one.monkey": "let one = 1;",
+        "a/add.monkey": "let add = fn(x, y) { x + y };",
+        "c.monkey": "total * 10",
+        "notes.txt": "not monkey",
+    }
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        for name, input in self.files.items():
+            path = os.path.join(self.dir.name, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(input)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_load(self):
+        with project_.Project(self.dir.name, workers=2) as project:
+            sources = project.load()
+        names = [v.name for v in sources]
+        assert names == [os.path.join("a", "add.monkey"), os.path.join("a", "one.monkey"),
+                         "b.monkey", "c.monkey"]
+        assert project.errors() == []
+
+    def test_run(self):
+        with project_.Project(self.dir.name, workers=2) as project:
+            project.load()
+            name, result = project.run()
+        assert name == "c.monkey"
+        assert result.Inspect() == "30"
+
+    def test_errors(self):
+        with open(os.path.join(self.dir.name, "b.monkey"), "w", encoding="utf-8") as f:
+            f.write("let = 5;")
+        with project_.Project(self.dir.name, workers=2) as project:
+            project.load()
+            errors = project.errors()
+            name, result = project.run()
+        assert len(errors) > 0
+        assert all(v[0] == "b.monkey" for v in errors)
+        assert errors[0][1].startswith("1:5: ")
+        assert name == "b.monkey"
+        assert type(result) is object_.Error
+
+    def test_runtime_error(self):
+        # a/add.monkey で定義した関数の中のエラーを c.monkey から呼ぶ
+        with open(os.path.join(self.dir.name, "c.monkey"), "w", encoding="utf-8") as f:
+            f.write("add(true, 1)")
+        with project_.Project(self.dir.name, workers=2) as project:
+            project.load()
+            name, result = project.run()
+        assert name == "c.monkey"
+        assert type(result) is object_.Error
+        expected = os.path.join("a", "add.monkey") + ":1:24: ERROR: type mismatch: BOOLEAN + INTEGER"
+        assert project.describe(result) == expected
+
+    def test_resident(self):
+        with project_.Project(self.dir.name, workers=1, resident=True) as project:
+            project.load()
+            assert project.executor is not None
+            with open(os.path.join(self.dir.name, "c.monkey"), "w", encoding="utf-8") as f:
+                f.write("total * 100")
+            project.load()
+            name, result = project.run()
+        assert project.executor is None
+        assert result.Inspect() == "300"
+
+
+if __name__ == '__main__':
+    unittest.main()
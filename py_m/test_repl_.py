@@ -0,0 +1,82 @@
+# python -m unittest test_repl_.TestRepl.test_commands
+import json
+import unittest
+import repl_
+import env_
+import metrics_
+import tier_
+
+
+class TestRepl(unittest.TestCase):
+
+    def test_execute(self):
+        session = repl_.Session()
+        assert session.execute("let a = 2;") is None
+        assert session.execute("a * 3") == "6"
+        assert session.execute("a + true") == "[3]:1:3: ERROR: type mismatch: INTEGER + BOOLEAN"
+        assert session.execute("let = 1").startswith("Woops!")
+
+    def test_history(self):
+        session = repl_.Session(history=1)
+        session.execute("let f = fn(x) { x + y };")
+        session.execute("1")
+        # 手放した入力は名前も捨てる
+        assert session.execute("f(1)") == "?: ERROR: identifier not found: y"
+        assert len(session.kept) == 1
+        assert session.sources.names == ["[3]"]
+        assert session.execute("g").startswith("[4]:1:1: ")
+
+    def test_retention(self):
+        # 再定義を繰り返しても、前の値と環境、コンパイル結果が残らない
+        tier_.enable()
+        self.addCleanup(tier_.disable)
+        session = repl_.Session(history=5)
+        session.execute("let mk = fn(prev) { let y = 1; let y = y + 1; fn() { y } };")
+        session.execute("let g = 0;")
+
+        def redefine(n):
+            for i in range(n):
+                # 引数の名前を変えて、毎回違うソースにコンパイルさせる
+                name = "n" + "".join(chr(97 + int(c)) for c in str(i))
+                session.execute("let g = mk(g);")
+                session.execute(f"let h = fn({name}) {{ if ({name} < 1) {{ 0 }} else {{ h({name} - 1) }} }}; h(30);")
+            counts = repl_.live_objects()
+            # 空きのフレームは数が限られているので除く
+            counts["Environment"] -= len(env_.frames)
+            return counts, len(tier_.codes)
+
+        before = redefine(20)
+        assert redefine(200) == before
+        assert session.execute("g()") == "2"
+        assert session.execute("h(3)") == "0"
+
+    def test_commands(self):
+        session = repl_.Session()
+        session.execute("let a = fn(x) { x };")
+        session.execute("let b = 1;")
+        assert session.execute(":unset a") is None
+        assert session.execute("a").endswith("identifier not found: a")
+        assert session.execute(":unset a") == "not bound: a"
+
+        report = session.execute(":mem").split("\n")
+        assert "bindings: 1" in report
+        counts = repl_.live_objects()
+        assert counts["Integer"] >= 1
+
+        assert session.execute(":clear") is None
+        assert session.env.store == {}
+        assert session.execute("b").endswith("identifier not found: b")
+
+    def test_metrics(self):
+        session = repl_.Session()
+        assert session.execute(":metrics") == "metrics are off"
+
+        with metrics_.Metrics() as m:
+            session = repl_.Session(metrics=m)
+            session.execute("let f = fn(x) { x };")
+            session.execute("f(1)")
+            assert json.loads(session.execute(":metrics"))["calls"] == 1
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+# python -m unittest test_tier_.TestTier.test_SameResults
+import unittest
+import warnings
+import lexer_
+import parser_
+import object_
+import evaluator_
+import evaluator_exc_
+import env_
+import tier_
+
+
+class TestTier(unittest.TestCase):
+
+    def setUp(self):
+        tier_.enable()
+
+    def tearDown(self):
+        tier_.disable()
+
+    def eval_all(self, input):
+        # 木をたどる評価器と、段階的なコンパイルを有効にした二つの評価器
+        results = []
+        for tiered in (False, True):
+            if not tiered:
+                tier_.disable()
+            else:
+                tier_.enable()
+            for mod in (evaluator_, evaluator_exc_):
+                program = parser_.Parser(lexer_.Lexer(input)).parse_program()
+                results.append(mod.Eval(program, env_.NewEnvironment()))
+        return results
+
+    def test_SameResults(self):
+        loop = "let loop = fn(i, a) { if (i < 1) { a } else { loop(i - 1, a + f(i)) } }; "
+        tests = [
+            "let fib = fn(n) { if (n < 2) { return n; } fib(n - 1) + fib(n - 2) }; fib(15)",
+            "let f = fn(x) { let y = x * 2; if (y > 20) { y / 3 } else { -x + 0.5 } }; " + loop + "loop(40, 0)",
+            "let f = fn(x) { [x, x == 3, !(x > 2)] }; " + loop + "loop(30, [])",
+            '"ab"; let f = fn(x) { "a" + "b" }; ' + loop + 'len(loop(30, ""))',
+            # let より前の変数は外側を引く
+            "let x = 7; let f = fn(i) { let r = x + i; let x = 1; r + x }; " + loop + "loop(40, 0)",
+            "let f = fn(i) { if (i > 5) { let y = i; } y }; let y = 100; " + loop + "loop(30, 0)",
+            # 本体に関数リテラルがある関数はコンパイルしない
+            "let f = fn(x) { reduce(map([1, 2], fn(v) { v * x }), 0, fn(a, b) { a + b }) }; " + loop + "loop(30, 0)",
+            # リテラルの条件と単項の -
+            "let f = fn(x) { if (1) { x } else { -2 + x } }; " + loop + "loop(30, 0)",
+            "let f = fn(x) { if (true) { -1 * x } else { 2 } }; " + loop + "loop(30, 0)",
+            # 式の中の if で return すると、その if の値が ReturnValue になる
+            "let f = fn(x) { let v = if (x > 0) { return 100; }; 2 }; " + loop + "loop(30, 0)",
+            "let f = fn(x) { if (x > 3) { if (x > 5) { return 7; } x } else { 1 } }; " + loop + "loop(30, 0)",
+            "let f = fn(x) { if (x > 5) { return 7; } x }; " + loop + "loop(30, 0)",
+            # 値のない引数は束縛されていないものとして外側を引く
+            "let y = 4; let none = fn() { }; let h = fn(y) { y }; "
+            "let f = fn(x) { h(none()) + h(x) }; " + loop + "loop(30, 0)",
+            "let none = fn() { }; let h = fn(y) { y }; "
+            "let f = fn(x) { h(if (x < 0) { 1 }) }; " + loop + "loop(30, 0)",
+        ]
+        for v in tests:
+            results = self.eval_all(v)
+            expected = results[0].Inspect()
+            for actual in results[1:]:
+                assert actual.Inspect() == expected, v
+
+    def test_Errors(self):
+        tests = [
+            "let f = fn(i) { if (i > 30) { i + true } else { f(i + 1) } }; f(0)",
+            "let f = fn(i) { if (i > 25) { 1 / 0 } else { f(i + 1) } }; f(0)",
+            "let f = fn(i) { if (i > 25) { i + nothing } else { f(i + 1) } }; f(0)",
+            "let f = fn(i) { if (i > 25) { -true } else { f(i + 1) } }; f(0)",
+        ]
+        for v in tests:
+            results = self.eval_all(v)
+            for actual in results:
+                assert type(actual) is object_.Error, v
+                assert actual.message == results[0].message, v
+                assert actual.pos == results[0].pos, v
+
+    def test_LiteralCondition(self):
+        # 生成したソースにリテラルの is があると SyntaxWarning になる
+        input = "let f = fn(a) { if (1) { a } else { -2 } }; f"
+        fn = evaluator_.Eval(parser_.Parser(lexer_.Lexer(input)).parse_program(), env_.NewEnvironment())
+        tier_.codes.clear()
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            assert tier_.compileFunction(fn)
+        assert " 1 is " not in fn.scope.source
+
+    def test_Compile(self):
+        input = "let add = fn(a, b) { a + b }; let nest = fn(x) { fn() { x } }; add; nest"
+        env = env_.NewEnvironment()
+        evaluator_.Eval(parser_.Parser(lexer_.Lexer(input)).parse_program(), env)
+        add = env.Get("add")
+        nest = env.Get("nest")
+        args = [object_.Integer(1), object_.Integer(2)]
+        for i in range(tier_.TIER_THRESHOLD + 1):
+            evaluator_.applyFunction(add, args)
+            evaluator_.applyFunction(nest, args[:1])
+
+        assert add.compiled
+        assert "def compiled(env, v_a, v_b):" in add.scope.source
+        assert evaluator_.applyFunction(add, args).value == 3
+        assert nest.compiled is False
+
+
+if __name__ == '__main__':
+    unittest.main()
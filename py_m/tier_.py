@@ -0,0 +1,406 @@
+import ast_
+import object_
+import evaluator_
+import evaluator_exc_
+
+
+# 段階的なコンパイル
+# enable() で evaluator_ と evaluator_exc_ の applyFunction を差し替え、
+# object_.Function ごとに呼び出しを数える。TIER_THRESHOLD 回を超えた関数は
+# 本体を Python のソースに直して compile() し、以後はそれを直接呼ぶ。
+#
+# 変数は Python のローカル変数に置き、数値は中置式と同じく包まない
+# int / float のまま持つ。整数同士の演算はその場で計算し、それ以外は
+# evaluator_ の関数を呼ぶので、結果とエラーは木をたどる評価器と同じになる。
+# 本体に関数リテラルがある関数 (呼び出しの環境を捕まえうる) と、
+# 解析できないノードを含む関数はコンパイルせず、木をたどる評価器で動かす。
+
+TIER_THRESHOLD = 20
+
+# 生成するコードから参照する名前
+NAMESPACE = {
+    "_Integer": object_.Integer,
+    "_Float": object_.Float,
+    "_String": object_.String,
+    "_Array": object_.Array,
+    "_Error": object_.Error,
+    "_Function": object_.Function,
+    "_TRUE": evaluator_.TRUE,
+    "_FALSE": evaluator_.FALSE,
+    "_NULL": evaluator_.NULL,
+    "_nullify": evaluator_.nullify,
+    "_box": evaluator_.box,
+    "_infix": evaluator_.evalInfixValues,
+    "_prefix": evaluator_.evalPrefixExpression,
+    "_ident": evaluator_.evalIdentifier,
+    "_locate": evaluator_.locate,
+    "_ev": evaluator_,
+}
+
+# 整数同士ならその場で計算する演算子
+INT_OPERATORS = {"+", "-", "*"}
+INT_COMPARISONS = {"<", ">", "==", "!="}
+
+# enable() の前の applyFunction
+_original = {}
+
+# 生成したソースとそれをコンパイルしたコード (cache_ がファイルに残す)
+codes = {}
+
+
+class Unsupported(Exception):
+    """コンパイルできない構文"""
+
+
+class Compiler:
+    """関数リテラルの本体を Python のソースに直す"""
+
+    def __init__(self, fn):
+        self.fn = fn
+        self.lines = []
+        self.depth = 1
+        self.temps = 0
+        self.consts = {}
+        self.params = [v.value for v in fn.parameters]
+        self.locals = set(fn.scope.names)
+        # 必ず束縛済みの変数 (ここにない let の変数は None なら外側を引く)。
+        # 引数は None でないときだけコンパイルした関数を呼ぶので束縛済みとする
+        self.assigned = set(self.params)
+        # ここでの return が関数から戻るか。値として使う if の中では、木をたどる
+        # 評価器は return をその if の値 (ReturnValue) にするので、コンパイルしない
+        self.returns = True
+        # 文として評価する (値を使わない、またはブロックの値になる) 式
+        self.statement_expression = None
+
+    def emit(self, line):
+        self.lines.append("    " * self.depth + line)
+
+    def temp(self):
+        self.temps += 1
+        return f"_t{self.temps}"
+
+    def const(self, value):
+        name = f"_c{len(self.consts)}"
+        self.consts[name] = value
+        return name
+
+    def source(self):
+        if len(set(self.params)) != len(self.params):
+            raise Unsupported("duplicate parameters")
+
+        params = ", ".join("v_" + v for v in self.params)
+        self.emit_unbox_params()
+        for v in sorted(self.locals - self.assigned):
+            self.emit(f"v_{v} = None")
+        result = self.block(self.fn.body)
+        self.emit(f"return {result}")
+        return "\n".join([f"def compiled(env, {params}):"] + self.lines)
+
+    def emit_unbox_params(self):
+        for v in self.params:
+            self.emit(f"if type(v_{v}) is _Integer or type(v_{v}) is _Float:")
+            self.emit(f"    v_{v} = v_{v}.value")
+
+    def emit_unbox(self, t):
+        self.emit(f"if type({t}) is _Integer or type({t}) is _Float:")
+        self.emit(f"    {t} = {t}.value")
+
+    def emit_check(self, t, node=None):
+        self.emit(f"if type({t}) is _Error:")
+        if node is None:
+            self.emit(f"    return {t}")
+        else:
+            self.emit(f"    return _locate({t}, {self.const(node)})")
+
+    # 文
+
+    def block(self, block):
+        """ブロックの文を出力し、ブロックの値 (包んだ値か None) の式を返す"""
+        if block is None:
+            raise Unsupported("missing block")
+        statements = block.statements
+        for v in statements[:-1]:
+            self.statement(v)
+        if len(statements) == 0:
+            return "None"
+
+        last = statements[-1]
+        if type(last) is ast_.ExpressionStatement:
+            self.statement_expression = last.expression
+            return self.expression(last.expression, boxed=True)
+        self.statement(last)
+        return "None"
+
+    def statement(self, node):
+        t = type(node)
+        if t is ast_.LetStatement:
+            value = self.expression(node.value)
+            self.emit(f"v_{node.name.value} = {value}")
+            # if 式と呼び出しは None (値なし) になりうる。None の変数は外側を引く
+            if type(node.value) not in (ast_.IfExpression, ast_.CallExpression):
+                self.assigned.add(node.name.value)
+        elif t is ast_.ReturnStatement:
+            if not self.returns:
+                raise Unsupported("return in an expression")
+            self.emit(f"return {self.expression(node.return_value, boxed=True)}")
+        elif t is ast_.ExpressionStatement:
+            self.statement_expression = node.expression
+            self.expression(node.expression)
+        else:
+            raise Unsupported(str(node))
+
+    # 式
+    # boxed=False なら数値は int / float のまま、True なら object_ に包んだ値を返す
+
+    def expression(self, node, boxed=False):
+        t = type(node)
+        if t is ast_.IntegerLiteral:
+            if boxed:
+                return self.const(object_.Integer(node.value))
+            return repr(node.value)
+        elif t is ast_.FloatLiteral:
+            if boxed:
+                return self.const(object_.Float(node.value))
+            return self.const(node.value)
+        elif t is ast_.Boolean:
+            return "_TRUE" if node.value else "_FALSE"
+        elif t is ast_.StringLiteral:
+            # 文字列の == は同じオブジェクトかで比べるので、評価のたびに作る
+            result = self.temp()
+            self.emit(f"{result} = _String({self.const(node.value)})")
+            return result
+        elif t is ast_.Identifier:
+            return self.identifier(node, boxed)
+        elif t is ast_.PrefixExpression:
+            result = self.prefix(node)
+        elif t is ast_.InfixExpression:
+            result = self.infix(node)
+        elif t is ast_.IfExpression:
+            return self.if_expression(node, boxed)
+        elif t is ast_.CallExpression:
+            return self.call(node, boxed)
+        elif t is ast_.ArrayLiteral:
+            elements = [self.operand_temp(v, boxed=True) for v in node.elements]
+            result = self.temp()
+            self.emit(f"{result} = _Array(_nullify([{', '.join(elements)}]))")
+            return result
+        else:
+            raise Unsupported(str(node))
+
+        if boxed:
+            return f"_box({result})"
+        return result
+
+    def operand_temp(self, node, boxed=False):
+        # 後に続く式で変数が let し直されても値が変わらないよう一時変数に移す
+        result = self.expression(node, boxed)
+        if result.startswith("v_") or result.startswith("_box(v_"):
+            t = self.temp()
+            self.emit(f"{t} = {result}")
+            return t
+        return result
+
+    def identifier(self, node, boxed):
+        name = node.value
+        if name in self.locals and name in self.assigned:
+            result = f"v_{name}"
+            if boxed:
+                return f"_box({result})"
+            return result
+
+        result = self.temp()
+        if name in self.locals:
+            # let より前に使うと外側の変数を引く
+            self.emit(f"{result} = v_{name}")
+            self.emit(f"if {result} is None:")
+            self.depth += 1
+        self.emit(f"{result} = _ident({self.const(node)}, env)")
+        self.emit_check(result)
+        if not boxed:
+            self.emit_unbox(result)
+        if name in self.locals:
+            self.depth -= 1
+            if boxed:
+                return f"_box({result})"
+        return result
+
+    def prefix(self, node):
+        right = self.expression(node.right)
+        result = self.temp()
+        if node.operator == "-" and type(node.right) is ast_.IntegerLiteral:
+            self.emit(f"{result} = -{right}")
+        elif node.operator == "-":
+            self.emit(f"if type({right}) is int or type({right}) is float:")
+            self.emit(f"    {result} = -{right}")
+            self.emit("else:")
+            self.depth += 1
+            self.emit(f"{result} = _prefix('-', {right})")
+            self.emit_check(result, node)
+            self.depth -= 1
+        else:
+            self.emit(f"{result} = _prefix({node.operator!r}, _box({right}))")
+            self.emit_check(result, node)
+        return result
+
+    def infix(self, node):
+        left = self.operand_temp(node.left)
+        right = self.expression(node.right)
+        operator = node.operator
+        result = self.temp()
+
+        checks = []
+        for v, child in ((left, node.left), (right, node.right)):
+            if type(child) is not ast_.IntegerLiteral:
+                checks.append(f"type({v}) is int")
+        if operator in INT_OPERATORS:
+            fast = f"{result} = {left} {operator} {right}"
+        elif operator in INT_COMPARISONS:
+            fast = f"{result} = _TRUE if {left} {operator} {right} else _FALSE"
+        else:
+            fast = None
+
+        if fast is not None and len(checks) == 0:
+            self.emit(fast)
+            return result
+        if fast is not None:
+            self.emit(f"if {' and '.join(checks)}:")
+            self.emit(f"    {fast}")
+            self.emit("else:")
+            self.depth += 1
+        self.emit(f"{result} = _infix({operator!r}, {left}, {right})")
+        self.emit_check(result, node)
+        if fast is not None:
+            self.depth -= 1
+        return result
+
+    def if_expression(self, node, boxed):
+        statement = node is self.statement_expression
+        condition = self.expression(node.condition)
+        if type(node.condition) is ast_.IntegerLiteral:
+            # リテラルを is で比べると SyntaxWarning になるので一時変数に移す
+            t = self.temp()
+            self.emit(f"{t} = {condition}")
+            condition = t
+        result = self.temp()
+        assigned = self.assigned
+        returns = self.returns
+        self.returns = returns and statement
+
+        self.emit(f"if {condition} is _TRUE:")
+        self.depth += 1
+        self.assigned = set(assigned)
+        self.emit(f"{result} = {self.block(node.consequence)}")
+        self.depth -= 1
+        self.emit("else:")
+        self.depth += 1
+        if node.alternative is not None:
+            self.assigned = set(assigned)
+            self.emit(f"{result} = {self.block(node.alternative)}")
+        else:
+            self.emit(f"{result} = _NULL")
+        self.depth -= 1
+
+        # 片方の枝でしか束縛しない変数はまだ束縛されていないものとして扱う
+        self.assigned = assigned
+        self.returns = returns
+        if not boxed:
+            self.emit_unbox(result)
+        return result
+
+    def call(self, node, boxed):
+        function = self.operand_temp(node.function, boxed=True)
+        args = [self.operand_temp(v, boxed=True) for v in node.arguments]
+        result = self.temp()
+        # 値のない (None の) 引数は木をたどる評価器に任せる (tiered を参照)
+        checks = [f" and {a} is not None" for a, v in zip(args, node.arguments)
+                  if type(v) is ast_.CallExpression or type(v) is ast_.IfExpression]
+        self.emit(f"if type({function}) is _Function and {function}.compiled "
+                  f"and len({function}.parameters) == {len(args)}{''.join(checks)}:")
+        self.emit(f"    {result} = {function}.compiled({', '.join([function + '.env'] + args)})")
+        self.emit("else:")
+        self.emit(f"    {result} = _ev.applyFunction({function}, [{', '.join(args)}])")
+        self.emit_check(result, node)
+        if not boxed:
+            self.emit_unbox(result)
+        return result
+
+
+def compileFunction(fn):
+    """fn の本体をコンパイルした関数を返す。コンパイルできなければ False
+
+    結果は関数リテラルの Scope に覚え、同じリテラルから作った関数で使い回す。
+    """
+    scope = fn.scope
+    if scope is None:
+        fn.compiled = False
+        return False
+
+    if scope.compiled is None:
+        scope.compiled = False
+        if not scope.escapes:
+            try:
+                compiler = Compiler(fn)
+                source = compiler.source()
+            except Unsupported:
+                source = None
+            if source is not None:
+                code = codes.get(source)
+                if code is None:
+                    code = compile(source, "<monkey>", "exec")
+                    codes[source] = code
+                namespace = dict(NAMESPACE)
+                namespace.update(compiler.consts)
+                exec(code, namespace)
+                scope.compiled = namespace["compiled"]
+                scope.source = source
+
+    fn.compiled = scope.compiled
+    return fn.compiled
+
+
+def retain(sources):
+    """codes から sources にないソースのコードを捨てる
+
+    codes は同じソースのコンパイルを省くためのもので、捨てても
+    コンパイルした関数 (Scope.compiled) はそのまま使える。
+    """
+    for source in [k for k in codes if k not in sources]:
+        del codes[source]
+
+
+def tiered(fallback, check=None):
+    """呼び出しを数え、コンパイルした関数を呼ぶ applyFunction を作る"""
+
+    def applyFunction(fn, args):
+        if type(fn) is object_.Function:
+            compiled = fn.compiled
+            if compiled is None:
+                fn.calls += 1
+                if fn.calls > TIER_THRESHOLD:
+                    compiled = compileFunction(fn)
+            # None の引数は束縛されていないものとして外側を引くので、コンパイルした
+            # 関数では扱わない
+            if compiled and len(args) == len(fn.parameters) and None not in args:
+                result = compiled(fn.env, *args)
+                if check is not None:
+                    return check(result)
+                return result
+        return fallback(fn, args)
+
+    return applyFunction
+
+
+def enable():
+    """evaluator_ と evaluator_exc_ を段階的なコンパイルに切り替える"""
+    if _original:
+        return
+    _original[evaluator_] = evaluator_.applyFunction
+    _original[evaluator_exc_] = evaluator_exc_.applyFunction
+    evaluator_.applyFunction = tiered(evaluator_.applyFunction)
+    evaluator_exc_.applyFunction = tiered(evaluator_exc_.applyFunction, evaluator_exc_.check)
+
+
+def disable():
+    for mod, fn in _original.items():
+        mod.applyFunction = fn
+    _original.clear()
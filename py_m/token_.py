@@ -1,3 +1,4 @@
+from array import array
 from enum import Enum, auto
 
 
@@ -51,9 +52,11 @@ class Token:
         "return": TokenType.RETURN,
     }
 
-    def __init__(self, token_type=None, literal=""):
+    def __init__(self, token_type=None, literal="", pos=-1):
         self.token_type = token_type
         self.literal = literal
+        # 入力の先頭からの位置 (文字数) に入力の基点を足したもの。不明なら -1
+        self.pos = pos
 
     @staticmethod
     def lookup_ident(ident):
@@ -65,3 +68,42 @@ class Token:
 
     def __str__(self):
         return "Token()"
+
+
+# 種類の番号から TokenType を引く表
+TYPES = [None] * (max(t.value for t in TokenType) + 1)
+for t in TokenType:
+    TYPES[t.value] = t
+
+
+class TokenBuffer:
+    """字句の並び
+
+    Token を作らずに、種類の番号と入力中の範囲を別々の配列に持つ。
+    字句の文字列は必要になったときに入力から切り出す。
+    """
+
+    def __init__(self, input, base=0):
+        self.input = input
+        # Token の位置に足す値 (lexer_.SourceSet を参照)
+        self.base = base
+        self.kinds = array("B")
+        # 入力中の位置。4GB までの入力を扱える
+        self.starts = array("I")
+        self.ends = array("I")
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def kind(self, i):
+        return TYPES[self.kinds[i]]
+
+    def literal(self, i):
+        return self.input[self.starts[i]:self.ends[i]]
+
+    def token(self, i):
+        start = self.starts[i]
+        return Token(TYPES[self.kinds[i]], self.input[start:self.ends[i]], self.base + start)
+
+    def __str__(self):
+        return "TokenBuffer()"
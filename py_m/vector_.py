@@ -0,0 +1,258 @@
+import object_
+import evaluator_
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# 要素ごとの演算
+# 整数と実数だけの配列は中身を NumPy 配列 (NumPy がなければ int / float の
+# リスト) にまとめて持ち、配列同士や配列とスカラーの演算を一度に行う。
+# 実数を含む配列は全体を実数として扱う。
+
+# NumPy の int64 に収まらない整数を含む配列は Python のリストのまま扱う。
+# int64 の演算は結果があふれると黙って回り込むので、整数同士の演算は
+# オペランドの絶対値の最大から結果の大きさを見積もり、収まらなければ
+# Python の int のリストで計算する。
+INT64_MIN = -(2 ** 63)
+INT64_MAX = 2 ** 63 - 1
+
+
+def numbers(arr):
+    """数値だけの配列なら中身を返す。数値以外を含むなら None"""
+    values = arr.numbers
+    if values is None:
+        values = toNumbers(arr.elements)
+        arr.numbers = values
+    if values is False:
+        return None
+    return values
+
+
+def toNumbers(elements):
+    values = []
+    has_float = False
+    for v in elements:
+        t = type(v)
+        if t is object_.Integer:
+            values.append(v.value)
+        elif t is object_.Float:
+            values.append(v.value)
+            has_float = True
+        else:
+            return False
+
+    if has_float:
+        values = [float(v) for v in values]
+
+    if np is not None:
+        if has_float:
+            return np.array(values, dtype=np.float64)
+        if all(INT64_MIN <= v <= INT64_MAX for v in values):
+            return np.array(values, dtype=np.int64)
+
+    return values
+
+
+def operand(obj):
+    t = type(obj)
+    if t is object_.Array:
+        return numbers(obj)
+    elif t is object_.Integer or t is object_.Float:
+        return obj.value
+    return None
+
+
+def isSequence(v):
+    return type(v) is list or (np is not None and type(v) is np.ndarray)
+
+
+def fitsNumpy(v):
+    if type(v) is list:
+        return False
+    elif type(v) is int:
+        return INT64_MIN <= v <= INT64_MAX
+    return True
+
+
+def isIntegers(v):
+    if type(v) is list:
+        return len(v) == 0 or type(v[0]) is int
+    elif np is not None and type(v) is np.ndarray:
+        return v.dtype.kind == "i"
+    return type(v) is int
+
+
+def magnitude(v):
+    """整数か整数の配列の絶対値の最大"""
+    if type(v) is int:
+        return abs(v)
+    if len(v) == 0:
+        return 0
+    return max(abs(int(v.max())), abs(int(v.min())))
+
+
+def overflows(operator, a, b):
+    """NumPy の int64 で計算すると結果があふれうるなら True"""
+    if not (isIntegers(a) and isIntegers(b)):
+        return False
+    if operator == "+" or operator == "-":
+        bound = magnitude(a) + magnitude(b)
+    elif operator == "*":
+        bound = magnitude(a) * magnitude(b)
+    elif operator == "/":
+        # INT64_MIN // -1 があふれる
+        bound = magnitude(a)
+    else:
+        return False
+    return bound > INT64_MAX
+
+
+def booleans(values):
+    TRUE = evaluator_.TRUE
+    FALSE = evaluator_.FALSE
+    return object_.Array([TRUE if v else FALSE for v in values])
+
+
+def evalArrayInfixExpression(operator, left, right):
+    a = operand(left)
+    b = operand(right)
+    if a is None or b is None:
+        return evaluator_.newError("unknown operator: ", left.Type(), operator, right.Type())
+
+    if isSequence(a) and isSequence(b) and len(a) != len(b):
+        return evaluator_.newError(f"array length mismatch: {len(a)} != {len(b)}")
+
+    if np is not None and fitsNumpy(a) and fitsNumpy(b) and not overflows(operator, a, b):
+        return evalNumpyInfixExpression(operator, a, b)
+
+    if np is not None:
+        # 片方が Python のリストなら NumPy 配列もリストに戻す
+        if type(a) is np.ndarray:
+            a = a.tolist()
+        if type(b) is np.ndarray:
+            b = b.tolist()
+    return evalListInfixExpression(operator, a, b)
+
+
+def evalNumpyInfixExpression(operator, a, b):
+    if operator == "+":
+        return object_.Array(numbers=a + b)
+    elif operator == "-":
+        return object_.Array(numbers=a - b)
+    elif operator == "*":
+        return object_.Array(numbers=a * b)
+    elif operator == "/":
+        if np.any(np.asarray(b) == 0):
+            return evaluator_.newError("division by zero")
+        if isIntegers(a) and isIntegers(b) and not np.any(a % b):
+            return object_.Array(numbers=a // b)
+        return object_.Array(numbers=np.true_divide(a, b))
+    elif operator == "<":
+        return booleans(a < b)
+    elif operator == ">":
+        return booleans(a > b)
+    elif operator == "==":
+        return booleans(a == b)
+    elif operator == "!=":
+        return booleans(a != b)
+    else:
+        return evaluator_.newError("unknown operator: ", typeName(a), operator, typeName(b))
+
+
+def evalListInfixExpression(operator, a, b):
+    # スカラーは配列の長さに揃える
+    if not isSequence(a):
+        a = [a] * len(b)
+    if not isSequence(b):
+        b = [b] * len(a)
+
+    if operator == "+":
+        return object_.Array(numbers=[x + y for x, y in zip(a, b)])
+    elif operator == "-":
+        return object_.Array(numbers=[x - y for x, y in zip(a, b)])
+    elif operator == "*":
+        return object_.Array(numbers=[x * y for x, y in zip(a, b)])
+    elif operator == "/":
+        if any(y == 0 for y in b):
+            return evaluator_.newError("division by zero")
+        if isIntegers(a) and isIntegers(b) and not any(x % y for x, y in zip(a, b)):
+            return object_.Array(numbers=[x // y for x, y in zip(a, b)])
+        return object_.Array(numbers=[x / y for x, y in zip(a, b)])
+    elif operator == "<":
+        return booleans([x < y for x, y in zip(a, b)])
+    elif operator == ">":
+        return booleans([x > y for x, y in zip(a, b)])
+    elif operator == "==":
+        return booleans([x == y for x, y in zip(a, b)])
+    elif operator == "!=":
+        return booleans([x != y for x, y in zip(a, b)])
+    else:
+        return evaluator_.newError("unknown operator: ", typeName(a), operator, typeName(b))
+
+
+def typeName(v):
+    if isSequence(v):
+        return object_.ARRAY_OBJ
+    return evaluator_.numberType(v)
+
+
+def toScalar(v):
+    if np is not None and isinstance(v, np.generic):
+        v = v.item()
+    return evaluator_.box(v)
+
+
+def arraySum(arr):
+    values = numbers(arr)
+    if values is None:
+        return evaluator_.newError("argument to `sum` must be a numeric ARRAY")
+    if type(values) is list:
+        return toScalar(sum(values))
+    if isIntegers(values) and magnitude(values) * len(values) > INT64_MAX:
+        return toScalar(sum(values.tolist()))
+    return toScalar(values.sum())
+
+
+def arrayMin(arr):
+    values = numbers(arr)
+    if values is None:
+        return evaluator_.newError("argument to `min` must be a numeric ARRAY")
+    if len(values) == 0:
+        return evaluator_.newError("argument to `min` is empty")
+    if type(values) is list:
+        return toScalar(min(values))
+    return toScalar(values.min())
+
+
+def arrayMax(arr):
+    values = numbers(arr)
+    if values is None:
+        return evaluator_.newError("argument to `max` must be a numeric ARRAY")
+    if len(values) == 0:
+        return evaluator_.newError("argument to `max` is empty")
+    if type(values) is list:
+        return toScalar(max(values))
+    return toScalar(values.max())
+
+
+def arrayDot(left, right):
+    a = numbers(left)
+    b = numbers(right)
+    if a is None or b is None:
+        return evaluator_.newError("arguments to `dot` must be numeric ARRAYs")
+    if len(a) != len(b):
+        return evaluator_.newError(f"array length mismatch: {len(a)} != {len(b)}")
+
+    big = (isIntegers(a) and isIntegers(b) and type(a) is not list and type(b) is not list
+           and magnitude(a) * magnitude(b) * len(a) > INT64_MAX)
+    if type(a) is list or type(b) is list or big:
+        a = a if type(a) is list else a.tolist()
+        b = b if type(b) is list else b.tolist()
+        total = sum(x * y for x, y in zip(a, b))
+        if isIntegers(a) and isIntegers(b):
+            return toScalar(total)
+        return toScalar(float(total))
+    return toScalar(np.dot(a, b))